@@ -1,45 +1,57 @@
 import logging
+import time
 import pandas as pd
-from datetime import datetime
 import os
 from sklearn.metrics import classification_report, confusion_matrix, accuracy_score
+from analysis.store import EvaluationStore
 
 logger = logging.getLogger(__name__)
 
-def evaluate_classification_model(y_true, y_pred, species_name="unknown"):
+
+def format_report(report):
+    """Format a classification_report(output_dict=True) like its text form, for the log."""
+    rows = {label: scores for label, scores in report.items() if isinstance(scores, dict)}
+    df = pd.DataFrame(rows).T.rename(columns={"f1-score": "f1"})
+    df["support"] = df["support"].astype("int64")
+    return df.to_string(float_format="{:.2f}".format)
+
+
+def evaluate_classification_model(y_true, y_pred, species_name="unknown", store=None, params=None, **metadata):
     """
-    Evaluate classification model, save metrics to CSV, and log results.
+    Evaluate classification model, record the metrics in the evaluation store and log results.
+
+    store is an analysis.store.EvaluationStore (default: data/analyzed/evaluations.sqlite);
+    params and metadata (run_id, model_backend, model_hash, data_hash, fit_seconds) are recorded
+    with the per-class scores and confusion matrix. Returns the id of the stored evaluation.
     """
     try:
+        start = time.perf_counter()
+        # Ordered classes (e.g. Low < Medium < High) when the labels are categorical
+        y_true = pd.Series(y_true)
+        labels = list(y_true.cat.categories) if isinstance(y_true.dtype, pd.CategoricalDtype) else None
+        y_true = y_true.astype(object)
+        if labels is None:
+            labels = sorted(set(y_true.dropna()) | set(pd.Series(y_pred).dropna()))
+
         acc = accuracy_score(y_true, y_pred)
-        cls_report = classification_report(y_true, y_pred, output_dict=True)
-        conf_matrix = confusion_matrix(y_true, y_pred)
+        cls_report = classification_report(y_true, y_pred, labels=labels, output_dict=True, zero_division=0)
+        conf_matrix = confusion_matrix(y_true, y_pred, labels=labels)
 
         logger.info(f"Classification Accuracy for {species_name}: {acc:.3f}")
-        logger.info(f"Classification Report for {species_name}:\n{classification_report(y_true, y_pred)}")
+        logger.info(f"Classification Report for {species_name}:\n{format_report(cls_report)}")
         logger.info(f"Confusion Matrix for {species_name}:\n{conf_matrix}")
 
-        # Save summary metrics to CSV
-        eval_results = pd.DataFrame([{
-            "species": species_name,
-            "accuracy": acc,
-            "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        }])
-
+        # Confusion matrix of the latest run as a CSV next to the plots
         os.makedirs("data/analyzed", exist_ok=True)
-        eval_path = "data/analyzed/classification_evaluation_results.csv"
-
-        if os.path.exists(eval_path):
-            eval_results.to_csv(eval_path, mode='a', header=False, index=False)
-        else:
-            eval_results.to_csv(eval_path, index=False)
-
-        # Optionally, save confusion matrix to a CSV too
-        conf_df = pd.DataFrame(conf_matrix)
+        conf_df = pd.DataFrame(conf_matrix, index=labels, columns=labels)
         conf_path = f"data/analyzed/confusion_matrix_{species_name.lower().replace(' ', '_')}.csv"
         conf_df.to_csv(conf_path, index=True)
 
-        logger.info(f"Saved classification evaluation results for {species_name}.")
+        store = store or EvaluationStore()
+        evaluation_id = store.record_evaluation(species_name, acc, cls_report, conf_matrix, labels, params=params,
+                                                eval_seconds=round(time.perf_counter() - start, 4), **metadata)
+        logger.info(f"Saved classification evaluation results for {species_name} to {store.path} (id {evaluation_id}).")
+        return evaluation_id
 
     except Exception as e:
         logger.error(f"Error during classification evaluation for {species_name}: {e}", exc_info=True)
@@ -1,62 +1,200 @@
-
 import logging
+import os
+import time
+import tracemalloc
+from datetime import datetime
+import joblib
+import sklearn
 from sklearn.model_selection import train_test_split
-from sklearn.ensemble import RandomForestClassifier
-from sklearn.preprocessing import StandardScaler
+from sklearn.ensemble import RandomForestClassifier, HistGradientBoostingClassifier
+import numpy as np
 import pandas as pd
 from sklearn.compose import ColumnTransformer
-from sklearn.preprocessing import StandardScaler, OneHotEncoder
+from sklearn.impute import SimpleImputer
+from sklearn.preprocessing import StandardScaler, OneHotEncoder, OrdinalEncoder, FunctionTransformer
 from sklearn.pipeline import Pipeline
+import etl.storage as storage
 
 logger = logging.getLogger(__name__)
 
+# Classifier settings per backend; also part of the stage cache key in main.py
+RANDOM_FOREST_PARAMS = {"random_state": 42}
+HIST_GRADIENT_BOOSTING_PARAMS = {"random_state": 42}
+BACKENDS = ("random_forest", "hist_gradient_boosting")
 
-def train_classification_model(df, target_col='abundance_class'):
-    """
-    Train a Random Forest classification model to predict abundance_class.
-    Properly handles numeric and categorical features with preprocessing,
-    and avoids data leakage.
-    Assumes df is preprocessed and target_col exists.
-    """
-    try:
-        # Columns to exclude from features to avoid leakage
-        leak_cols = [target_col, 'abundance_mean']  # Add others if needed
+# Categorical columns with more distinct values than this are not encoded as features
+MAX_CATEGORY_CARDINALITY = 50
 
-        # Select feature columns excluding target and leakage columns
-        feature_cols = [col for col in df.columns if col not in leak_cols]
+# Columns never used as features: abundance_class is derived from abundance_mean
+LEAK_COLUMNS = ['abundance_mean']
 
-        # Drop rows with missing target or feature values
-        df = df.dropna(subset=[target_col] + feature_cols)
+# Numeric features allowed to be null; the forest imputes them instead of dropping the row
+# (observation_count is <NA> where eBird recorded "X", see etl/schema.py)
+NULLABLE_FEATURES = ["observation_count"]
 
-        X = df[feature_cols]
-        y = df[target_col]
+# Where trained pipelines are saved, and the version of the saved artifact layout
+MODEL_DIR = "data/models"
+MODEL_FORMAT_VERSION = 1
 
-        logger.info(f"Classes: {y.unique().tolist()}")
 
-        # Split data (stratify by target)
-        X_train, X_test, y_train, y_test = train_test_split(
-            X, y, test_size=0.2, random_state=42, stratify=y)
+def get_model_params(backend="random_forest"):
+    """Return the classifier settings used for a backend."""
+    if backend == "random_forest":
+        return dict(RANDOM_FOREST_PARAMS)
+    if backend == "hist_gradient_boosting":
+        return dict(HIST_GRADIENT_BOOSTING_PARAMS)
+    raise ValueError(f"Unknown model backend '{backend}'. Choose from {BACKENDS}.")
 
-        # Separate numeric and categorical columns
-        numeric_features = X.select_dtypes(include=['number']).columns.tolist()
-        categorical_features = X.select_dtypes(include=['object', 'category']).columns.tolist()
 
-        # Create preprocessing pipeline
+def select_features(X, max_cardinality=MAX_CATEGORY_CARDINALITY):
+    """
+    Feature-selection policy. Splits the columns of X into
+    - numeric features (scaled for the forest, passed through for boosting),
+    - categorical features (string/category columns with 2..max_cardinality distinct values),
+    - dropped columns: constant columns, high-cardinality strings (e.g. raw dates or ids)
+      and any other dtype such as datetime64.
+    Returns (numeric_features, categorical_features, dropped).
+    """
+    numeric_features, categorical_features, dropped = [], [], []
+    for col in X.columns:
+        n_unique = X[col].nunique(dropna=True)
+        if not (pd.api.types.is_numeric_dtype(X[col]) or pd.api.types.is_object_dtype(X[col])
+                or isinstance(X[col].dtype, pd.CategoricalDtype)):
+            dropped.append(col)
+        elif n_unique <= 1:
+            dropped.append(col)
+        elif pd.api.types.is_numeric_dtype(X[col]):
+            numeric_features.append(col)
+        elif n_unique <= max_cardinality:
+            categorical_features.append(col)
+        else:
+            dropped.append(col)
+    return numeric_features, categorical_features, dropped
+
+
+def to_float(X):
+    """Cast numeric features (including nullable Int columns holding <NA>) to float64 with NaN."""
+    return X.astype("float64")
+
+
+def build_pipeline(backend, numeric_features, categorical_features, n_jobs=-1):
+    """Build the preprocessing + classifier Pipeline for a backend."""
+    params = get_model_params(backend)
+    if backend == "random_forest":
         preprocessor = ColumnTransformer(
             transformers=[
-                ('num', StandardScaler(), numeric_features),
+                ('num', Pipeline([
+                    ('impute', SimpleImputer(strategy='median')),
+                    ('scale', StandardScaler()),
+                ]), numeric_features),
                 ('cat', OneHotEncoder(handle_unknown='ignore'), categorical_features)
             ])
+        classifier = RandomForestClassifier(n_jobs=n_jobs, **params)
+    else:
+        # Trees don't need scaling and handle nulls natively; categories are ordinal-encoded
+        # and split on natively
+        preprocessor = ColumnTransformer(
+            transformers=[
+                ('num', FunctionTransformer(to_float, feature_names_out='one-to-one'), numeric_features),
+                ('cat', OrdinalEncoder(handle_unknown='use_encoded_value', unknown_value=np.nan,
+                                       encoded_missing_value=np.nan), categorical_features)
+            ])
+        categorical_mask = [False] * len(numeric_features) + [True] * len(categorical_features)
+        classifier = HistGradientBoostingClassifier(
+            categorical_features=categorical_mask if categorical_features else None, **params)
+
+    return Pipeline([
+        ('preprocessor', preprocessor),
+        ('classifier', classifier)
+    ])
+
+
+def check_classes(labels):
+    """
+    Raise ValueError unless the target has at least 2 distinct labels: a species whose abundance
+    is the same everywhere (e.g. a status table with only a year_round row) gets a single
+    class, and a classifier fitted on it is a constant that scores perfectly.
+    """
+    labels = [label for label in labels if pd.notna(label)]
+    if len(labels) < 2:
+        raise ValueError(f"need at least 2 classes to train a classifier, the data has {len(labels)}: {labels}")
+
+
+def split_training_data(df, target_col='abundance_class'):
+    """
+    Select the feature columns (everything except the target and leaking columns), drop rows
+    with a missing target or non-nullable feature, and split 80/20 stratified by the target.
+    Returns (X_train, X_test, y_train, y_test).
+    """
+    # Columns to exclude from features to avoid leakage
+    leak_cols = [target_col] + LEAK_COLUMNS
+
+    # Select feature columns excluding target and leakage columns
+    feature_cols = [col for col in df.columns if col not in leak_cols]
+
+    # Drop rows with missing target or feature values (nullable features are imputed)
+    df = df.dropna(subset=[target_col] + [col for col in feature_cols if col not in NULLABLE_FEATURES])
+
+    X = df[feature_cols]
+    y = df[target_col]
+
+    logger.info(f"Classes: {y.unique().tolist()}")
+    check_classes(y.unique())
+
+    # Split data (stratify by target)
+    return train_test_split(X, y, test_size=0.2, random_state=42, stratify=y)
+
+
+def train_classification_model(df, target_col='abundance_class', backend='random_forest', n_jobs=-1,
+                               max_cardinality=MAX_CATEGORY_CARDINALITY, track_memory=False):
+    """
+    Train a classification model to predict abundance_class.
+    backend is 'random_forest' (fitted on n_jobs cores) or 'hist_gradient_boosting'
+    (native categorical support). Properly handles numeric and categorical features
+    with preprocessing, and avoids data leakage.
+    Assumes df is preprocessed and target_col exists.
+    Training time (and, with track_memory, the tracemalloc peak of the fit, which slows
+    allocation-heavy fits down) is logged and stored on the returned pipeline as `fit_stats_`;
+    the expected input columns are stored as `feature_schema_`.
+    """
+    try:
+        X_train, X_test, y_train, y_test = split_training_data(df, target_col)
+
+        # Separate numeric and low-cardinality categorical columns; drop the rest
+        numeric_features, categorical_features, dropped = select_features(X_train, max_cardinality)
+        if dropped:
+            logger.info(f"Columns left out of the features (constant, high-cardinality or unsupported dtype): {dropped}")
 
         # Full pipeline: preprocessing + classifier
-        clf = Pipeline([
-            ('preprocessor', preprocessor),
-            ('classifier', RandomForestClassifier(random_state=42))
-        ])
+        clf = build_pipeline(backend, numeric_features, categorical_features, n_jobs=n_jobs)
 
-        # Train model
+        # Train model. tracemalloc may already be tracing for the stage profiler (see etl/profiling.py);
+        # its peak is then left alone, so the fit peak is the peak since the profiler's reset
+        started_tracing = track_memory and not tracemalloc.is_tracing()
+        if started_tracing:
+            tracemalloc.start()
+        if track_memory:
+            traced_start = tracemalloc.get_traced_memory()[0]
+        start_wall, start_cpu = time.perf_counter(), time.process_time()
         clf.fit(X_train, y_train)
-        logger.info("Random Forest classification model trained successfully.")
+        fit_seconds, cpu_seconds = time.perf_counter() - start_wall, time.process_time() - start_cpu
+        peak_mb = None
+        if track_memory:
+            peak_mb = max(tracemalloc.get_traced_memory()[1] - traced_start, 0) / 1024 ** 2
+            if started_tracing:
+                tracemalloc.stop()
+
+        # Columns (and dtypes) the pipeline expects at prediction time
+        clf.feature_schema_ = {col: str(X_train[col].dtype) for col in X_train.columns}
+        clf.fit_stats_ = {
+            "backend": backend,
+            "n_train": len(X_train),
+            "n_features": len(numeric_features) + len(categorical_features),
+            "fit_seconds": round(fit_seconds, 3),
+            "fit_cpu_seconds": round(cpu_seconds, 3),
+            "peak_memory_mb": None if peak_mb is None else round(peak_mb, 1),
+        }
+        logger.info(f"{backend} classification model trained successfully: {clf.fit_stats_}")
 
         # Predict on test set
         y_pred = clf.predict(X_test)
@@ -65,4 +203,58 @@ def train_classification_model(df, target_col='abundance_class'):
 
     except Exception as e:
         logger.error(f"Error during classification model training: {e}", exc_info=True)
-        raise
\ No newline at end of file
+        raise
+
+
+def compare_backends(df, target_col='abundance_class', backends=BACKENDS, **kwargs):
+    """
+    Train every backend on the same split and return a DataFrame with the accuracy,
+    training time and peak memory of each, to choose a backend per species.
+    """
+    kwargs.setdefault("track_memory", True)
+    rows = []
+    for backend in backends:
+        clf, y_test, y_pred = train_classification_model(df, target_col=target_col, backend=backend, **kwargs)
+        rows.append({**clf.fit_stats_, "accuracy": float(np.mean(np.asarray(y_test) == np.asarray(y_pred)))})
+    return pd.DataFrame(rows)
+
+
+def get_model_path(species_name, model_dir=MODEL_DIR, kind="model"):
+    """Path of a saved model; kind separates e.g. the batch-trained "model" from the "online_model"."""
+    return os.path.join(model_dir, f"{species_name.lower().replace(' ', '_')}_{kind}.joblib")
+
+
+def save_model(clf, species_name, model_dir=MODEL_DIR, kind="model"):
+    """
+    Save a trained pipeline for a species together with a version stamp and its
+    feature schema, so analysis/predict.py can score new data without retraining.
+    The file is written atomically. Returns the path of the saved artifact.
+    """
+    try:
+        artifact = {
+            "pipeline": clf,
+            "species": species_name,
+            "feature_schema": getattr(clf, "feature_schema_", None),
+            "classes": [str(c) for c in clf.classes_],
+            "version": {
+                "format": MODEL_FORMAT_VERSION,
+                "sklearn": sklearn.__version__,
+                "trained_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+                "fit_stats": getattr(clf, "fit_stats_", None),
+            },
+        }
+        os.makedirs(model_dir, exist_ok=True)
+        path = get_model_path(species_name, model_dir, kind)
+        tmp_path = storage._temp_path(path)  # created with the umask, so other accounts can load the model
+        try:
+            joblib.dump(artifact, tmp_path)
+            os.replace(tmp_path, path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        logger.info(f"Saved model for {species_name} to {path}")
+        return path
+
+    except Exception as e:
+        logger.error(f"Error saving model for {species_name}: {e}", exc_info=True)
+        raise
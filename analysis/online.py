@@ -0,0 +1,277 @@
+"""
+Online (incremental) training of the abundance classifier with partial_fit.
+
+Instead of refitting a forest on the whole merged frame, an OnlineClassifier is updated batch by
+batch as the merged store is streamed (storage.iter_frames), so memory is bounded by the batch
+size and new parts of the store (etl/incremental.py) only cost their own rows:
+- numeric features are scaled with running mean/variance (StandardScaler.partial_fit) and nulls
+  are imputed with the running mean,
+- categorical features are hashed into a fixed number of columns (FeatureHasher), so values
+  first seen in a later batch need no refit of an encoder,
+- the classifier is an SGDClassifier (logistic loss) or GaussianNB.
+A fixed share of the rows, chosen by a hash of the row, is held out and scored after every batch.
+The model is saved next to the batch-trained one (kind "online_model") and remembers which
+store files it has consumed, so the next update streams only the new ones.
+"""
+
+import logging
+import os
+import time
+import joblib
+import numpy as np
+import pandas as pd
+from scipy import sparse
+from sklearn.feature_extraction import FeatureHasher
+from sklearn.linear_model import SGDClassifier
+from sklearn.naive_bayes import GaussianNB
+from sklearn.preprocessing import StandardScaler
+import etl.cache as cache
+import etl.storage as storage
+import analysis.model as model
+
+logger = logging.getLogger(__name__)
+
+# Model backends (--model-backend) trained online, and their classifier settings
+ONLINE_PARAMS = {
+    "online_sgd": {"loss": "log_loss", "alpha": 1e-4, "random_state": 42},
+    "online_naive_bayes": {},
+}
+ONLINE_BACKENDS = tuple(ONLINE_PARAMS)
+
+# Saved as data/models/<species>_online_model.joblib (see analysis.model.get_model_path)
+ONLINE_KIND = "online_model"
+
+# Columns the categorical features are hashed into
+HASH_FEATURES = 2 ** 7
+
+# Rows per partial_fit batch
+ONLINE_BATCH_ROWS = 100_000
+
+# Percentage of rows held out from training and scored after every batch
+HOLDOUT_PERCENT = 20
+
+
+def get_online_params(backend="online_sgd"):
+    """Return the classifier settings of an online backend."""
+    if backend not in ONLINE_PARAMS:
+        raise ValueError(f"Unknown online backend '{backend}'. Choose from {ONLINE_BACKENDS}.")
+    return dict(ONLINE_PARAMS[backend])
+
+
+def holdout_mask(df, percent=HOLDOUT_PERCENT):
+    """Boolean mask of the held-out rows, chosen by a hash of each row so a row stays on the same side in every run."""
+    return (pd.util.hash_pandas_object(df, index=False).to_numpy() % 100) < percent
+
+
+class OnlineClassifier:
+    """
+    Hashed-feature classifier updated with partial_fit. Has the predict / predict_proba /
+    classes_ interface of a fitted Pipeline, so analysis.model.save_model and analysis/predict.py
+    handle it like the batch-trained models.
+    """
+
+    def __init__(self, backend, numeric_features, categorical_features, classes, n_hash_features=HASH_FEATURES):
+        params = get_online_params(backend)
+        self.backend = backend
+        self.numeric_features = list(numeric_features)
+        self.categorical_features = list(categorical_features)
+        # Sorted, as the classifier orders its classes_ (and predict_proba columns)
+        self.classes_ = np.unique(np.asarray(classes, dtype=object))
+        self.scaler = StandardScaler()
+        self.hasher = FeatureHasher(n_features=n_hash_features, input_type="string", alternate_sign=False)
+        self.classifier = SGDClassifier(**params) if backend == "online_sgd" else GaussianNB(**params)
+        self.n_seen = 0
+        self.history_ = []
+        self.consumed_ = []  # digests of the store files trained on, in order
+
+    @classmethod
+    def for_frame(cls, df, backend, target_col='abundance_class', max_cardinality=model.MAX_CATEGORY_CARDINALITY,
+                  classes=None):
+        """A new classifier with the features found in df (e.g. a scan_store sample) and its (or the given) classes."""
+        X = df[[col for col in df.columns if col not in [target_col] + model.LEAK_COLUMNS]]
+        numeric_features, categorical_features, dropped = model.select_features(X, max_cardinality)
+        if dropped:
+            logger.info(f"Columns left out of the features (constant, high-cardinality or unsupported dtype): {dropped}")
+        if classes is None:
+            y = df[target_col]
+            classes = y.cat.categories if isinstance(y.dtype, pd.CategoricalDtype) else np.unique(y.dropna())
+        clf = cls(backend, numeric_features, categorical_features, classes)
+        clf.feature_schema_ = {col: str(X[col].dtype) for col in numeric_features + categorical_features}
+        return clf
+
+    def _numeric(self, X):
+        return model.to_float(X[self.numeric_features]).to_numpy()
+
+    def transform(self, X):
+        """Scaled numeric features (running mean for nulls) next to the hashed categories."""
+        scaled = np.nan_to_num(self.scaler.transform(self._numeric(X)), nan=0.0)
+        if self.categorical_features:
+            tokens = [(col + "=" + X[col].astype(str)).to_numpy() for col in self.categorical_features]
+            hashed = self.hasher.transform(zip(*tokens))
+        else:
+            hashed = sparse.csr_matrix((len(X), 0))
+        matrix = sparse.hstack([sparse.csr_matrix(scaled), hashed], format="csr")
+        return matrix.toarray() if isinstance(self.classifier, GaussianNB) else matrix
+
+    def partial_fit(self, X, y):
+        self.scaler.partial_fit(self._numeric(X))
+        self.classifier.partial_fit(self.transform(X), np.asarray(y, dtype=object), classes=self.classes_)
+        self.n_seen += len(X)
+        return self
+
+    def predict(self, X):
+        return self.classifier.predict(self.transform(X))
+
+    def predict_proba(self, X):
+        return self.classifier.predict_proba(self.transform(X))
+
+
+def witness_rows(df, limit):
+    """Rows of df showing the first `limit` distinct values of every column (null counts as a value)."""
+    keep = np.zeros(len(df), dtype=bool)
+    for col in df.columns:
+        keep[np.flatnonzero(~df[col].duplicated().to_numpy())[:limit]] = True
+    return df[keep]
+
+
+def scan_store(files, target_col='abundance_class', batch_size=ONLINE_BATCH_ROWS,
+               max_cardinality=model.MAX_CATEGORY_CARDINALITY):
+    """
+    One pass over the store files to choose the features and classes of a new model from all
+    of it rather than from the first batch (the store is in date order, so e.g. season is
+    constant in early batches). Returns (sample, classes): sample holds, for every column,
+    rows with up to max_cardinality + 1 of its non-null values, so model.select_features
+    decides on it as on the whole store; classes are every label in the store, or the
+    categories of a categorical target. sample is None if no row has a label; fewer than 2
+    distinct labels raise ValueError (see model.check_classes).
+    """
+    limit = max_cardinality + 2  # one more for the null value
+    sample, labels, categories = None, set(), None
+    for path in files:
+        for batch in storage.iter_frames(path, batch_size=batch_size):
+            batch = batch.dropna(subset=[target_col])
+            if batch.empty:
+                continue
+            y = batch[target_col]
+            if isinstance(y.dtype, pd.CategoricalDtype) and categories is None:
+                categories = y.cat.categories
+            labels.update(y.unique())
+            rows = witness_rows(batch, limit)
+            sample = rows if sample is None else witness_rows(pd.concat([sample, rows], ignore_index=True), limit)
+    if sample is not None:
+        model.check_classes(labels)
+    classes = categories if categories is not None else np.unique(np.asarray(list(labels), dtype=object))
+    return sample, classes
+
+
+def load_online_model(species_name, model_dir=model.MODEL_DIR):
+    """Return the saved OnlineClassifier of a species, or None if there is none (or it is outdated)."""
+    path = model.get_model_path(species_name, model_dir, ONLINE_KIND)
+    if not os.path.exists(path):
+        return None
+    artifact = joblib.load(path)
+    if artifact.get("version", {}).get("format") != model.MODEL_FORMAT_VERSION:
+        logger.info(f"Ignoring the online model at {path}: it was saved in an older format")
+        return None
+    return artifact["pipeline"]
+
+
+def update_online_model(species_name, files, backend="online_sgd", target_col='abundance_class',
+                        batch_size=ONLINE_BATCH_ROWS, model_dir=model.MODEL_DIR,
+                        max_cardinality=model.MAX_CATEGORY_CARDINALITY):
+    """
+    Update the saved online model of a species with the store files (the merged file and its
+    parts, see etl.incremental.store_files) it has not consumed yet, in batches of batch_size
+    rows. A new model is started when there is none, the backend changed or the consumed files
+    are no longer the start of the store (e.g. after a full merge). Every batch is logged and
+    recorded in `history_` with its accuracy on the held-out rows.
+    Returns (clf, y_holdout, y_pred) for the held-out rows of the streamed batches; when every
+    file was already consumed, the held-out rows of the last file are scored without training.
+    The caller saves the model (analysis.model.save_model with kind=ONLINE_KIND).
+    """
+    try:
+        if not files:
+            raise FileNotFoundError(f"no merged data to train the online model of {species_name} on")
+        digests = [cache.file_digest(path) for path in files]
+        clf = load_online_model(species_name, model_dir)
+        if clf is not None and (clf.backend != backend or clf.consumed_ != digests[:len(clf.consumed_)]):
+            logger.info(f"The merged data of {species_name} was rebuilt or the backend changed; "
+                        f"starting a new online model")
+            clf = None
+        new_files = files[len(clf.consumed_):] if clf is not None else files
+        train = bool(new_files)
+        if not train:
+            logger.info(f"Online model of {species_name} is up to date; scoring the holdout of {files[-1]}")
+            new_files = files[-1:]
+
+        if clf is None:
+            # Features and classes come from the whole store, not just its first batch
+            sample, classes = scan_store(files, target_col, batch_size, max_cardinality)
+            if sample is not None:
+                clf = OnlineClassifier.for_frame(sample, backend, target_col, max_cardinality, classes)
+
+        holdout_true, holdout_pred = [], []
+        correct = scored = 0
+        start_wall, start_cpu = time.perf_counter(), time.process_time()
+        for path in new_files:
+            for batch in storage.iter_frames(path, batch_size=batch_size):
+                batch = batch.dropna(subset=[target_col])
+                if batch.empty:
+                    continue
+                batch_start = time.perf_counter()
+                held_out = holdout_mask(batch)
+                if train:
+                    # Shuffled so the SGD steps don't follow the (date) order of the store
+                    rows = batch[~held_out].sample(frac=1, random_state=len(clf.history_))
+                    clf.partial_fit(rows, rows[target_col])
+                test = batch[held_out]
+                if test.empty:
+                    continue
+                y_true = np.asarray(test[target_col], dtype=object)
+                y_pred = clf.predict(test)
+                holdout_true.append(y_true)
+                holdout_pred.append(y_pred)
+                correct += int((y_true == y_pred).sum())
+                scored += len(y_true)
+                if train:
+                    record = {
+                        "batch": len(clf.history_) + 1, "file": os.path.basename(path), "rows": len(batch),
+                        "train_rows": int((~held_out).sum()), "holdout_rows": len(test),
+                        "holdout_accuracy": round(float((y_true == y_pred).mean()), 4),
+                        "cumulative_accuracy": round(correct / scored, 4),
+                        "seconds": round(time.perf_counter() - batch_start, 3),
+                    }
+                    clf.history_.append(record)
+                    logger.info(f"Online batch {record['batch']} ({record['file']}): {record['train_rows']} rows trained, "
+                                f"holdout accuracy {record['holdout_accuracy']:.4f} "
+                                f"(this update {record['cumulative_accuracy']:.4f})")
+            if train:
+                clf.consumed_.append(digests[files.index(path)])
+
+        if clf is None or not holdout_true:
+            raise ValueError(f"no labelled rows to train or score the online model of {species_name}")
+        clf.fit_stats_ = {
+            "backend": backend,
+            "n_train": clf.n_seen,
+            "n_features": len(clf.numeric_features) + len(clf.categorical_features),
+            "fit_seconds": round(time.perf_counter() - start_wall, 3),
+            "fit_cpu_seconds": round(time.process_time() - start_cpu, 3),
+            "peak_memory_mb": None,
+            "n_batches": len(clf.history_),
+            "holdout_accuracy": round(correct / scored, 4),
+        }
+        logger.info(f"{backend} model of {species_name} updated: {clf.fit_stats_}")
+        return clf, pd.Series(np.concatenate(holdout_true), name=target_col), np.concatenate(holdout_pred)
+
+    except Exception as e:
+        logger.error(f"Error updating the online model of {species_name}: {e}", exc_info=True)
+        raise
+
+
+def save_history(clf, species_name, output_dir="data/analyzed"):
+    """Write the per-batch holdout metrics of an online model to a CSV. Returns the path."""
+    os.makedirs(output_dir, exist_ok=True)
+    path = os.path.join(output_dir, f"online_history_{species_name.lower().replace(' ', '_')}.csv")
+    pd.DataFrame(clf.history_).to_csv(path, index=False)
+    logger.info(f"Saved {len(clf.history_)} online batch records for {species_name} to {path}")
+    return path
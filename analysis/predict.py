@@ -0,0 +1,156 @@
+"""
+Score new EBD rows with the pipelines saved by analysis.model.save_model.
+
+Models are loaded once per process and cached (reloaded only if the file on disk changes).
+predict_file streams large files in batches; predict_record scores a single observation.
+The features include the season and total_pop_percent from the Status & Trends merge, so raw
+EBD rows are merged against a cleaned status table first when those columns are missing.
+"""
+
+import logging
+import os
+import threading
+import joblib
+import numpy as np
+import pandas as pd
+import etl.schema as schema
+import etl.storage as storage
+from etl.extract import normalize_column_name
+from analysis.model import MODEL_DIR, MODEL_FORMAT_VERSION, get_model_path
+
+logger = logging.getLogger(__name__)
+
+# path -> (mtime, artifact) for models already loaded in this process
+_model_cache = {}
+_model_cache_lock = threading.Lock()
+
+# Columns the season merge adds to EBD rows
+STATUS_FEATURES = ["abundance_mean", "total_pop_percent", "season"]
+
+# Identifier columns carried through to predict_file output when present
+ID_COLUMNS = ["global_unique_identifier", "sampling_event_identifier"]
+
+
+def load_model(species_name, model_dir=MODEL_DIR, kind="model"):
+    """Load (once) and return the saved model artifact of a species (kind as in analysis.model.get_model_path)."""
+    path = get_model_path(species_name, model_dir, kind)
+    mtime = os.path.getmtime(path)
+    with _model_cache_lock:
+        cached = _model_cache.get(path)
+        if cached is not None and cached[0] == mtime:
+            return cached[1]
+
+        artifact = joblib.load(path)
+        version = artifact.get("version", {})
+        if version.get("format") != MODEL_FORMAT_VERSION:
+            raise ValueError(f"Model at {path} has format {version.get('format')}, expected {MODEL_FORMAT_VERSION}. "
+                             f"Retrain it with the current pipeline.")
+        logger.info(f"Loaded model for {species_name} (trained {version.get('trained_at')}, "
+                    f"sklearn {version.get('sklearn')})")
+        _model_cache[path] = (mtime, artifact)
+        return artifact
+
+
+def clear_model_cache():
+    with _model_cache_lock:
+        _model_cache.clear()
+
+
+def normalize_rows(df, feature_schema, status_df=None):
+    """
+    Normalize column names and apply the EBD dtype schema like the cleaning before training
+    ("X" counts become <NA> with present_uncounted set). If the status-derived features are
+    missing and status_df (a cleaned status table) is given, season-merge the rows first.
+    Rows outside the merged region are dropped, as in training.
+    """
+    df = schema.apply_ebd_schema(df.rename(columns=normalize_column_name))
+    if status_df is not None and any(col in feature_schema and col not in df.columns for col in STATUS_FEATURES):
+        import etl.transform as transform  # heavy (plotting) imports, only needed for raw EBD rows
+        df = transform.merge_datasets(status_df, df)
+    return df
+
+
+def prepare_features(df, feature_schema, status_df=None):
+    """
+    Return the columns of df expected by the model, in schema order and with the trained dtypes.
+    Columns missing from df are filled with nulls. See normalize_rows for status_df.
+    """
+    df = normalize_rows(df, feature_schema, status_df)
+    features = pd.DataFrame(index=df.index)
+    for col, dtype in feature_schema.items():
+        values = df[col] if col in df.columns else pd.Series(np.nan, index=df.index)
+        if dtype.startswith("datetime"):
+            values = pd.to_datetime(values, errors="coerce")
+        elif dtype in ("object", "category", "str", "string"):
+            values = values.astype(object)
+        else:
+            values = pd.to_numeric(values, errors="coerce")
+        features[col] = values
+    return features
+
+
+def predict_frame(df, species_name, status_df=None, model_dir=MODEL_DIR, kind="model"):
+    """Score a DataFrame of observations; returns a Series of predicted classes aligned to the scored rows."""
+    artifact = load_model(species_name, model_dir, kind)
+    features = prepare_features(df, artifact["feature_schema"], status_df)
+    if features.empty:
+        return pd.Series([], dtype=object, name="predicted_class")
+    return pd.Series(artifact["pipeline"].predict(features), index=features.index, name="predicted_class")
+
+
+def predict_record(record, species_name, status_df=None, model_dir=MODEL_DIR, kind="model"):
+    """
+    Low-latency path for a single observation given as a dict.
+    Returns {"predicted_class": label, "probabilities": {label: p}} or None if the record
+    was filtered out by the season merge.
+    """
+    artifact = load_model(species_name, model_dir, kind)
+    features = prepare_features(pd.DataFrame([record]), artifact["feature_schema"], status_df)
+    if features.empty:
+        return None
+    pipeline = artifact["pipeline"]
+    probabilities = pipeline.predict_proba(features)[0]
+    best = int(np.argmax(probabilities))
+    return {
+        "predicted_class": str(pipeline.classes_[best]),
+        "probabilities": {str(c): float(p) for c, p in zip(pipeline.classes_, probabilities)},
+    }
+
+
+def _iter_batches(input_path, batch_size):
+    if input_path.endswith(".txt"):
+        yield from pd.read_csv(input_path, sep="\t", chunksize=batch_size, low_memory=False)
+    else:
+        yield from storage.iter_frames(input_path, batch_size=batch_size)
+
+
+def predict_file(input_path, species_name, output_path, status_df=None, batch_size=250_000, model_dir=MODEL_DIR,
+                 kind="model"):
+    """
+    Stream a large file (raw EBD .txt, extracted .csv/.parquet/.feather) through the model in
+    batches of batch_size rows and append the scored rows, with a predicted_class column, to
+    output_path. Memory use is bounded by the batch size. Returns the number of rows scored.
+    """
+    try:
+        artifact = load_model(species_name, model_dir, kind)
+        scored = 0
+        with storage.open_writer(output_path) as writer:
+            for batch in _iter_batches(input_path, batch_size):
+                rows = normalize_rows(batch, artifact["feature_schema"], status_df)
+                features = prepare_features(rows, artifact["feature_schema"])
+                if features.empty:
+                    continue
+                out = features.copy()
+                for col in ID_COLUMNS:
+                    if col in rows.columns:
+                        out[col] = rows[col].astype(str)
+                out["predicted_class"] = artifact["pipeline"].predict(features).astype(str)
+                writer.write(out)
+                scored += len(out)
+                logger.info(f"Scored {scored} rows for {species_name}")
+        logger.info(f"Saved {scored} predictions for {species_name} to {output_path}")
+        return scored
+
+    except Exception as e:
+        logger.error(f"Error scoring {input_path} for {species_name}: {e}", exc_info=True)
+        raise
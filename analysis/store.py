@@ -0,0 +1,184 @@
+"""
+Evaluation results store backed by a local SQLite database.
+
+Each evaluation is one row in `evaluations` (species, run id, accuracy and averaged scores,
+model and data hashes, timings and parameters) with its per-class precision/recall/F1 in
+`class_metrics` and its confusion matrix in `confusion_cells`. An evaluation is written in a
+single transaction, so concurrent writers (species evaluated in parallel worker processes)
+never leave partial or interleaved records, and queries by species or run use indexes
+instead of rescanning a growing file.
+"""
+
+import json
+import logging
+import os
+import sqlite3
+from contextlib import closing
+from datetime import datetime
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+STORE_PATH = "data/analyzed/evaluations.sqlite"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS evaluations (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    run_id TEXT,
+    species TEXT NOT NULL,
+    created_at TEXT NOT NULL,
+    accuracy REAL,
+    macro_precision REAL,
+    macro_recall REAL,
+    macro_f1 REAL,
+    weighted_f1 REAL,
+    n_test INTEGER,
+    model_backend TEXT,
+    model_hash TEXT,
+    data_hash TEXT,
+    fit_seconds REAL,
+    eval_seconds REAL,
+    params TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_evaluations_species ON evaluations (species, created_at);
+CREATE INDEX IF NOT EXISTS idx_evaluations_run ON evaluations (run_id);
+
+CREATE TABLE IF NOT EXISTS class_metrics (
+    evaluation_id INTEGER NOT NULL REFERENCES evaluations (id) ON DELETE CASCADE,
+    label TEXT NOT NULL,
+    precision REAL,
+    recall REAL,
+    f1 REAL,
+    support INTEGER,
+    PRIMARY KEY (evaluation_id, label)
+);
+
+CREATE TABLE IF NOT EXISTS confusion_cells (
+    evaluation_id INTEGER NOT NULL REFERENCES evaluations (id) ON DELETE CASCADE,
+    true_label TEXT NOT NULL,
+    predicted_label TEXT NOT NULL,
+    count INTEGER NOT NULL,
+    PRIMARY KEY (evaluation_id, true_label, predicted_label)
+);
+"""
+
+# Columns of `evaluations` that record_evaluation fills from its keyword arguments
+METADATA_COLUMNS = ("run_id", "model_backend", "model_hash", "data_hash", "fit_seconds", "eval_seconds")
+
+
+class EvaluationStore:
+    """
+    SQLite store of evaluation results at `path`.
+
+    Connections are opened per call, so a store can be passed to worker processes. WAL mode
+    lets readers (dashboards) query while a run is writing; writers wait up to `timeout` seconds
+    for each other.
+    """
+
+    def __init__(self, path=STORE_PATH, timeout=30.0):
+        self.path = path
+        self.timeout = timeout
+        self._initialized = False
+
+    def _connect(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        conn = sqlite3.connect(self.path, timeout=self.timeout)
+        conn.execute("PRAGMA foreign_keys = ON")
+        if not self._initialized:
+            conn.execute("PRAGMA journal_mode = WAL")
+            conn.executescript(SCHEMA)
+            self._initialized = True
+        return conn
+
+    def record_evaluation(self, species, accuracy, report, confusion, labels, params=None, **metadata):
+        """
+        Store one evaluation in a single transaction and return its id.
+
+        report is sklearn's classification_report(output_dict=True); confusion is the confusion
+        matrix with rows/columns in `labels` order. metadata fills the METADATA_COLUMNS.
+        """
+        unknown = set(metadata) - set(METADATA_COLUMNS)
+        if unknown:
+            raise TypeError(f"Unknown evaluation fields: {sorted(unknown)}")
+        macro = report.get("macro avg", {})
+        weighted = report.get("weighted avg", {})
+        row = {
+            "species": species,
+            "created_at": datetime.now().isoformat(timespec="seconds"),
+            "accuracy": float(accuracy),
+            "macro_precision": macro.get("precision"),
+            "macro_recall": macro.get("recall"),
+            "macro_f1": macro.get("f1-score"),
+            "weighted_f1": weighted.get("f1-score"),
+            "n_test": int(macro["support"]) if "support" in macro else None,
+            "params": json.dumps(params, sort_keys=True, default=str) if params is not None else None,
+            **metadata,
+        }
+        class_rows = [(str(label), scores["precision"], scores["recall"], scores["f1-score"], int(scores["support"]))
+                      for label, scores in report.items() if isinstance(scores, dict) and label not in
+                      ("macro avg", "weighted avg", "micro avg")]
+        confusion_rows = [(str(true), str(pred), int(confusion[i][j]))
+                          for i, true in enumerate(labels) for j, pred in enumerate(labels)]
+
+        try:
+            with closing(self._connect()) as conn, conn:
+                cursor = conn.execute(f"INSERT INTO evaluations ({', '.join(row)}) VALUES ({', '.join('?' * len(row))})",
+                                      list(row.values()))
+                evaluation_id = cursor.lastrowid
+                conn.executemany("INSERT INTO class_metrics VALUES (?, ?, ?, ?, ?, ?)",
+                                 [(evaluation_id, *class_row) for class_row in class_rows])
+                conn.executemany("INSERT INTO confusion_cells VALUES (?, ?, ?, ?)",
+                                 [(evaluation_id, *cell) for cell in confusion_rows])
+            return evaluation_id
+        except sqlite3.Error as e:
+            logger.error(f"Failed to store the evaluation of {species} in {self.path}: {e}", exc_info=True)
+            raise
+
+    def _query(self, sql, params=()):
+        with closing(self._connect()) as conn:
+            return pd.read_sql_query(sql, conn, params=params)
+
+    def evaluations(self, species=None, run_id=None, limit=None):
+        """Evaluations (newest first), optionally of one species and/or one run."""
+        where, params = [], []
+        if species is not None:
+            where.append("species = ?")
+            params.append(species)
+        if run_id is not None:
+            where.append("run_id = ?")
+            params.append(run_id)
+        sql = "SELECT * FROM evaluations"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        sql += " ORDER BY created_at DESC, id DESC"
+        if limit is not None:
+            sql += f" LIMIT {int(limit)}"
+        return self._query(sql, params)
+
+    def class_metrics(self, species=None, run_id=None):
+        """Per-class precision/recall/F1 of the matching evaluations, with their species and run."""
+        where, params = [], []
+        if species is not None:
+            where.append("e.species = ?")
+            params.append(species)
+        if run_id is not None:
+            where.append("e.run_id = ?")
+            params.append(run_id)
+        sql = ("SELECT e.id AS evaluation_id, e.run_id, e.species, e.created_at, m.label, m.precision, m.recall, "
+               "m.f1, m.support FROM class_metrics m JOIN evaluations e ON e.id = m.evaluation_id")
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        return self._query(sql + " ORDER BY e.created_at, e.id, m.label", params)
+
+    def confusion_matrix(self, evaluation_id):
+        """The confusion matrix of one evaluation as a DataFrame (true labels x predicted labels)."""
+        cells = self._query("SELECT true_label, predicted_label, count FROM confusion_cells WHERE evaluation_id = ? "
+                            "ORDER BY rowid", (evaluation_id,))
+        labels = list(dict.fromkeys(cells["true_label"]))  # stored in class order
+        return cells.pivot(index="true_label", columns="predicted_label", values="count").reindex(
+            index=labels, columns=labels)
+
+    def accuracy_trend(self, species=None):
+        """Accuracy and macro F1 of every evaluation over time, one column per species."""
+        df = self.evaluations(species=species).sort_values(["created_at", "id"])
+        return df.pivot_table(index="created_at", columns="species", values=["accuracy", "macro_f1"])
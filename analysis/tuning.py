@@ -0,0 +1,277 @@
+"""
+Hyperparameter search over the classifier backends of analysis/model.py.
+
+Candidates (random draws from SEARCH_SPACES) are compared with successive halving on a
+stratified K-fold split of the training data: every round fits the remaining candidates on a
+growing share of each fold's training rows and keeps the best 1/factor of them, so most
+candidates are only ever fitted on small subsets. The preprocessing (ColumnTransformer) of
+each backend is fitted once per fold and its transformed matrices are reused by all candidates
+and rounds; large matrices are memory-mapped from disk. Fits run in parallel on n_jobs cores.
+"""
+
+import json
+import logging
+import math
+import os
+import shutil
+import tempfile
+import time
+import joblib
+import numpy as np
+import pandas as pd
+from joblib import Parallel, delayed
+from scipy import sparse
+from scipy.stats import loguniform, randint
+from sklearn.base import clone
+from sklearn.metrics import get_scorer
+from sklearn.model_selection import ParameterSampler, StratifiedKFold
+import analysis.model as model
+
+logger = logging.getLogger(__name__)
+
+# Search settings; also part of the stage cache key in main.py
+TUNING_PARAMS = {"n_candidates": 16, "cv": 5, "factor": 3, "scoring": "accuracy", "random_state": 42}
+
+# Pseudo model backend (--model-backend tuned) that searches over every backend
+TUNED_BACKEND = "tuned"
+
+SEARCH_SPACES = {
+    "random_forest": {
+        "n_estimators": [100, 200, 400],
+        "max_depth": [None, 8, 16, 32],
+        "min_samples_leaf": randint(1, 10),
+        "max_features": ["sqrt", "log2", 0.5],
+        "class_weight": [None, "balanced"],
+    },
+    "hist_gradient_boosting": {
+        "learning_rate": loguniform(0.02, 0.3),
+        "max_iter": [100, 200, 400],
+        "max_leaf_nodes": [15, 31, 63],
+        "min_samples_leaf": randint(10, 100),
+        "l2_regularization": loguniform(1e-4, 1.0),
+    },
+}
+
+# Transformed fold matrices at least this large are dumped to disk and memory-mapped
+MMAP_MIN_BYTES = 64 * 1024 ** 2
+
+# The first halving round fits on at least this many rows per class
+MIN_RESOURCES_PER_CLASS = 20
+
+
+def stratified_order(y, random_state=42):
+    """
+    Return a permutation of the rows of y in which every prefix has about the class
+    proportions of y, so the first n rows are a stratified subsample for any n.
+    """
+    rng = np.random.default_rng(random_state)
+    codes = pd.factorize(np.asarray(y))[0]
+    position = np.empty(len(codes), dtype="float64")
+    for code in np.unique(codes):
+        rows = np.flatnonzero(codes == code)
+        rng.shuffle(rows)
+        position[rows] = (np.arange(len(rows)) + rng.random()) / len(rows)
+    return np.argsort(position, kind="stable")
+
+
+def sample_candidates(backends=model.BACKENDS, n_candidates=16, random_state=42):
+    """Draw n_candidates parameter sets per backend. Returns a list of (backend, params)."""
+    candidates = []
+    for backend in backends:
+        for params in ParameterSampler(SEARCH_SPACES[backend], n_candidates, random_state=random_state):
+            # numpy scalars from the distributions -> plain Python values (JSON, cache keys)
+            candidates.append((backend, {k: v.item() if isinstance(v, np.generic) else v
+                                         for k, v in sorted(params.items())}))
+    return candidates
+
+
+def _nbytes(matrix):
+    if sparse.issparse(matrix):
+        matrix = matrix.tocsr()
+        return matrix.data.nbytes + matrix.indices.nbytes + matrix.indptr.nbytes
+    return np.asarray(matrix).nbytes
+
+
+class PreprocessedFolds:
+    """
+    Stratified K folds of (X, y) with the preprocessor of every backend fitted once per fold.
+    folds[backend][i] is a dict of the transformed X_train/X_valid and y_train/y_valid of
+    fold i; the training rows are in stratified_order, so X_train[:n] is a stratified
+    subsample. Folds of at least mmap_min_bytes are kept as memory-mapped files in a
+    temporary directory (under cache_dir) until close().
+    """
+
+    def __init__(self, X, y, backends, numeric_features, categorical_features, cv=5, random_state=42,
+                 cache_dir=None, mmap_min_bytes=MMAP_MIN_BYTES):
+        self.mmap_min_bytes = mmap_min_bytes
+        self.folds = {backend: [] for backend in backends}
+        self.preprocess_seconds = 0.0
+        self.n_mmapped = 0
+        self._cache_dir = cache_dir
+        self._tempdir = None
+        y = np.asarray(y)
+        splitter = StratifiedKFold(n_splits=cv, shuffle=True, random_state=random_state)
+        for i, (train_rows, valid_rows) in enumerate(splitter.split(X, y)):
+            train_rows = train_rows[stratified_order(y[train_rows], random_state)]
+            for backend in backends:
+                start = time.perf_counter()
+                preprocessor = model.build_pipeline(backend, numeric_features, categorical_features)[0]
+                fold = {
+                    "X_train": preprocessor.fit_transform(X.iloc[train_rows]),
+                    "y_train": y[train_rows],
+                    "X_valid": preprocessor.transform(X.iloc[valid_rows]),
+                    "y_valid": y[valid_rows],
+                }
+                self.preprocess_seconds += time.perf_counter() - start
+                self.folds[backend].append(self._keep(fold, f"{backend}_{i}"))
+        self.min_train_rows = min(len(fold["y_train"]) for folds in self.folds.values() for fold in folds)
+
+    def _keep(self, fold, name):
+        if _nbytes(fold["X_train"]) + _nbytes(fold["X_valid"]) < self.mmap_min_bytes:
+            return fold
+        if self._tempdir is None:
+            if self._cache_dir:
+                os.makedirs(self._cache_dir, exist_ok=True)
+            self._tempdir = tempfile.mkdtemp(prefix="tuning_", dir=self._cache_dir)
+        path = os.path.join(self._tempdir, f"{name}.joblib")
+        joblib.dump(fold, path)
+        self.n_mmapped += 1
+        return joblib.load(path, mmap_mode="r")
+
+    def close(self):
+        self.folds = {}
+        if self._tempdir is not None:
+            shutil.rmtree(self._tempdir, ignore_errors=True)
+            self._tempdir = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def _fit_and_score(classifier, fold, n_rows, scorer):
+    """Fit a clone of classifier on the first n_rows training rows of a fold; score it on the validation rows."""
+    classifier = clone(classifier)
+    start = time.perf_counter()
+    classifier.fit(fold["X_train"][:n_rows], fold["y_train"][:n_rows])
+    fit_seconds = time.perf_counter() - start
+    start = time.perf_counter()
+    score = scorer(classifier, fold["X_valid"], fold["y_valid"])
+    return score, fit_seconds, time.perf_counter() - start
+
+
+def successive_halving(folds, candidates, classifiers, factor=3, scoring="accuracy", n_jobs=-1, n_classes=2):
+    """
+    Run successive halving over candidates ((backend, params) pairs, with classifiers[i] the
+    unfitted classifier of candidates[i]) on PreprocessedFolds. Returns the trials DataFrame:
+    one row per candidate and round with the rows it was fitted on, its mean/std validation
+    score and its mean fit and score seconds per fold.
+    """
+    scorer = get_scorer(scoring)
+    max_resources = folds.min_train_rows
+    n_rounds = int(math.log(len(candidates), factor)) + 1 if len(candidates) > 1 else 1
+    min_resources = max(MIN_RESOURCES_PER_CLASS * n_classes, max_resources // factor ** (n_rounds - 1))
+    while n_rounds > 1 and min_resources * factor ** (n_rounds - 1) > max_resources:
+        n_rounds -= 1
+
+    remaining = list(range(len(candidates)))
+    trials = []
+    with Parallel(n_jobs=n_jobs) as parallel:
+        for round_ in range(n_rounds):
+            n_rows = max_resources if round_ == n_rounds - 1 else min_resources * factor ** round_
+            jobs = [(i, fold) for i in remaining for fold in folds.folds[candidates[i][0]]]
+            outputs = parallel(delayed(_fit_and_score)(classifiers[i], fold, n_rows, scorer) for i, fold in jobs)
+            by_candidate = {}
+            for (i, _), output in zip(jobs, outputs):
+                by_candidate.setdefault(i, []).append(output)
+            round_trials = []
+            for i in remaining:
+                scores, fit_seconds, score_seconds = np.array(by_candidate[i]).T
+                round_trials.append({
+                    "round": round_, "n_rows": n_rows, "candidate": i,
+                    "backend": candidates[i][0], "params": json.dumps(candidates[i][1], sort_keys=True),
+                    "mean_score": scores.mean(), "std_score": scores.std(),
+                    "fit_seconds": round(fit_seconds.mean(), 4), "score_seconds": round(score_seconds.mean(), 4),
+                })
+            # Best mean score first; ties go to the earlier candidate, so the survivors don't depend on timing
+            round_trials.sort(key=lambda t: (-t["mean_score"], t["candidate"]))
+            trials.extend(round_trials)
+            logger.info(f"Halving round {round_ + 1}/{n_rounds}: {len(remaining)} candidates on {n_rows} rows, "
+                        f"best {scoring} {round_trials[0]['mean_score']:.4f} ({round_trials[0]['backend']})")
+            remaining = [t["candidate"] for t in round_trials[:math.ceil(len(round_trials) / factor)]]
+    return pd.DataFrame(trials)
+
+
+def tune_classification_model(df, target_col='abundance_class', backends=model.BACKENDS, n_jobs=-1,
+                              max_cardinality=model.MAX_CATEGORY_CARDINALITY, cache_dir=None, **settings):
+    """
+    Search the classifier backends and parameters for abundance_class and refit the best
+    pipeline on the training split of model.split_training_data. settings override
+    TUNING_PARAMS (n_candidates per backend, cv folds, halving factor, scoring, random_state).
+    Returns (clf, y_test, y_pred) like model.train_classification_model; the search trials
+    are stored on clf as `tuning_trials_` and the winning backend and parameters in `fit_stats_`.
+    """
+    try:
+        settings = {**TUNING_PARAMS, **settings}
+        X_train, X_test, y_train, y_test = model.split_training_data(df, target_col)
+        numeric_features, categorical_features, dropped = model.select_features(X_train, max_cardinality)
+        if dropped:
+            logger.info(f"Columns left out of the features (constant, high-cardinality or unsupported dtype): {dropped}")
+
+        candidates = sample_candidates(backends, settings["n_candidates"], settings["random_state"])
+        # Parallelism comes from the search, so every classifier fits on one core
+        classifiers = [model.build_pipeline(backend, numeric_features, categorical_features, n_jobs=1)[-1]
+                       .set_params(**params) for backend, params in candidates]
+
+        start = time.perf_counter()
+        with PreprocessedFolds(X_train, y_train, backends, numeric_features, categorical_features,
+                               cv=settings["cv"], random_state=settings["random_state"], cache_dir=cache_dir) as folds:
+            trials = successive_halving(folds, candidates, classifiers, settings["factor"], settings["scoring"],
+                                        n_jobs, n_classes=y_train.nunique())
+            preprocess_seconds, n_mmapped = folds.preprocess_seconds, folds.n_mmapped
+        search_seconds = time.perf_counter() - start
+
+        best = trials[trials["round"] == trials["round"].max()].iloc[0]
+        backend, params = candidates[int(best["candidate"])]
+        logger.info(f"Best of {len(candidates)} candidates: {backend} {params} "
+                    f"({settings['scoring']} {best['mean_score']:.4f}); search took {search_seconds:.1f}s, "
+                    f"{preprocess_seconds:.1f}s of it preprocessing ({n_mmapped} folds memory-mapped)")
+
+        clf = model.build_pipeline(backend, numeric_features, categorical_features, n_jobs=n_jobs)
+        clf.set_params(**{f"classifier__{name}": value for name, value in params.items()})
+        start_wall, start_cpu = time.perf_counter(), time.process_time()
+        clf.fit(X_train, y_train)
+        clf.feature_schema_ = {col: str(X_train[col].dtype) for col in X_train.columns}
+        clf.fit_stats_ = {
+            "backend": backend,
+            "n_train": len(X_train),
+            "n_features": len(numeric_features) + len(categorical_features),
+            "fit_seconds": round(time.perf_counter() - start_wall, 3),
+            "fit_cpu_seconds": round(time.process_time() - start_cpu, 3),
+            "peak_memory_mb": None,
+            "tuned_params": params,
+            "cv_score": float(best["mean_score"]),
+            "search_seconds": round(search_seconds, 3),
+            "preprocess_seconds": round(preprocess_seconds, 3),
+            "n_candidates": len(candidates),
+        }
+        clf.tuning_trials_ = trials
+        logger.info(f"Tuned {backend} classification model trained successfully: {clf.fit_stats_}")
+
+        y_pred = clf.predict(X_test)
+        return clf, y_test, y_pred
+
+    except Exception as e:
+        logger.error(f"Error during hyperparameter tuning: {e}", exc_info=True)
+        raise
+
+
+def save_trials(trials, species_name, output_dir="data/analyzed"):
+    """Write the search trials of a species to a CSV next to its confusion matrix. Returns the path."""
+    os.makedirs(output_dir, exist_ok=True)
+    path = os.path.join(output_dir, f"tuning_trials_{species_name.lower().replace(' ', '_')}.csv")
+    trials.to_csv(path, index=False)
+    logger.info(f"Saved {len(trials)} tuning trials for {species_name} to {path}")
+    return path
@@ -0,0 +1,194 @@
+"""
+Benchmark the vectorized season-window join in transform.merge_datasets against the
+original row-wise implementation, and check that both produce byte-identical output.
+
+Run from the project root:
+    python -m benchmarks.bench_merge --rows 200000
+"""
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+import etl.transform as transform
+
+
+def make_status(species=None, year_round_species=None):
+    """Build a small Maryland status table with overlapping and wrap-around (Dec -> Feb) windows."""
+    rows = [
+        ("breeding", "2023-05-24", "2023-07-26", 0.42, 0.0021),
+        ("postbreeding_migration", "2023-07-19", "2023-11-29", 0.25, 0.0013),
+        ("nonbreeding", "2023-12-13", "2023-02-22", 0.08, 0.0004),
+        ("prebreeding_migration", "2023-03-01", "2023-05-17", 0.19, 0.0009),
+        ("", "2023-02-20", "2023-03-03", 0.01, 0.0001),
+    ]
+    frames = []
+    for sp in (species or [None]):
+        df = pd.DataFrame(rows, columns=["season", "start_date", "end_date", "abundance_mean", "total_pop_percent"])
+        df["region_code"] = "USA-MD"
+        if sp is not None:
+            df["common_name"] = sp
+        frames.append(df)
+    for sp in (year_round_species or []):
+        frames.append(pd.DataFrame([{
+            "season": "year_round", "start_date": "2023-01-04", "end_date": "2023-12-27",
+            "abundance_mean": 1.3, "total_pop_percent": 0.006, "region_code": "USA-MD", "common_name": sp,
+        }]))
+    other = frames[0].copy()
+    other["region_code"] = "USA-VA"
+    return pd.concat(frames + [other], ignore_index=True)
+
+
+def make_ebd(n_rows, species=None, seed=42):
+    """Build a synthetic cleaned EBD frame with random dates, a few missing dates and non-MD rows."""
+    rng = np.random.default_rng(seed)
+    dates = pd.Timestamp("2010-01-01") + pd.to_timedelta(rng.integers(0, 14 * 365, n_rows), unit="D")
+    dates = pd.Series(dates.strftime("%Y-%m-%d"), dtype=object)
+    dates[rng.random(n_rows) < 0.001] = None
+    df = pd.DataFrame({
+        "common_name": rng.choice(species or ["Osprey"], n_rows),
+        "scientific_name": "Pandion haliaetus",
+        "observation_count": rng.choice(["1", "2", "X", "5"], n_rows),
+        "observation_date": dates,
+        "state_code": rng.choice(["US-MD", "US-MD", "US-MD", "US-VA"], n_rows),
+        "latitude": rng.uniform(37.9, 39.7, n_rows),
+        "longitude": rng.uniform(-79.5, -75.0, n_rows),
+    })
+    return df
+
+
+def legacy_merge_datasets(status_df, ebd_df):
+    """The original row-wise merge_datasets, kept (minus logging) as the reference."""
+    def choose_species_col(a, b):
+        for c in ["common_name", "scientific_name", "species_code", "species"]:
+            if c in a.columns and c in b.columns:
+                return c
+        return None
+
+    species_col = choose_species_col(status_df, ebd_df)
+
+    ebd_df = ebd_df.copy()
+    status_df = status_df.copy()
+
+    ebd_df["state_code"] = ebd_df["state_code"].fillna("").astype(str).str.lower()
+    status_df["region_code"] = status_df.get("region_code", "").fillna("").astype(str).str.lower().str.replace("usa-", "us-")
+    status_df["season"] = status_df.get("season", "").fillna("").astype(str).str.lower()
+
+    ebd_df = ebd_df[ebd_df["state_code"] == "us-md"].copy()
+    status_df = status_df[status_df["region_code"] == "us-md"].copy()
+
+    ebd_df["observation_date"] = pd.to_datetime(ebd_df.get("observation_date"), errors="coerce")
+    status_df["start_date"] = pd.to_datetime(status_df.get("start_date"), errors="coerce")
+    status_df["end_date"] = pd.to_datetime(status_df.get("end_date"), errors="coerce")
+
+    if "season" not in status_df.columns:
+        status_df["season"] = ""
+
+    year_round = status_df[status_df["season"] == "year_round"].copy()
+    seasonal = status_df[status_df["season"] != "year_round"].copy()
+
+    ebd_df["abundance_mean"] = np.nan
+    ebd_df["total_pop_percent"] = np.nan
+    ebd_df["season"] = "n/a"
+
+    if not year_round.empty:
+        if species_col is not None:
+            for _, yr in year_round.iterrows():
+                sp = yr.get(species_col)
+                if pd.isna(sp) or str(sp).strip() == "":
+                    continue
+                mask = ebd_df[species_col].fillna("").astype(str) == str(sp)
+                if mask.any():
+                    ebd_df.loc[mask, "abundance_mean"] = yr.get("abundance_mean")
+                    ebd_df.loc[mask, "total_pop_percent"] = yr.get("total_pop_percent")
+                    ebd_df.loc[mask, "season"] = yr.get("season")
+        else:
+            yr_row = year_round.iloc[0]
+            ebd_df["abundance_mean"] = yr_row.get("abundance_mean")
+            ebd_df["total_pop_percent"] = yr_row.get("total_pop_percent")
+            ebd_df["season"] = yr_row.get("season")
+            return ebd_df
+
+    if seasonal.empty:
+        return ebd_df
+
+    def md_in_range(obs_date, start_date, end_date):
+        if pd.isna(obs_date) or pd.isna(start_date) or pd.isna(end_date):
+            return False
+        obs_md = (int(obs_date.month), int(obs_date.day))
+        start_md = (int(start_date.month), int(start_date.day))
+        end_md = (int(end_date.month), int(end_date.day))
+        if start_md <= end_md:
+            return start_md <= obs_md <= end_md
+        else:
+            return obs_md >= start_md or obs_md <= end_md
+
+    def match_season_for_row(row):
+        obs_date = row["observation_date"]
+        if pd.isna(obs_date):
+            return pd.Series({"abundance_mean": np.nan, "total_pop_percent": np.nan, "season": "n/a"})
+
+        if species_col:
+            sp_val = row.get(species_col)
+            seasonal_subset = seasonal[seasonal[species_col].fillna("").astype(str) == str(sp_val)]
+            if seasonal_subset.empty:
+                seasonal_subset = seasonal
+        else:
+            seasonal_subset = seasonal
+
+        for _, srow in seasonal_subset.iterrows():
+            sd = srow.get("start_date")
+            ed = srow.get("end_date")
+            if md_in_range(obs_date, sd, ed):
+                return pd.Series({
+                    "abundance_mean": srow.get("abundance_mean"),
+                    "total_pop_percent": srow.get("total_pop_percent"),
+                    "season": srow.get("season") or "n/a"
+                })
+        return pd.Series({"abundance_mean": np.nan, "total_pop_percent": np.nan, "season": "n/a"})
+
+    needs_match_mask = ebd_df["season"].isin(["n/a", "", None])
+    if needs_match_mask.any():
+        seasonal_info = ebd_df[needs_match_mask].apply(match_season_for_row, axis=1)
+        ebd_df.loc[needs_match_mask, ["abundance_mean", "total_pop_percent", "season"]] = seasonal_info.values
+
+    return ebd_df
+
+
+def assert_identical(expected, actual):
+    """Fail unless both frames have the same dtypes and serialize to the same CSV bytes."""
+    assert list(expected.dtypes) == list(actual.dtypes), f"dtype mismatch:\n{expected.dtypes}\n{actual.dtypes}"
+    assert expected.to_csv(index=False) == actual.to_csv(index=False), "merged output differs"
+
+
+def time_call(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - start
+
+
+def run(rows):
+    scenarios = {
+        "no species key": (make_status(), make_ebd(rows)),
+        "per-species windows": (
+            make_status(["Osprey", "Northern Cardinal"]),
+            make_ebd(rows, ["Osprey", "Northern Cardinal", "American Woodcock"]),
+        ),
+        "year_round + seasonal": (
+            make_status(["Osprey"], year_round_species=["Northern Cardinal"]),
+            make_ebd(rows, ["Osprey", "Northern Cardinal"]),
+        ),
+    }
+    for name, (status_df, ebd_df) in scenarios.items():
+        expected, legacy_secs = time_call(legacy_merge_datasets, status_df, ebd_df)
+        actual, vector_secs = time_call(transform.merge_datasets, status_df, ebd_df)
+        assert_identical(expected, actual)
+        print(f"{name:>22}: {rows} rows | row-wise {legacy_secs:8.3f}s | vectorized {vector_secs:8.3f}s "
+              f"| speedup {legacy_secs / vector_secs:7.1f}x | output identical")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=50000, help="number of synthetic EBD rows")
+    run(parser.parse_args().rows)
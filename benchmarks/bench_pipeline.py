@@ -0,0 +1,214 @@
+"""
+Time every pipeline stage on synthetic inputs (see benchmarks/synthetic.py) at several sizes,
+save the timings as a baseline and flag stages that got slower than the baseline.
+
+Run from the project root:
+    python -m benchmarks.bench_pipeline --rows 10000 100000 1000000 --save-baseline
+    python -m benchmarks.bench_pipeline --rows 10000 100000 1000000        # compare to the baseline
+
+Generated inputs are kept in --data-dir and reused, so only the first run at a size pays for
+generation. A stage is flagged when its time exceeds the baseline by more than --threshold
+(relative) and --min-delta seconds; the exit status is 1 if any stage regressed.
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+from datetime import datetime
+
+import etl.extract as extract
+import etl.profiling as profiling
+import etl.storage as storage
+import etl.transform as transform
+import analysis.model as model
+import vis.visualizations as vis
+from benchmarks import synthetic
+
+SIZES = [10_000, 100_000, 1_000_000, 10_000_000, 50_000_000]
+BASELINE_PATH = "benchmarks/baseline.json"
+DATA_DIR = "benchmarks/.data"
+
+
+def check_sparse_extract(work_dir):
+    """
+    Stream a small export whose first chunk has no common names, so the column is all null in
+    the chunk that fixes the output schema, and fail unless the names of the later chunk survive.
+    """
+    ebd = synthetic.make_ebd_frame(6)
+    ebd.loc[:2, "COMMON NAME"] = ""
+    ebd_path = os.path.join(work_dir, "sparse_ebd.txt")
+    ebd.to_csv(ebd_path, sep="\t", index=False)
+    for extension in (".parquet", ".feather"):
+        output_path = os.path.join(work_dir, f"sparse_ebd{extension}")
+        assert extract.extract_ebd_streaming(ebd_path, output_path, chunksize=3) == 6
+        names = storage.read_frame(output_path)["common_name"]
+        assert names[:3].isna().all() and (names[3:] == ebd["COMMON NAME"][3:].to_numpy()).all(), names
+
+
+def bench_size(n_rows, data_dir, repeat=1, train_rows=None, track_memory=False):
+    """
+    Run the pipeline stages once per repeat on a synthetic export of n_rows rows and return
+    {stage: metrics} with the fastest wall time of each stage and its CPU time, peak memory
+    and row counts (see etl.profiling.StageProfiler).
+    """
+    paths = synthetic.generate(data_dir, n_rows)
+    work_dir = tempfile.mkdtemp(prefix=f"bench-{n_rows}-")
+    cwd = os.getcwd()
+    best = {}
+    try:
+        check_sparse_extract(work_dir)
+        os.chdir(work_dir)  # the plot functions write to data/... relative paths
+        ebd_path = os.path.abspath(os.path.join(cwd, paths["ebd"]))
+        status_path = os.path.abspath(os.path.join(cwd, paths["status"]))
+
+        for _ in range(repeat):
+            records = []
+            profiler = profiling.StageProfiler(path=os.path.join(work_dir, "metrics.jsonl"),
+                                               track_memory=track_memory)
+            shutil.rmtree("data", ignore_errors=True)  # no skipped plots or stale outputs
+            os.makedirs("data/outputs")
+            for name in ("shapefiles", "reference-tables"):
+                os.symlink(os.path.join(cwd, "data", name), os.path.join("data", name))
+
+            def stage(name, rows_in=None):
+                return profiler.stage(f"{n_rows}", name, rows_in=rows_in)
+
+            with stage("extract_ebd") as record:
+                record["rows_out"] = extract.extract_ebd_streaming(ebd_path, "data/ebd.parquet")
+            records.append(record)
+            with stage("extract_status") as record:
+                extract.extract_data(status_path, "data/status.parquet")
+            records.append(record)
+            with stage("clean_ebd") as record:
+                ebd = transform.clean_ebd_data("data/ebd.parquet")
+                record["rows_out"] = len(ebd)
+            records.append(record)
+            with stage("clean_status") as record:
+                status = transform.clean_status_data("data/status.parquet")
+                record["rows_out"] = len(status)
+            records.append(record)
+            with stage("merge", len(ebd)) as record:
+                merged = transform.merge_datasets(status, ebd)
+                record["rows_out"] = len(merged)
+            records.append(record)
+            with stage("categorize", len(merged)) as record:
+                merged = transform.categorize_abundance(merged)
+                record["rows_out"] = len(merged)
+            records.append(record)
+
+            train_df = merged
+            if train_rows is not None and len(merged) > train_rows:
+                train_df = merged.sample(train_rows, random_state=42)
+            with stage("train", len(train_df)) as record:
+                clf, y_test, y_pred = model.train_classification_model(train_df, track_memory=False)
+                record["rows_out"] = len(y_test)
+            records.append(record)
+
+            with stage("plot_eda", len(merged)) as record:
+                transform.run_eda(merged).result()
+            records.append(record)
+            with stage("plot_locations", len(merged)) as record:
+                vis.plot_bird_locations(merged, "Osprey").result()
+            records.append(record)
+            with stage("plot_confusion_matrix", len(y_test)) as record:
+                vis.plot_confusion_matrix(y_test, y_pred, "Osprey").result()
+            records.append(record)
+
+            for record in records:
+                name = record["stage"]
+                if name not in best or record["wall_seconds"] < best[name]["wall_seconds"]:
+                    best[name] = {key: record.get(key) for key in
+                                  ("wall_seconds", "cpu_seconds", "traced_peak_mb", "peak_rss_mb", "rows_in", "rows_out")}
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(work_dir, ignore_errors=True)
+    return best
+
+
+def compare(results, baseline, threshold, min_delta):
+    """Return [(size, stage, baseline_seconds, seconds)] for stages slower than the baseline."""
+    regressions = []
+    for size, stages in results.items():
+        for name, metrics in stages.items():
+            previous = baseline.get(size, {}).get(name)
+            if previous is None:
+                continue
+            before, now = previous["wall_seconds"], metrics["wall_seconds"]
+            if now > before * (1 + threshold) and now - before > min_delta:
+                regressions.append((size, name, before, now))
+    return regressions
+
+
+def print_results(results, baseline):
+    print(f"{'rows':>10} {'stage':>22} {'wall s':>9} {'cpu s':>9} {'rss MB':>8} {'baseline s':>11} {'change':>8}")
+    for size, stages in results.items():
+        for name, metrics in stages.items():
+            previous = baseline.get(size, {}).get(name)
+            before = "" if previous is None else f"{previous['wall_seconds']:.3f}"
+            change = "" if not previous else f"{metrics['wall_seconds'] / max(previous['wall_seconds'], 1e-9) - 1:+.0%}"
+            print(f"{size:>10} {name:>22} {metrics['wall_seconds']:9.3f} {metrics['cpu_seconds']:9.3f} "
+                  f"{metrics['peak_rss_mb'] or 0:8.0f} {before:>11} {change:>8}")
+
+
+def load_baseline(path):
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)["results"]
+
+
+def save_baseline(results, path):
+    baseline = {
+        "created_at": datetime.now().isoformat(timespec="seconds"),
+        "machine": {"python": platform.python_version(), "platform": platform.platform(),
+                    "processor": platform.processor(), "cpu_count": os.cpu_count()},
+        "results": results,
+    }
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "w") as f:
+        json.dump(baseline, f, indent=2)
+    print(f"Saved baseline to {path}")
+
+
+def run(sizes, data_dir=DATA_DIR, baseline_path=BASELINE_PATH, save=False, threshold=0.2, min_delta=0.05,
+        repeat=1, train_rows=None, track_memory=False):
+    results = {}
+    for n_rows in sizes:
+        print(f"Benchmarking {n_rows} rows...", flush=True)
+        results[str(n_rows)] = bench_size(n_rows, data_dir, repeat, train_rows, track_memory)
+
+    baseline = load_baseline(baseline_path)
+    print_results(results, baseline)
+    if save:
+        # keep the baseline of sizes that were not rerun
+        save_baseline({**baseline, **results}, baseline_path)
+        return []
+
+    regressions = compare(results, baseline, threshold, min_delta)
+    for size, name, before, now in regressions:
+        print(f"REGRESSION: {name} at {size} rows took {now:.3f}s vs {before:.3f}s in the baseline")
+    if baseline and not regressions:
+        print(f"No stage regressed by more than {threshold:.0%} against {baseline_path}")
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, nargs="+", default=SIZES[:3],
+                        help=f"EBD sizes to benchmark (default {SIZES[:3]}; up to {SIZES[-1]})")
+    parser.add_argument("--data-dir", default=DATA_DIR, help="where synthetic inputs are generated and reused")
+    parser.add_argument("--baseline", default=BASELINE_PATH, help="baseline timings file (JSON)")
+    parser.add_argument("--save-baseline", action="store_true", help="write these timings to the baseline file")
+    parser.add_argument("--threshold", type=float, default=0.2, help="relative slowdown flagged as a regression")
+    parser.add_argument("--min-delta", type=float, default=0.05, help="ignore slowdowns smaller than this (seconds)")
+    parser.add_argument("--repeat", type=int, default=1, help="runs per size; the fastest run of each stage is kept")
+    parser.add_argument("--train-rows", type=int, default=None, help="train on a sample of at most this many rows")
+    parser.add_argument("--trace-memory", action="store_true", help="record tracemalloc peaks (slows stages down)")
+    args = parser.parse_args()
+
+    regressions = run(args.rows, args.data_dir, args.baseline, args.save_baseline, args.threshold, args.min_delta,
+                      args.repeat, args.train_rows, args.trace_memory)
+    sys.exit(1 if regressions else 0)
@@ -0,0 +1,66 @@
+"""
+Measure the cold-start time of main.py and check it stays within a bound.
+
+Each case runs in a fresh interpreter (the fastest of --repeat runs is kept):
+- `python main.py --help` (argument parsing only),
+- `import main` followed by a check that none of the heavy libraries (pandas, scikit-learn,
+  matplotlib, seaborn, geopandas) were imported; main.py loads them lazily per stage.
+
+Run from the project root:
+    python -m benchmarks.bench_startup --max-seconds 0.5
+
+The exit status is 1 if a case exceeds --max-seconds or a heavy library is imported eagerly.
+"""
+import argparse
+import json
+import subprocess
+import sys
+import time
+
+HEAVY_MODULES = ["pandas", "sklearn", "matplotlib", "seaborn", "geopandas", "pyarrow"]
+
+# Prints the heavy modules that `import main` actually executed (lazy modules don't count)
+IMPORT_CHECK = (
+    "import json, sys, types, main; "
+    f"print(json.dumps([m for m in {HEAVY_MODULES!r} if type(sys.modules.get(m)) is types.ModuleType]))"
+)
+
+CASES = {
+    "help": [sys.executable, "main.py", "--help"],
+    "import": [sys.executable, "-c", IMPORT_CHECK],
+}
+
+
+def time_command(command, repeat=5):
+    """Return (fastest wall seconds, stdout of the last run) of running command repeat times."""
+    best, output = float("inf"), ""
+    for _ in range(repeat):
+        start = time.perf_counter()
+        completed = subprocess.run(command, capture_output=True, text=True, check=True)
+        best = min(best, time.perf_counter() - start)
+        output = completed.stdout
+    return best, output
+
+
+def run(max_seconds=0.5, repeat=5):
+    failures = []
+    for name, command in CASES.items():
+        seconds, output = time_command(command, repeat)
+        print(f"{name:>8}: {seconds:.3f}s (bound {max_seconds:.3f}s)")
+        if seconds > max_seconds:
+            failures.append(f"'{name}' took {seconds:.3f}s, more than {max_seconds:.3f}s")
+        if name == "import":
+            eager = json.loads(output.strip().splitlines()[-1])
+            if eager:
+                failures.append(f"'import main' imported {', '.join(eager)} eagerly")
+    for failure in failures:
+        print(f"FAILED: {failure}")
+    return failures
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--max-seconds", type=float, default=0.5, help="cold-start bound per case")
+    parser.add_argument("--repeat", type=int, default=5, help="runs per case; the fastest is kept")
+    args = parser.parse_args()
+    sys.exit(1 if run(args.max_seconds, args.repeat) else 0)
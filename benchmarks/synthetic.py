@@ -0,0 +1,229 @@
+"""
+Synthetic eBird Basic Dataset (EBD) exports and Status & Trends regional tables.
+
+The files follow the layout of the real inputs in cornel_bird_data/ (see the data dictionaries
+in data/reference-tables/): a tab-separated EBD export with the full 52-column header and a
+regional status CSV per species. Values follow rough real-world distributions: sightings are
+clustered around hotspots, more frequent in spring, counts are small and skewed with ~5% "X",
+and a few percent of rows fall outside Maryland. Large exports are written in chunks, so
+generating 50M rows needs no more memory than one chunk.
+
+    python -m benchmarks.synthetic --rows 100000 --out benchmarks/.data
+"""
+import argparse
+import os
+import zlib
+
+import numpy as np
+import pandas as pd
+
+# species_code -> (common name, scientific name, taxonomic order, year-round resident in MD)
+SPECIES = {
+    "osprey": ("Osprey", "Pandion haliaetus", 7737, False),
+    "amewoo": ("American Woodcock", "Scolopax minor", 6016, False),
+    "norcar": ("Northern Cardinal", "Cardinalis cardinalis", 33282, True),
+}
+
+EBD_HEADER = [
+    "GLOBAL UNIQUE IDENTIFIER", "LAST EDITED DATE", "TAXONOMIC ORDER", "CATEGORY", "TAXON CONCEPT ID",
+    "COMMON NAME", "SCIENTIFIC NAME", "SUBSPECIES COMMON NAME", "SUBSPECIES SCIENTIFIC NAME", "EXOTIC CODE",
+    "OBSERVATION COUNT", "BREEDING CODE", "BREEDING CATEGORY", "BEHAVIOR CODE", "AGE/SEX", "COUNTRY",
+    "COUNTRY CODE", "STATE", "STATE CODE", "COUNTY", "COUNTY CODE", "IBA CODE", "BCR CODE", "USFWS CODE",
+    "ATLAS BLOCK", "LOCALITY", "LOCALITY ID", "LOCALITY TYPE", "LATITUDE", "LONGITUDE", "OBSERVATION DATE",
+    "TIME OBSERVATIONS STARTED", "OBSERVER ID", "OBSERVER ORCID ID", "SAMPLING EVENT IDENTIFIER",
+    "OBSERVATION TYPE", "PROTOCOL NAME", "PROTOCOL CODE", "PROJECT NAMES", "PROJECT IDENTIFIERS",
+    "DURATION MINUTES", "EFFORT DISTANCE KM", "EFFORT AREA HA", "NUMBER OBSERVERS", "ALL SPECIES REPORTED",
+    "GROUP IDENTIFIER", "HAS MEDIA", "APPROVED", "REVIEWED", "REASON", "CHECKLIST COMMENTS", "SPECIES COMMENTS",
+]
+
+STATUS_COLUMNS = [
+    "species_code", "common_name", "scientific_name", "prediction_year", "region_type", "region_code",
+    "region_name", "continent_code", "continent_name", "season", "start_date", "end_date", "abundance_mean",
+    "total_pop_percent", "continent_pop_percent", "range_occupied_percent", "range_total_percent",
+    "range_days_occupation", "max_week", "max_week_percent_pop",
+]
+
+# Maryland counties (name, FIPS) and a few hotspot centres (lat, lon, spread in degrees)
+MD_COUNTIES = [
+    ("Allegany", "001"), ("Anne Arundel", "003"), ("Baltimore", "005"), ("Calvert", "009"), ("Caroline", "011"),
+    ("Carroll", "013"), ("Cecil", "015"), ("Charles", "017"), ("Dorchester", "019"), ("Frederick", "021"),
+    ("Garrett", "023"), ("Harford", "025"), ("Howard", "027"), ("Kent", "029"), ("Montgomery", "031"),
+    ("Prince George's", "033"), ("Queen Anne's", "035"), ("St. Mary's", "037"), ("Somerset", "039"),
+    ("Talbot", "041"), ("Washington", "043"), ("Wicomico", "045"), ("Worcester", "047"), ("Baltimore City", "510"),
+]
+HOTSPOTS = [
+    (39.29, -76.61, 0.15), (38.98, -76.49, 0.10), (39.05, -77.10, 0.15), (38.40, -76.10, 0.25),
+    (38.33, -75.10, 0.08), (39.65, -78.75, 0.20), (39.45, -77.40, 0.20), (38.30, -76.45, 0.15),
+]
+NEIGHBOURS = [("US-VA", "Virginia"), ("US-PA", "Pennsylvania"), ("US-DE", "Delaware"), ("US-WV", "West Virginia")]
+PROTOCOLS = [("Traveling", "P22", 0.55), ("Stationary", "P21", 0.35), ("Incidental", "P20", 0.07), ("Area", "P23", 0.03)]
+
+# Seasons of a migratory species (a nonbreeding window wraps around the new year)
+SEASONS = [
+    ("breeding", "2023-05-24", "2023-07-26"),
+    ("postbreeding_migration", "2023-07-27", "2023-11-29"),
+    ("nonbreeding", "2023-11-30", "2023-02-22"),
+    ("prebreeding_migration", "2023-02-23", "2023-05-23"),
+]
+
+
+def _observation_dates(rng, n_rows, start="2010-01-01", end="2024-01-31"):
+    """Dates weighted towards spring and towards recent years, as eBird usage grew."""
+    days = (pd.Timestamp(end) - pd.Timestamp(start)).days
+    offsets = (days * rng.beta(1.6, 1.0, n_rows)).astype("int64")
+    dates = pd.Timestamp(start) + pd.to_timedelta(offsets, unit="D")
+    # a fifth of the sightings are moved into May of the same year (spring migration)
+    may = pd.to_datetime(pd.DataFrame({"year": dates.year, "month": 5, "day": 1}))
+    may = pd.DatetimeIndex(may) + pd.to_timedelta(rng.integers(0, 31, n_rows), unit="D")
+    return dates.where(rng.random(n_rows) >= 0.2, may)
+
+
+def _prefixed(prefix, values):
+    return (prefix + pd.Series(values).astype(str)).to_numpy()
+
+
+def make_ebd_frame(n_rows, species_code="osprey", seed=0, start_id=0, md_fraction=0.97):
+    """Build n_rows of a raw EBD export (columns as in EBD_HEADER) for one species."""
+    rng = np.random.default_rng(seed)
+    common, scientific, taxonomic_order, _ = SPECIES[species_code]
+
+    hotspot = rng.integers(0, len(HOTSPOTS), n_rows)
+    centres = np.array(HOTSPOTS)[hotspot]
+    latitude = np.clip(rng.normal(centres[:, 0], centres[:, 2]), 37.9, 39.72).round(6)
+    longitude = np.clip(rng.normal(centres[:, 1], centres[:, 2] * 1.3), -79.49, -75.05).round(6)
+
+    in_md = rng.random(n_rows) < md_fraction
+    neighbour = rng.integers(0, len(NEIGHBOURS), n_rows)
+    state_code = np.where(in_md, "US-MD", np.array([code for code, _ in NEIGHBOURS])[neighbour])
+    state = np.where(in_md, "Maryland", np.array([name for _, name in NEIGHBOURS])[neighbour])
+    county = rng.integers(0, len(MD_COUNTIES), n_rows)
+    minutes = rng.integers(5 * 60, 19 * 60, n_rows)
+
+    counts = rng.geometric(0.45, n_rows).astype(str)
+    counts[rng.random(n_rows) < 0.05] = "X"
+
+    protocol = rng.choice(len(PROTOCOLS), n_rows, p=[p for _, _, p in PROTOCOLS])
+    dates = _observation_dates(rng, n_rows)
+    ids = np.arange(start_id, start_id + n_rows)
+    checklist = ids // 3  # a few observations per checklist
+    locality = rng.integers(0, 5000, n_rows)
+
+    blank = np.full(n_rows, "", dtype=object)
+    columns = {col: blank for col in EBD_HEADER}
+    columns.update({
+        "GLOBAL UNIQUE IDENTIFIER": _prefixed("URN:CornellLabOfOrnithology:EBIRD:OBS", ids),
+        "LAST EDITED DATE": (dates + pd.Timedelta(days=30)).strftime("%Y-%m-%d %H:%M:%S"),
+        "TAXONOMIC ORDER": taxonomic_order,
+        "CATEGORY": "species",
+        "TAXON CONCEPT ID": f"avibase-{zlib.crc32(species_code.encode()):08X}",
+        "COMMON NAME": common,
+        "SCIENTIFIC NAME": scientific,
+        "OBSERVATION COUNT": counts,
+        "COUNTRY": "United States",
+        "COUNTRY CODE": "US",
+        "STATE": state,
+        "STATE CODE": state_code,
+        "COUNTY": np.where(in_md, np.array([name for name, _ in MD_COUNTIES])[county], ""),
+        "COUNTY CODE": np.where(in_md, _prefixed("US-MD-", np.array([fips for _, fips in MD_COUNTIES])[county]), ""),
+        "BCR CODE": rng.choice([28, 29, 30], n_rows),
+        "LOCALITY": _prefixed("Locality ", locality),
+        "LOCALITY ID": _prefixed("L", locality),
+        "LOCALITY TYPE": rng.choice(["H", "P"], n_rows, p=[0.6, 0.4]),
+        "LATITUDE": latitude,
+        "LONGITUDE": longitude,
+        "OBSERVATION DATE": dates.strftime("%Y-%m-%d"),
+        "TIME OBSERVATIONS STARTED": (pd.Series(minutes // 60).astype(str).str.zfill(2) + ":"
+                                      + pd.Series(minutes % 60).astype(str).str.zfill(2) + ":00").to_numpy(),
+        "OBSERVER ID": _prefixed("obsr", rng.integers(0, 20000, n_rows)),
+        "SAMPLING EVENT IDENTIFIER": _prefixed("S", checklist),
+        "OBSERVATION TYPE": np.array([name for name, _, _ in PROTOCOLS])[protocol],
+        "PROTOCOL NAME": np.array([name for name, _, _ in PROTOCOLS])[protocol],
+        "PROTOCOL CODE": np.array([code for _, code, _ in PROTOCOLS])[protocol],
+        "DURATION MINUTES": rng.integers(5, 240, n_rows),
+        "EFFORT DISTANCE KM": np.where(protocol == 0, rng.exponential(2.0, n_rows).round(3), np.nan),
+        "NUMBER OBSERVERS": rng.integers(1, 4, n_rows),
+        "ALL SPECIES REPORTED": rng.choice([0, 1], n_rows, p=[0.1, 0.9]),
+        "HAS MEDIA": rng.choice([0, 1], n_rows, p=[0.95, 0.05]),
+        "APPROVED": 1,
+        "REVIEWED": rng.choice([0, 1], n_rows, p=[0.97, 0.03]),
+    })
+    df = pd.DataFrame(columns, columns=EBD_HEADER)
+    df[""] = ""  # real exports end every line with a tab
+    return df
+
+
+def write_ebd(path, n_rows, species_code="osprey", seed=0, chunk_rows=1_000_000):
+    """Write a synthetic tab-separated EBD export of n_rows rows to path, chunk_rows at a time."""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "w", newline="") as f:
+        for i, start in enumerate(range(0, n_rows, chunk_rows)):
+            chunk = make_ebd_frame(min(chunk_rows, n_rows - start), species_code, seed=seed * 100_003 + i,
+                                   start_id=start)
+            chunk.to_csv(f, sep="\t", index=False, header=(i == 0))
+    return path
+
+
+def make_status_frame(species_code="osprey", seed=0, n_regions=400):
+    """
+    Build a regional Status & Trends table for one species: Maryland and its neighbours plus
+    n_regions other states and countries, one row per season (a single year_round row for
+    resident species).
+    """
+    rng = np.random.default_rng(seed)
+    common, scientific, _, resident = SPECIES[species_code]
+    regions = [("USA-MD", "Maryland", "state")] + [
+        (code.replace("US-", "USA-"), name, "state") for code, name in NEIGHBOURS]
+    regions += [(f"R{i:03d}", f"Region {i}", rng.choice(["country", "state"])) for i in range(n_regions)]
+    seasons = [("year_round", "2023-01-04", "2023-12-27")] if resident else SEASONS
+
+    rows = []
+    for code, name, region_type in regions:
+        for season, start, end in seasons:
+            rows.append({
+                "species_code": species_code, "common_name": common, "scientific_name": scientific,
+                "prediction_year": 2023, "region_type": region_type, "region_code": code, "region_name": name,
+                "continent_code": np.nan, "continent_name": "North America", "season": season,
+                "start_date": start, "end_date": end,
+                "abundance_mean": rng.lognormal(-2.0, 1.0),
+                "total_pop_percent": rng.lognormal(-8.0, 1.5),
+                "continent_pop_percent": rng.lognormal(-7.5, 1.5),
+                "range_occupied_percent": rng.uniform(0.2, 1.0),
+                "range_total_percent": rng.lognormal(-8.0, 1.0),
+                "range_days_occupation": int(rng.integers(7, 365)),
+                "max_week": end,
+                "max_week_percent_pop": rng.lognormal(-8.0, 1.5),
+            })
+    return pd.DataFrame(rows, columns=STATUS_COLUMNS)
+
+
+def write_status(path, species_code="osprey", seed=0, n_regions=400):
+    """Write a synthetic regional status CSV to path."""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    make_status_frame(species_code, seed, n_regions).to_csv(path, index=False)
+    return path
+
+
+def generate(out_dir, n_rows, species_code="osprey", seed=0):
+    """
+    Write (or reuse, if already generated) the EBD export and status table for one species
+    and size under out_dir. Returns {"ebd": path, "status": path}.
+    """
+    ebd_path = os.path.join(out_dir, f"ebd_US-MD_{species_code}_{n_rows}_s{seed}.txt")
+    status_path = os.path.join(out_dir, f"{species_code}_regional_2023_s{seed}.csv")
+    if not os.path.exists(ebd_path):
+        tmp_path = ebd_path + ".partial"
+        write_ebd(tmp_path, n_rows, species_code, seed)
+        os.replace(tmp_path, ebd_path)
+    if not os.path.exists(status_path):
+        write_status(status_path, species_code, seed)
+    return {"ebd": ebd_path, "status": status_path}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=100_000, help="number of EBD rows")
+    parser.add_argument("--species", choices=sorted(SPECIES), default="osprey")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", default="benchmarks/.data", help="output directory")
+    args = parser.parse_args()
+    print(generate(args.out, args.rows, args.species, args.seed))
@@ -0,0 +1,53 @@
+"""
+Background asyncio event loop for overlapping blocking file I/O with the rest of the pipeline.
+
+A BackgroundLoop runs an event loop in a daemon thread; coroutines submitted from the pipeline's
+(synchronous) code run there and return concurrent.futures.Future objects. Blocking reads and
+writes are moved off the loop with asyncio.to_thread, so several of them proceed at once while
+the calling thread keeps computing. Used by the input prefetcher (etl/extract.py) and the
+write-back queue (etl/load.py).
+"""
+
+import asyncio
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+class BackgroundLoop:
+    """An asyncio event loop running in a daemon thread named `name`."""
+
+    def __init__(self, name="aio"):
+        self.name = name
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        asyncio.set_event_loop(self._loop)
+        self._loop.run_forever()
+
+    def submit(self, coroutine):
+        """Schedule a coroutine on the loop and return a concurrent.futures.Future of its result."""
+        return asyncio.run_coroutine_threadsafe(coroutine, self._loop)
+
+    def close(self):
+        """Stop the loop once its scheduled callbacks have run and wait for the thread."""
+        if self._loop.is_closed():
+            return
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._loop.close()
+
+
+def run_in_threads(*calls):
+    """
+    Run blocking calls, given as (function, *args) tuples, concurrently in threads and wait for
+    all of them. Returns their results in order, with an exception in place of the result of
+    each call that raised.
+    """
+    async def gather():
+        return await asyncio.gather(*(asyncio.to_thread(*call) for call in calls), return_exceptions=True)
+
+    return asyncio.run(gather())
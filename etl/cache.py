@@ -0,0 +1,150 @@
+"""
+Content-addressed on-disk cache for pipeline stage outputs.
+
+A stage's key is a hash of its name, the content of its input files, its parameters and the
+source code of the modules it runs. When the key matches a stored artifact the artifact is
+loaded instead of recomputing the stage. The store is bounded in size: artifacts are evicted
+least-recently-used first, using file modification times (touched on every hit) so that
+several worker processes can share one cache directory without a shared index.
+"""
+
+import hashlib
+import inspect
+import json
+import logging
+import os
+import pickle
+import tempfile
+
+logger = logging.getLogger(__name__)
+
+# In-process memo of file digests keyed on (path, size, mtime) so each input is hashed once per run
+_file_digests = {}
+
+
+def file_digest(path, chunk_size=1 << 20):
+    """Return the sha256 hex digest of a file's content, reading it in chunks."""
+    stat = os.stat(path)
+    memo_key = (os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+    if memo_key not in _file_digests:
+        digest = hashlib.sha256()
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(chunk_size), b""):
+                digest.update(block)
+        _file_digests[memo_key] = digest.hexdigest()
+    return _file_digests[memo_key]
+
+
+def code_digest(*objects):
+    """Return a digest of the source code of the given modules, classes or functions."""
+    digest = hashlib.sha256()
+    for obj in objects:
+        digest.update(inspect.getsource(obj).encode("utf-8"))
+    return digest.hexdigest()
+
+
+class StageCache:
+    """
+    Size-bounded, LRU-evicted store of pickled stage artifacts under `root`.
+
+    enabled=False turns every lookup into a miss and skips storing; refresh=True recomputes
+    every stage and overwrites the stored artifacts (forced invalidation).
+    """
+
+    def __init__(self, root="data/cache/stages", max_bytes=2 * 1024 ** 3, enabled=True, refresh=False):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.enabled = enabled
+        self.refresh = refresh
+
+    def key(self, stage, inputs=(), params=None, code=()):
+        """
+        Build the cache key for a stage from its input files (hashed by content),
+        its parameters (JSON-serializable) and code digests.
+        """
+        payload = {
+            "stage": stage,
+            "inputs": [file_digest(path) for path in inputs],
+            "params": params or {},
+            "code": list(code),
+        }
+        return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+    def _path(self, stage, key):
+        return os.path.join(self.root, f"{stage}-{key[:32]}.pkl")
+
+    def has(self, stage, key):
+        """True if get_or_compute would load (stage, key) from the cache instead of computing it."""
+        return self.enabled and not self.refresh and os.path.exists(self._path(stage, key))
+
+    def get_or_compute(self, stage, key, compute):
+        """Return the stored artifact for (stage, key) if there is one, otherwise compute and store it."""
+        path = self._path(stage, key)
+        if self.enabled and not self.refresh and os.path.exists(path):
+            try:
+                with open(path, "rb") as f:
+                    value = pickle.load(f)
+                os.utime(path)  # mark as recently used
+                logger.info(f"Cache hit for stage '{stage}' ({os.path.basename(path)})")
+                return value
+            except Exception as e:
+                logger.warning(f"Ignoring unreadable cache entry {path}: {e}")
+
+        value = compute()
+        if self.enabled:
+            self.store(path, value)
+        return value
+
+    def store(self, path, value):
+        """Atomically write an artifact, then evict old entries if the store is over its size limit."""
+        os.makedirs(self.root, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=self.root, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        logger.info(f"Cached stage artifact {os.path.basename(path)} ({os.path.getsize(path)} bytes)")
+        self.evict()
+
+    def entries(self):
+        """Return (path, size, last_used) for every stored artifact, least recently used first."""
+        if not os.path.isdir(self.root):
+            return []
+        entries = []
+        for name in os.listdir(self.root):
+            if not name.endswith(".pkl"):
+                continue
+            path = os.path.join(self.root, name)
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:  # evicted by another process
+                continue
+            entries.append((path, stat.st_size, stat.st_mtime))
+        return sorted(entries, key=lambda entry: entry[2])
+
+    def evict(self):
+        """Delete least-recently-used artifacts until the store fits in max_bytes."""
+        entries = self.entries()
+        total = sum(size for _, size, _ in entries)
+        for path, size, _ in entries:
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+                logger.info(f"Evicted cache entry {os.path.basename(path)}")
+            except FileNotFoundError:
+                pass
+            total -= size
+
+    def clear(self):
+        """Delete every stored artifact."""
+        for path, _, _ in self.entries():
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+        logger.info(f"Cleared stage cache at {self.root}")
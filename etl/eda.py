@@ -0,0 +1,141 @@
+"""
+Single-pass, mergeable summary statistics for exploratory data analysis.
+
+EdaAccumulator.update takes the merged data one chunk at a time (a whole frame, a partition of
+the out-of-core merge or a batch read from disk) and keeps only small running aggregates:
+row and null counts, value counts of a low-cardinality column (season), count/mean/variance/
+min/max of the numeric columns (Welford/Chan) and histogram counts on a fixed bin grid.
+Accumulators built on different chunks or in different processes are combined with merge.
+"""
+
+import logging
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+# Width of the fixed histogram grid; bins are anchored at 0 so any two accumulators line up
+HIST_BIN_WIDTH = 0.001
+
+
+def _add_counts(keys, counts, new_keys, new_counts):
+    """Sum two (sorted unique keys, counts) pairs."""
+    merged_keys, inverse = np.unique(np.concatenate([keys, new_keys]), return_inverse=True)
+    merged_counts = np.bincount(inverse, weights=np.concatenate([counts, new_counts]), minlength=len(merged_keys))
+    return merged_keys, merged_counts.astype("int64")
+
+
+class EdaAccumulator:
+    """
+    Running EDA statistics of a DataFrame seen in chunks.
+
+    hist_column is histogrammed on bins of hist_bin_width (anchored at 0), and value counts are
+    kept for top_k_column. Numeric and boolean columns get count/mean/variance/min/max.
+    """
+
+    def __init__(self, hist_column="abundance_mean", hist_bin_width=HIST_BIN_WIDTH, top_k_column="season"):
+        self.hist_column = hist_column
+        self.hist_bin_width = hist_bin_width
+        self.top_k_column = top_k_column
+        self.rows = 0
+        self.columns = []
+        self.nulls = {}
+        self.moments = {}  # column -> [count, mean, M2, min, max]
+        self.value_counts = {}
+        self.hist_bins = np.array([], dtype="int64")
+        self.hist_counts = np.array([], dtype="int64")
+
+    def update(self, df):
+        """Add a chunk of rows."""
+        self.rows += len(df)
+        for col in df.columns:
+            if col not in self.nulls:
+                self.columns.append(col)
+                self.nulls[col] = 0
+            values = df[col]
+            self.nulls[col] += int(values.isna().sum())
+
+            if pd.api.types.is_bool_dtype(values) or pd.api.types.is_numeric_dtype(values):
+                self._add_moments(col, values.dropna().to_numpy(dtype="float64"))
+
+        if self.top_k_column in df.columns:
+            for value, count in df[self.top_k_column].value_counts(dropna=False).items():
+                if count:
+                    key = "<null>" if pd.isna(value) else str(value)
+                    self.value_counts[key] = self.value_counts.get(key, 0) + int(count)
+
+        if self.hist_column in df.columns:
+            values = pd.to_numeric(df[self.hist_column], errors="coerce").to_numpy(dtype="float64")
+            values = values[np.isfinite(values)]
+            bins, counts = np.unique(np.floor(values / self.hist_bin_width).astype("int64"), return_counts=True)
+            self.hist_bins, self.hist_counts = _add_counts(self.hist_bins, self.hist_counts, bins, counts)
+        return self
+
+    def _add_moments(self, col, values):
+        if len(values) == 0:
+            return
+        n_b, mean_b = len(values), float(values.mean())
+        m2_b = float(((values - mean_b) ** 2).sum())
+        self._combine(col, [n_b, mean_b, m2_b, float(values.min()), float(values.max())])
+
+    def _combine(self, col, other):
+        """Chan et al.'s parallel combination of two (count, mean, M2, min, max) summaries."""
+        if col not in self.moments:
+            self.moments[col] = list(other)
+            return
+        n_a, mean_a, m2_a, min_a, max_a = self.moments[col]
+        n_b, mean_b, m2_b, min_b, max_b = other
+        n = n_a + n_b
+        delta = mean_b - mean_a
+        self.moments[col] = [n, mean_a + delta * n_b / n, m2_a + m2_b + delta ** 2 * n_a * n_b / n,
+                             min(min_a, min_b), max(max_a, max_b)]
+
+    def merge(self, other):
+        """Add the statistics of another accumulator (same histogram bin width)."""
+        if other.hist_bin_width != self.hist_bin_width:
+            raise ValueError("Can't merge EDA accumulators with different histogram bin widths")
+        self.rows += other.rows
+        for col in other.columns:
+            if col not in self.nulls:
+                self.columns.append(col)
+                self.nulls[col] = 0
+            self.nulls[col] += other.nulls[col]
+        for col, summary in other.moments.items():
+            self._combine(col, summary)
+        for key, count in other.value_counts.items():
+            self.value_counts[key] = self.value_counts.get(key, 0) + count
+        self.hist_bins, self.hist_counts = _add_counts(self.hist_bins, self.hist_counts,
+                                                       other.hist_bins, other.hist_counts)
+        return self
+
+    @property
+    def shape(self):
+        return self.rows, len(self.columns)
+
+    def top_k(self, k=5):
+        """The k most frequent values of top_k_column as a Series (like value_counts().head(k))."""
+        counts = pd.Series(self.value_counts, dtype="int64", name="count")
+        counts.index.name = self.top_k_column
+        return counts.sort_values(ascending=False, kind="stable").head(k)
+
+    def describe(self):
+        """count/mean/std/var/min/max of every numeric column as a DataFrame."""
+        rows = {}
+        for col, (n, mean, m2, lo, hi) in self.moments.items():
+            var = m2 / (n - 1) if n > 1 else np.nan
+            rows[col] = {"count": n, "mean": mean, "std": np.sqrt(var), "var": var, "min": lo, "max": hi}
+        return pd.DataFrame.from_dict(rows, orient="index")
+
+    def histogram(self, bins=30):
+        """
+        Return (edges, counts) of a histogram of hist_column with `bins` equal-width bins over its
+        range, regrouped from the fixed grid (edges are multiples of hist_bin_width).
+        """
+        if len(self.hist_bins) == 0:
+            return np.array([0.0, 1.0]), np.array([0])
+        first, last = int(self.hist_bins[0]), int(self.hist_bins[-1])
+        grid_per_bin = max(1, int(np.ceil((last - first + 1) / bins)))
+        groups = (self.hist_bins - first) // grid_per_bin
+        counts = np.bincount(groups, weights=self.hist_counts).astype("int64")
+        edges = (first + grid_per_bin * np.arange(len(counts) + 1)) * self.hist_bin_width
+        return edges, counts
@@ -1,31 +1,171 @@
+import asyncio
+import functools
 import os
 import pandas as pd
 import logging
+import etl.aio as aio
+import etl.storage as storage
 
 logger = logging.getLogger(__name__)
 
+# EBD columns used downstream (normalized names) and the dtypes they are parsed with.
+# observation_count stays a string because eBird uses "X" for present-but-uncounted.
+EBD_COLUMNS = {
+    "scientific_name": str,
+    "common_name": str,
+    "observation_count": str,
+    "observation_date": str,
+    "state_code": str,
+    "latitude": "float64",
+    "longitude": "float64",
+}
+
+# Parsed to datetime64 while streaming so columnar outputs store real dates
+EBD_DATE_COLUMNS = ["observation_date"]
+
+
+def normalize_column_name(col):
+    """Lowercase a column name and replace spaces with underscores (e.g. 'STATE CODE' -> 'state_code')."""
+    return col.strip().lower().replace(" ", "_")
+
+
+def get_separator(file_path):
+    """
+    Determine delimiter by file extension:
+    - .csv assumes comma-separated
+    - .txt assumes tab-separated
+    """
+    if file_path.endswith('.txt'):
+        return '\t'
+    elif file_path.endswith('.csv'):
+        return ','
+    raise ValueError("Unsupported file type. Only .csv and .txt files are supported.")
+
+
+def get_column_projection(file_path, columns, sep=None):
+    """
+    Read only the header of a file and map the wanted (normalized) column names to the names
+    actually used in the file. Returns (usecols, dtype) ready to pass to pd.read_csv.
+    """
+    if file_path.endswith(('.txt', '.csv')):
+        header = pd.read_csv(file_path, sep=sep or get_separator(file_path), nrows=0).columns
+    else:
+        header = storage.read_columns(file_path)
+    usecols = [col for col in header if normalize_column_name(col) in columns]
+    dtype = {col: columns[normalize_column_name(col)] for col in usecols}
+    return usecols, dtype
+
+
 def extract_data(file_path: str, output_filename: str):
     """
-    Reads a CSV or TXT file and writes it as a CSV to 'data/extracted/' folder.
-    Uses the delimiter based on file extension: 
+    Reads a CSV or TXT file and writes it to 'data/extracted/' folder.
+    Uses the delimiter based on file extension:
     - .csv assumes comma-separated
     - .txt assumes tab-separated
+    The output format follows the extension of output_filename (.parquet, .feather or .csv).
     """
     try:
-        # Determine delimiter by file extension
-        if file_path.endswith('.txt'):
-            sep = '\t'
-        elif file_path.endswith('.csv'):
-            sep = ','
-        else:
-            raise ValueError("Unsupported file type. Only .csv and .txt files are supported.")
-        
+        sep = get_separator(file_path)
         logger.info(f"Reading: {file_path} with sep='{sep}'")
         df = pd.read_csv(file_path, low_memory=False, sep=sep)  # reads the file into a DataFrame
-        df.to_csv(output_filename, index=False)  # writes the DataFrame to a CSV file
+        storage.write_frame(df, output_filename)  # writes the DataFrame in the requested format
         logger.info(f"Saved extracted data to {output_filename}")
         return df
-    
+
     except Exception as e:
         logger.error(f"Failed to extract data from {file_path}: {e}", exc_info=True)
         raise
+
+
+def extract_ebd_streaming(file_path: str, output_filename: str, state_code="US-MD", chunksize=250_000,
+                          columns=None, since=None):
+    """
+    Streams an EBD export in chunks of `chunksize` rows and writes only the columns used
+    downstream (see EBD_COLUMNS), with normalized column names and parsed dates, to
+    output_filename (.parquet, .feather or .csv).
+    Rows are filtered to `state_code` while streaming (pass None to keep every state), and with
+    `since` (a date) to rows observed on or after it, so peak memory depends on the chunk size
+    rather than the size of the export.
+    Returns the number of rows written.
+    """
+    try:
+        columns = columns or EBD_COLUMNS
+        sep = get_separator(file_path)
+        usecols, dtype = get_column_projection(file_path, columns, sep=sep)
+        logger.info(f"Streaming: {file_path} with sep='{sep}', chunksize={chunksize}, columns={len(usecols)}")
+
+        rows_read = rows_written = 0
+        reader = pd.read_csv(file_path, sep=sep, usecols=usecols, dtype=dtype, engine="c", chunksize=chunksize)
+        with storage.open_writer(output_filename, dtypes=columns) as writer:
+            for chunk in reader:
+                rows_read += len(chunk)
+                chunk.columns = [normalize_column_name(col) for col in chunk.columns]
+                if state_code is not None and "state_code" in chunk.columns:
+                    chunk = chunk[chunk["state_code"].str.strip().str.upper() == state_code.upper()]
+                dates = {col: pd.to_datetime(chunk[col], errors="coerce") for col in EBD_DATE_COLUMNS if col in chunk}
+                chunk = chunk.assign(**dates)
+                if since is not None and "observation_date" in chunk.columns:
+                    chunk = chunk[chunk["observation_date"] >= pd.Timestamp(since)]
+                writer.write(chunk)
+            rows_written = writer.rows
+
+        if rows_written == 0:
+            # Empty export; still write the schema so downstream readers see the columns
+            empty = pd.DataFrame(columns=[normalize_column_name(col) for col in usecols])
+            storage.write_frame(empty, output_filename)
+
+        logger.info(f"Saved {rows_written} of {rows_read} streamed rows to {output_filename}")
+        return rows_written
+
+    except Exception as e:
+        logger.error(f"Failed to stream EBD data from {file_path}: {e}", exc_info=True)
+        raise
+
+
+async def extract_sources_async(ebd_path, ebd_output, status_path, status_output, **ebd_options):
+    """
+    Extract a species' EBD export (extract_ebd_streaming, with ebd_options) and status table
+    (extract_data) concurrently, each in its own thread. Returns (EBD rows written, status
+    result), with the exception in place of the result of a source that failed.
+    """
+    return tuple(await asyncio.gather(asyncio.to_thread(extract_ebd_streaming, ebd_path, ebd_output, **ebd_options),
+                                      asyncio.to_thread(extract_data, status_path, status_output),
+                                      return_exceptions=True))
+
+
+def extract_sources(ebd_path, ebd_output, status_path, status_output, **ebd_options):
+    """Blocking version of extract_sources_async."""
+    return aio.run_in_threads((functools.partial(extract_ebd_streaming, **ebd_options), ebd_path, ebd_output),
+                              (extract_data, status_path, status_output))
+
+
+class InputPrefetcher:
+    """
+    Runs input-reading coroutines (e.g. extract_sources_async for the next species) on a
+    background event loop while the pipeline works on the current species. take(key) hands
+    over the Future of a prefetched key, or None if it was not prefetched.
+    """
+
+    def __init__(self):
+        self._loop = aio.BackgroundLoop("prefetch")
+        self._pending = {}
+
+    def prefetch(self, key, coroutine):
+        self._pending[key] = self._loop.submit(coroutine)
+        logger.info(f"Prefetching inputs for {key}")
+
+    def take(self, key):
+        return self._pending.pop(key, None)
+
+    def close(self):
+        """Wait for prefetches nobody took (they write files) and stop the loop."""
+        for future in self._pending.values():
+            future.exception()
+        self._pending.clear()
+        self._loop.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
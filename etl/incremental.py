@@ -0,0 +1,198 @@
+"""
+Incremental (delta) ingestion of new eBird releases.
+
+Every EBD release repeats the whole history of a species. A per-species watermark records the
+newest observation_date ingested so far, and the EBD global unique identifiers of the rows on
+that date; an update extracts only rows observed on or after the watermark date, drops the
+ones already ingested (by identifier), merges the rest with the status table and appends them
+as a new part next to the species' merged file.
+
+Store of a species (paths from species_paths in main.py):
+    data/processed/<species>_merged_data.parquet         base from a full merge (optional)
+    data/processed/<species>_merged_parts/part-00001.parquet, ...    appended deltas
+    data/processed/<species>_merged_parts/watermark.json             watermark and committed parts
+A part only counts once the watermark listing it has been written, so an interrupted update
+leaves the store as it was. A full merge rewrites the base and resets the parts (reset_store).
+"""
+
+import hashlib
+import json
+import logging
+import os
+import shutil
+from datetime import datetime
+import numpy as np
+import pandas as pd
+import etl.cache as cache
+import etl.storage as storage
+from etl.extract import EBD_COLUMNS
+
+logger = logging.getLogger(__name__)
+
+GUID_COLUMN = "global_unique_identifier"
+
+# Columns extracted for a delta: the usual EBD columns plus the identifier used to dedupe
+DELTA_EBD_COLUMNS = {**EBD_COLUMNS, GUID_COLUMN: str}
+
+WATERMARK_FILE = "watermark.json"
+
+
+def read_watermark(parts_dir):
+    """Return the watermark of a store (a dict), or None if the species has never been updated."""
+    path = os.path.join(parts_dir, WATERMARK_FILE)
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+
+def write_watermark(parts_dir, watermark):
+    """Write the watermark atomically; this commits the parts it lists."""
+    os.makedirs(parts_dir, exist_ok=True)
+    path = os.path.join(parts_dir, WATERMARK_FILE)
+    tmp_path = storage._temp_path(path)
+    try:
+        with open(tmp_path, "w") as f:
+            json.dump(watermark, f, indent=2)
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def initial_watermark(merged_path=None, cutoffs=None):
+    """
+    Watermark of a store without updates: the newest observation_date of the base merged file,
+    if there is one. The base has no identifiers, so the first update takes only later dates.
+    cutoffs (the abundance class bounds of the base) are kept to categorize every delta alike.
+    """
+    watermark = {"observation_date": None, "boundary_guids": [], "parts": [], "cutoffs": cutoffs,
+                 "rows": 0, "updated_at": None}
+    if merged_path and os.path.exists(merged_path):
+        dates = pd.to_datetime(storage.read_frame(merged_path, columns=["observation_date"])["observation_date"],
+                               errors="coerce")
+        if dates.notna().any():
+            watermark.update(observation_date=dates.max().isoformat(), boundary_guids=None, rows=len(dates))
+    return watermark
+
+
+def watermark_date(watermark):
+    """The watermark date as a Timestamp, or None if everything is new."""
+    if watermark is None or watermark["observation_date"] is None:
+        return None
+    return pd.Timestamp(watermark["observation_date"])
+
+
+def select_new_rows(ebd_df, watermark):
+    """
+    Keep the rows of an extracted EBD delta that are not in the store yet: observed after the
+    watermark date, or on it with an identifier not ingested before. Duplicate identifiers
+    within the delta and rows without a date are dropped too.
+    """
+    before = len(ebd_df)
+    dates = pd.to_datetime(ebd_df["observation_date"], errors="coerce")
+    keep = dates.notna().to_numpy()
+    if GUID_COLUMN in ebd_df.columns:
+        keep &= ~ebd_df[GUID_COLUMN].duplicated().to_numpy()
+    since = watermark_date(watermark)
+    if since is not None:
+        newer = (dates > since).to_numpy()
+        if watermark["boundary_guids"] is None or GUID_COLUMN not in ebd_df.columns:
+            keep &= newer
+        else:
+            unseen = ~ebd_df[GUID_COLUMN].isin(watermark["boundary_guids"]).to_numpy()
+            keep &= newer | ((dates == since).to_numpy() & unseen)
+    new_rows = ebd_df[keep]
+    logger.info(f"{len(new_rows)} of {before} extracted rows are new (watermark {watermark_date(watermark)})")
+    return new_rows
+
+
+def advance(watermark, new_rows, part_name, rows_appended, cutoffs=None):
+    """Return the watermark after appending part_name, which holds the merged new_rows."""
+    dates = pd.to_datetime(new_rows["observation_date"], errors="coerce")
+    latest = dates.max()
+    since = watermark_date(watermark)
+    guids = new_rows[GUID_COLUMN].astype(str) if GUID_COLUMN in new_rows.columns else None
+    if pd.isna(latest) or (since is not None and latest <= since):
+        # Only rows on the watermark date were new: the date stays and their identifiers join the boundary
+        latest = since
+        boundary = None if watermark["boundary_guids"] is None or guids is None else sorted(
+            set(watermark["boundary_guids"]) | set(guids[(dates == since).to_numpy()]))
+    else:
+        boundary = None if guids is None else sorted(set(guids[(dates == latest).to_numpy()]))
+    return {
+        "observation_date": None if latest is None else latest.isoformat(),
+        "boundary_guids": boundary,
+        "parts": watermark["parts"] + [part_name],
+        "cutoffs": cutoffs if cutoffs is not None else watermark["cutoffs"],
+        "rows": watermark["rows"] + rows_appended,
+        "updated_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+    }
+
+
+def append_part(parts_dir, merged_delta, new_rows, watermark, cutoffs=None):
+    """
+    Write merged_delta (the merged and categorized new_rows) as the next part of the store and
+    commit it by advancing the watermark. Returns the new watermark.
+    """
+    try:
+        os.makedirs(parts_dir, exist_ok=True)
+        part_name = f"part-{len(watermark['parts']) + 1:05d}.parquet"
+        storage.write_frame(merged_delta.reset_index(drop=True), os.path.join(parts_dir, part_name))
+        watermark = advance(watermark, new_rows, part_name, len(merged_delta), cutoffs)
+        write_watermark(parts_dir, watermark)
+        logger.info(f"Appended {len(merged_delta)} rows as {part_name} to {parts_dir}; "
+                    f"watermark now {watermark['observation_date']}")
+        return watermark
+    except Exception as e:
+        logger.error(f"Failed to append a part to {parts_dir}: {e}", exc_info=True)
+        raise
+
+
+def store_files(merged_path, parts_dir):
+    """The files of a store in order: the base merged file (if any), then the committed parts."""
+    files = [merged_path] if os.path.exists(merged_path) else []
+    watermark = read_watermark(parts_dir)
+    if watermark is not None:
+        files += [os.path.join(parts_dir, name) for name in watermark["parts"]]
+    return files
+
+
+def store_digest(merged_path, parts_dir):
+    """Content digest of a store; the digest of the base file alone while there are no parts."""
+    digests = [cache.file_digest(path) for path in store_files(merged_path, parts_dir)]
+    if len(digests) == 1:
+        return digests[0]
+    return hashlib.sha256("".join(digests).encode("utf-8")).hexdigest()
+
+
+def has_parts(parts_dir):
+    """True if the species has committed incremental parts."""
+    watermark = read_watermark(parts_dir)
+    return watermark is not None and len(watermark["parts"]) > 0
+
+
+def read_store(merged_path, parts_dir, columns=None):
+    """Read the base merged file and every committed part of a store into one frame."""
+    frames = [storage.read_frame(path, columns=columns) for path in store_files(merged_path, parts_dir)]
+    if not frames:
+        raise FileNotFoundError(f"neither {merged_path} nor parts in {parts_dir} exist")
+    if len(frames) == 1:
+        return frames[0]
+    df = pd.concat(frames, ignore_index=True)
+    # Parts with different categories concatenate to object columns; restore the categoricals
+    for col, dtype in frames[0].dtypes.items():
+        if isinstance(dtype, pd.CategoricalDtype) and not isinstance(df[col].dtype, pd.CategoricalDtype):
+            categories = pd.unique(np.concatenate([frame[col].cat.categories.to_numpy(dtype=object)
+                                                   for frame in frames]))
+            if dtype.ordered:
+                categories = dtype.categories  # ordered classes (abundance_class) keep their order
+            df[col] = pd.Categorical(df[col], categories=categories, ordered=dtype.ordered)
+    return df
+
+
+def reset_store(parts_dir):
+    """Remove the parts and watermark of a store (a full merge has replaced the base)."""
+    if os.path.isdir(parts_dir):
+        shutil.rmtree(parts_dir)
+        logger.info(f"Reset incremental parts in {parts_dir}")
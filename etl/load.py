@@ -1,16 +1,85 @@
+import asyncio
 import os
+import threading
 import pandas as pd
 import logging
+import etl.aio as aio
+import etl.storage as storage
 
 logger = logging.getLogger(__name__)
 
-def save_processed_data(df: pd.DataFrame, filename: str):
+# Frames a write-back queue may hold before submit blocks (bounds the memory of pending writes)
+WRITE_BACK_MAX_PENDING = 4
+
+_queues = {}
+_queues_lock = threading.Lock()
+
+
+def save_processed_data(df: pd.DataFrame, filename: str, export_csv=False):
     """
     Save cleaned (after transform.py) DataFrame to data/processed/ folder.
+    The format follows the file extension (.parquet, .feather or .csv, see etl.storage).
+    With export_csv=True a CSV copy is also written next to a columnar file.
+    Files are written atomically (temporary file, then rename).
     """
     try:
-        df.to_csv(filename, index=False)
+        storage.write_frame(df, filename)
         logger.info(f"Saved processed data to: {filename}")
+        if export_csv and storage.is_columnar(filename):
+            csv_path = os.path.splitext(filename)[0] + ".csv"
+            storage.write_frame(df, csv_path)
+            logger.info(f"Exported processed data as CSV to: {csv_path}")
     except Exception as e:
         logger.error(f"Failed to save processed data to {filename}: {e}", exc_info=True)
         raise
+
+
+class WriteBackQueue:
+    """
+    Saves frames with save_processed_data on a background event loop, so the pipeline moves on
+    to the next stage while the file is written. submit returns a concurrent Future that is
+    resolved (or holds the error) once the file is in place; at most max_pending frames are
+    held at once, further submits wait for a write to finish.
+    """
+
+    def __init__(self, max_pending=WRITE_BACK_MAX_PENDING):
+        self.max_pending = max_pending
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._loop = aio.BackgroundLoop("write-back")
+        self._futures = set()
+
+    async def _save(self, df, filename, export_csv):
+        try:
+            await asyncio.to_thread(save_processed_data, df, filename, export_csv)
+        finally:
+            self._slots.release()
+
+    def submit(self, df, filename, export_csv=False):
+        self._slots.acquire()
+        future = self._loop.submit(self._save(df, filename, export_csv))
+        self._futures.add(future)
+        future.add_done_callback(self._futures.discard)
+        return future
+
+    def flush(self):
+        """Wait for every submitted write; failures stay on their Futures."""
+        for future in list(self._futures):
+            future.exception()
+
+    def close(self):
+        self.flush()
+        self._loop.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def get_write_queue(max_pending=WRITE_BACK_MAX_PENDING):
+    """Return the write-back queue of this process, creating it once."""
+    with _queues_lock:
+        if max_pending not in _queues:
+            _queues[max_pending] = WriteBackQueue(max_pending)
+        return _queues[max_pending]
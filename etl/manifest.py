@@ -0,0 +1,81 @@
+"""
+Species manifest: the list of species the pipeline runs on and their input files.
+
+A manifest is a JSON, TOML or YAML file with a `species` list. Each entry has a `name` and
+either explicit `status` and `ebd` paths or a `code` filled into the `paths` templates, so
+hundreds of species with the same file layout take one line each:
+
+    {
+      "paths": {"status": "cornel_bird_data/trends_and_status_ds/{code}_regional_2023.csv",
+                "ebd": "cornel_bird_data/ebd_ds/ebd_US-MD_{code}_201001_202401_smp_relJun-2025.txt"},
+      "species": [{"name": "osprey", "code": "osprey"}, {"name": "cardinal", "code": "norcar"}]
+    }
+
+Only the standard library is imported here, so loading a manifest adds nothing to startup time.
+"""
+
+import json
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_PATH = "config/species.json"
+
+REQUIRED_FIELDS = ("status", "ebd")
+
+
+def _read(path):
+    extension = os.path.splitext(path)[1].lower()
+    if extension == ".json":
+        with open(path) as f:
+            return json.load(f)
+    if extension == ".toml":
+        import tomllib
+        with open(path, "rb") as f:
+            return tomllib.load(f)
+    if extension in (".yaml", ".yml"):
+        try:
+            import yaml
+        except ImportError as e:
+            raise ImportError("Reading a YAML species manifest requires PyYAML (pip install pyyaml)") from e
+        with open(path) as f:
+            return yaml.safe_load(f)
+    raise ValueError(f"Unsupported manifest format '{extension}' for {path}. Use .json, .toml or .yaml.")
+
+
+def load_species(path=MANIFEST_PATH, names=None):
+    """
+    Read a species manifest and return its entries as dicts with name, status and ebd paths
+    (plus any other fields of the entry). names selects a subset, in manifest order.
+    """
+    try:
+        manifest = _read(path)
+        templates = manifest.get("paths", {})
+        species_files, seen = [], set()
+        for entry in manifest.get("species", []):
+            if "name" not in entry:
+                raise ValueError(f"Species entry without a name in {path}: {entry}")
+            if entry["name"] in seen:
+                raise ValueError(f"Species '{entry['name']}' is listed twice in {path}")
+            seen.add(entry["name"])
+            bird = dict(entry)
+            for field in REQUIRED_FIELDS:
+                if field not in bird:
+                    if field not in templates:
+                        raise ValueError(f"Species '{entry['name']}' has no '{field}' path and {path} "
+                                         f"has no '{field}' template")
+                    bird[field] = templates[field].format(**entry)
+            species_files.append(bird)
+
+        if names:
+            unknown = set(names) - seen
+            if unknown:
+                raise ValueError(f"Species not in {path}: {sorted(unknown)}")
+            species_files = [bird for bird in species_files if bird["name"] in set(names)]
+        logger.info(f"Loaded {len(species_files)} species from {path}")
+        return species_files
+
+    except Exception as e:
+        logger.error(f"Failed to load the species manifest {path}: {e}", exc_info=True)
+        raise
@@ -0,0 +1,84 @@
+"""
+Region/species-partitioned dataset of merged data, written by `merge --all-regions`.
+
+Each partition is one parquet file in a hive-style directory, so a reader of one region and
+species opens only that file (pyarrow.dataset and other hive-aware readers can also load the
+whole tree with the region and species columns restored from the paths):
+
+    data/processed/merged_dataset/region=us-md/species=osprey/part-00000.parquet
+    data/processed/merged_dataset/region=us-va/species=osprey/part-00000.parquet
+
+Partition values are URI-encoded path segments, like pyarrow writes them.
+"""
+
+import logging
+import os
+import shutil
+from urllib.parse import quote, unquote
+import etl.storage as storage
+
+logger = logging.getLogger(__name__)
+
+DATASET_DIR = "data/processed/merged_dataset"
+
+PARTITION_FILE = "part-00000.parquet"
+
+
+def partition_dir(region, species, root=DATASET_DIR):
+    return os.path.join(root, f"region={quote(str(region), safe='')}", f"species={quote(str(species), safe='')}")
+
+
+def partition_path(region, species, root=DATASET_DIR):
+    """File holding the merged rows of one species in one region."""
+    return os.path.join(partition_dir(region, species, root), PARTITION_FILE)
+
+
+def list_partitions(root=DATASET_DIR, species=None):
+    """The (region, species) pairs in the dataset, optionally of one species, sorted."""
+    partitions = []
+    if not os.path.isdir(root):
+        return partitions
+    for region_entry in os.scandir(root):
+        if not (region_entry.is_dir() and region_entry.name.startswith("region=")):
+            continue
+        for species_entry in os.scandir(region_entry.path):
+            if species_entry.is_dir() and species_entry.name.startswith("species="):
+                name = unquote(species_entry.name[len("species="):])
+                if (species is None or name == species) and os.path.exists(os.path.join(species_entry.path, PARTITION_FILE)):
+                    partitions.append((unquote(region_entry.name[len("region="):]), name))
+    return sorted(partitions)
+
+
+def remove_stale(species, regions, root=DATASET_DIR):
+    """
+    Remove the partitions of a species outside `regions` (the regions just written), so regions
+    it no longer has don't linger. Called once the new partitions are in place: each write
+    replaces its partition atomically, so a failed merge leaves the previous ones readable.
+    """
+    keep = set(regions)
+    for region, name in list_partitions(root, species):
+        if region not in keep:
+            shutil.rmtree(partition_dir(region, name, root))
+            logger.info(f"Removed the stale {region} partition of {species} from {root}")
+
+
+def write_partition(df, region, species, root=DATASET_DIR, write_queue=None):
+    """
+    Write one partition (atomically, see etl.storage), or hand it to write_queue (an
+    etl.load.WriteBackQueue) and return the Future of the write. Returns the path otherwise.
+    """
+    path = partition_path(region, species, root)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    if write_queue is not None:
+        return write_queue.submit(df, path)
+    storage.write_frame(df, path)
+    logger.info(f"Saved {len(df)} rows of {species} in {region} to {path}")
+    return path
+
+
+def read_partition(region, species, root=DATASET_DIR, columns=None):
+    """Read the merged rows of one species in one region, without touching the other partitions."""
+    path = partition_path(region, species, root)
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"{path} not found; run 'merge --all-regions' for {species} first")
+    return storage.read_frame(path, columns=columns)
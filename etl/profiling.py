@@ -0,0 +1,131 @@
+"""
+Per-stage timing and memory instrumentation for the pipeline.
+
+StageProfiler.stage wraps one stage for one species and appends a JSON record to a metrics
+file with its wall and CPU time, traced (tracemalloc) peak memory, the process's peak RSS and
+the input/output row counts. Records from several worker processes can share one file: each
+record is a single appended line. Selected stages can also be run under cProfile, with the
+stats dumped to a .prof file (view with `python -m pstats` or snakeviz).
+"""
+
+import cProfile
+import json
+import logging
+import os
+import sys
+import time
+import tracemalloc
+import uuid
+from contextlib import contextmanager
+from datetime import datetime
+
+try:
+    import resource
+except ImportError:  # not available on Windows
+    resource = None
+
+logger = logging.getLogger(__name__)
+
+METRICS_PATH = "data/metrics/stage_metrics.jsonl"
+PROFILE_DIR = "data/metrics/profiles"
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process so far in MB, or None where it can't be measured."""
+    if resource is None:
+        return None
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # bytes on macOS, kilobytes on Linux
+    return max_rss / 1024 ** 2 if sys.platform == "darwin" else max_rss / 1024
+
+
+class StageProfiler:
+    """
+    Records per-stage metrics for a pipeline run to `path` (JSONL).
+
+    enabled=False records nothing; track_memory=False skips tracemalloc, which slows
+    allocation-heavy stages down; stages named in profile_stages are also run under cProfile
+    and their stats written to profile_dir.
+    """
+
+    def __init__(self, path=METRICS_PATH, run_id=None, enabled=True, track_memory=True,
+                 profile_stages=(), profile_dir=PROFILE_DIR):
+        self.path = path
+        self.run_id = run_id or datetime.now().strftime("%Y%m%d-%H%M%S-") + uuid.uuid4().hex[:6]
+        self.enabled = enabled
+        self.track_memory = track_memory
+        self.profile_stages = set(profile_stages)
+        self.profile_dir = profile_dir
+
+    @contextmanager
+    def stage(self, species, stage, rows_in=None):
+        """
+        Measure the body of the with-block as `stage` for `species`. Yields the record dict;
+        set record["rows_out"] (or any other field) inside the block to include it.
+        The record is written whether the stage succeeds or raises.
+        """
+        record = {"run_id": self.run_id, "species": species, "stage": stage, "rows_in": rows_in, "rows_out": None}
+        if not self.enabled:
+            yield record
+            return
+
+        started_tracing = False
+        if self.track_memory:
+            started_tracing = not tracemalloc.is_tracing()
+            if started_tracing:
+                tracemalloc.start()
+            tracemalloc.reset_peak()
+            traced_start = tracemalloc.get_traced_memory()[0]
+        profiler = cProfile.Profile() if stage in self.profile_stages else None
+
+        record["started_at"] = datetime.now().isoformat(timespec="seconds")
+        start_wall, start_cpu = time.perf_counter(), time.process_time()
+        if profiler is not None:
+            profiler.enable()
+        try:
+            yield record
+            record["status"] = "ok"
+        except BaseException as e:
+            record["status"] = "failed"
+            record["error"] = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            if profiler is not None:
+                profiler.disable()
+            record["wall_seconds"] = round(time.perf_counter() - start_wall, 4)
+            record["cpu_seconds"] = round(time.process_time() - start_cpu, 4)
+            if self.track_memory:
+                record["traced_peak_mb"] = round((tracemalloc.get_traced_memory()[1] - traced_start) / 1024 ** 2, 2)
+                if started_tracing:
+                    tracemalloc.stop()
+            rss = peak_rss_mb()
+            record["peak_rss_mb"] = None if rss is None else round(rss, 1)
+            record["pid"] = os.getpid()
+            if profiler is not None:
+                record["profile"] = self._dump_profile(profiler, species, stage)
+            self._write(record)
+
+    def _dump_profile(self, profiler, species, stage):
+        os.makedirs(self.profile_dir, exist_ok=True)
+        path = os.path.join(self.profile_dir, f"{self.run_id}-{species}-{stage}.prof")
+        profiler.dump_stats(path)
+        logger.info(f"Saved cProfile stats for {species}/{stage} to {path}")
+        return path
+
+    def _write(self, record):
+        try:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            with open(self.path, "a") as f:
+                f.write(json.dumps(record, default=str) + "\n")
+        except OSError as e:
+            logger.warning(f"Could not write stage metrics to {self.path}: {e}")
+
+
+def load_metrics(path=METRICS_PATH, run_id=None):
+    """Read the metrics file into a DataFrame, optionally keeping a single run."""
+    import pandas as pd  # keeps pandas out of the import of this module (see main.py)
+
+    df = pd.read_json(path, lines=True)
+    if run_id is not None:
+        df = df[df["run_id"] == run_id]
+    return df
@@ -0,0 +1,201 @@
+"""
+Lookup index over the reference tables in data/reference-tables.
+
+The Excel tables are parsed once: each sheet is cached as parquet under REFERENCE_CACHE_DIR,
+keyed on the content of the workbook, so later runs (and worker processes) read the binary copy
+instead of opening the workbook again. A ReferenceIndex maps region codes/names and species
+codes/names to small integer ids with plain dict lookups; columns are encoded once per distinct
+value (not once per row), so the merge joins and filters on integer arrays.
+
+Region keys are lowercased and the ISO alpha-3 country prefix of Status & Trends codes is
+folded into the eBird one ('USA-MD' -> 'us-md'). Codes and names missing from the tables get
+ids after the table entries the first time they are seen, so the pipeline runs for regions and
+species that have no reference row yet; those ids are only stable within one index.
+"""
+
+import logging
+import os
+import threading
+import numpy as np
+import pandas as pd
+import etl.cache as cache
+import etl.storage as storage
+
+logger = logging.getLogger(__name__)
+
+REFERENCE_DIR = "data/reference-tables"
+REFERENCE_CACHE_DIR = "data/cache/reference"
+
+SPECIES_TABLE = "Species_Reference_Table.csv.xlsx"
+REGION_TABLE = "region_reference_table.csv.xlsx"
+
+# Region the pipeline runs on unless a species (or --region) names another one
+DEFAULT_REGION = "US-MD"
+
+# Status & Trends uses ISO alpha-3 country prefixes, eBird alpha-2 ones
+COUNTRY_PREFIXES = {"usa-": "us-"}
+
+# Columns of the species table that identify a species, in the order their values are indexed
+SPECIES_KEY_COLUMNS = ["species_code", "common_name", "scientific_name"]
+
+# Id of a missing (null or empty) code
+MISSING_ID = -1
+
+_indexes = {}
+
+
+def region_key(code):
+    """Normalized lookup key of a region code or name (e.g. 'USA-MD ' -> 'us-md')."""
+    key = str(code).strip().lower()
+    for old, new in COUNTRY_PREFIXES.items():
+        if key.startswith(old):
+            key = new + key[len(old):]
+    return key
+
+
+def species_key(name):
+    """Normalized lookup key of a species code or name."""
+    return " ".join(str(name).split()).lower()
+
+
+def load_table(path, cache_dir=REFERENCE_CACHE_DIR):
+    """
+    Return the first sheet of a reference workbook as a DataFrame, parsing the Excel file
+    only when its parquet copy in cache_dir is missing or older than the workbook's content.
+    """
+    try:
+        digest = cache.file_digest(path)
+        stem = os.path.basename(path).split(".")[0].lower()
+        cache_path = os.path.join(cache_dir, f"{stem}-{digest[:16]}.parquet")
+        if os.path.exists(cache_path):
+            return storage.read_frame(cache_path)
+
+        df = pd.read_excel(path, sheet_name=0, dtype=str)
+        df.columns = df.columns.str.strip().str.lower().str.replace(" ", "_")
+        os.makedirs(cache_dir, exist_ok=True)
+        storage.write_frame(df, cache_path)
+        logger.info(f"Parsed reference table {path} ({len(df)} rows) and cached it to {cache_path}")
+        return df
+
+    except Exception as e:
+        logger.error(f"Failed to load reference table {path}: {e}", exc_info=True)
+        raise
+
+
+class ReferenceIndex:
+    """
+    Integer ids of the regions and species in the reference tables. Ids are row positions in
+    `regions` / `species`; every code and name of a row (normalized with region_key /
+    species_key) maps to the same id.
+    """
+
+    def __init__(self, regions, species):
+        self.regions = regions.reset_index(drop=True)
+        self.species = species.reset_index(drop=True)
+        self._region_ids = {}
+        for i, row in self.regions.iterrows():
+            for col in ["region_name", "region_code"]:
+                if pd.notna(row.get(col)):
+                    self._region_ids[region_key(row[col])] = i
+        self._species_ids = {}
+        for i, row in self.species.iterrows():
+            for col in reversed(SPECIES_KEY_COLUMNS):  # a code wins over a name that collides with it
+                if pd.notna(row.get(col)):
+                    self._species_ids[species_key(row[col])] = i
+        self._next_region_id = len(self.regions)
+        self._next_species_id = len(self.species)
+        # The index is shared by threads (prefetch, joblib merges); new ids are assigned under the lock
+        self._lock = threading.Lock()
+
+    def __getstate__(self):
+        # Sent to joblib worker processes without the lock, which can't be pickled
+        state = dict(self.__dict__)
+        del state["_lock"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_dir(cls, reference_dir=REFERENCE_DIR, cache_dir=REFERENCE_CACHE_DIR):
+        return cls(load_table(os.path.join(reference_dir, REGION_TABLE), cache_dir),
+                   load_table(os.path.join(reference_dir, SPECIES_TABLE), cache_dir))
+
+    def region_id(self, code):
+        """Id of a region code or name; a region missing from the table gets a new id."""
+        key = region_key(code)
+        if key not in self._region_ids:
+            with self._lock:
+                if key not in self._region_ids:
+                    logger.debug(f"Region '{code}' is not in the region reference table")
+                    self._region_ids[key] = self._next_region_id
+                    self._next_region_id += 1
+        return self._region_ids[key]
+
+    def species_id(self, name):
+        """Id of a species code or name; a species missing from the table gets a new id."""
+        key = species_key(name)
+        if key not in self._species_ids:
+            with self._lock:
+                if key not in self._species_ids:
+                    self._species_ids[key] = self._next_species_id
+                    self._next_species_id += 1
+        return self._species_ids[key]
+
+    def region_name(self, code):
+        """Name of a region in the table (e.g. 'US-MD' -> 'Maryland'), or None if it has no row."""
+        region = self.region_id(code)
+        if region < len(self.regions) and pd.notna(self.regions.at[region, "region_name"]):
+            return self.regions.at[region, "region_name"]
+        return None
+
+    def region_code(self, code):
+        """Normalized lookup key of a region code or name, e.g. 'Maryland' -> 'us-md'."""
+        region = self.region_id(code)
+        if region < len(self.regions) and pd.notna(self.regions.at[region, "region_code"]):
+            return region_key(self.regions.at[region, "region_code"])
+        return region_key(code)
+
+    def _encode(self, values, lookup):
+        """Map a column to int32 ids through lookup, calling it once per distinct value."""
+        values = pd.Series(values)
+        if isinstance(values.dtype, pd.CategoricalDtype):
+            codes, uniques = values.cat.codes.to_numpy(), values.cat.categories
+        else:
+            codes, uniques = pd.factorize(values)
+        ids = np.array([MISSING_ID if pd.isna(v) or str(v).strip() == "" else lookup(v) for v in uniques]
+                       + [MISSING_ID], dtype=np.int32)  # code -1 (null) takes the last entry
+        return ids[codes]
+
+    def encode_regions(self, values):
+        """Region ids of a column of region codes or names (MISSING_ID for nulls)."""
+        return self._encode(values, self.region_id)
+
+    def encode_species(self, values):
+        """Species ids of a column of species codes or names (MISSING_ID for nulls)."""
+        return self._encode(values, self.species_id)
+
+    def species_ids(self, df, columns=SPECIES_KEY_COLUMNS):
+        """
+        Species ids of the rows of df from the first non-null of its species columns (in the
+        order of `columns`). Frames with different species columns, e.g. a status table with
+        codes and an EBD with names, get the same ids for the species in the reference table.
+        """
+        ids = np.full(len(df), MISSING_ID, dtype=np.int32)
+        for col in columns:
+            if col in df.columns:
+                ids = np.where(ids == MISSING_ID, self.encode_species(df[col]), ids)
+        return ids
+
+
+def get_index(reference_dir=REFERENCE_DIR, cache_dir=REFERENCE_CACHE_DIR):
+    """
+    Return a ReferenceIndex of the tables in reference_dir. The index is built once per
+    process and rebuilt only when a table changes.
+    """
+    tables = [os.path.join(reference_dir, name) for name in (REGION_TABLE, SPECIES_TABLE)]
+    memo_key = tuple(cache.file_digest(path) for path in tables)
+    if memo_key not in _indexes:
+        _indexes[memo_key] = ReferenceIndex.from_dir(reference_dir, cache_dir)
+    return _indexes[memo_key]
@@ -0,0 +1,87 @@
+"""
+Declared dtype schemas for the cleaned EBD and Status & Trends frames.
+
+Low-cardinality strings (species names, state/region codes, seasons) are stored as categoricals,
+coordinates as float32 (~1 m precision), counts as nullable integers and dates as datetime64.
+Missing values are real nulls (NaN/NaT/<NA>), never "n/a" placeholder strings.
+"""
+
+import logging
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+# eBird records "X" when a species was present but not counted
+PRESENT_UNCOUNTED = "X"
+
+EBD_SCHEMA = {
+    "scientific_name": "category",
+    "common_name": "category",
+    "observation_count": "Int32",
+    "observation_date": "datetime64[ns]",
+    "state_code": "category",
+    "latitude": "float32",
+    "longitude": "float32",
+}
+
+STATUS_SCHEMA = {
+    "species_code": "category",
+    "common_name": "category",
+    "scientific_name": "category",
+    "abundance_mean": "float64",
+    "total_pop_percent": "float64",
+    "region_code": "category",
+    "season": "category",
+    "start_date": "datetime64[ns]",
+    "end_date": "datetime64[ns]",
+}
+
+
+def parse_observation_count(values):
+    """
+    Convert EBD observation counts to a nullable integer Series, plus a boolean Series that is
+    True where the count was recorded as "X" (present but uncounted). "X" becomes <NA> in the counts.
+    """
+    values = pd.Series(values)
+    if pd.api.types.is_numeric_dtype(values):
+        return values.astype("Int32"), pd.Series(False, index=values.index)
+    text = values.astype("string").str.strip()
+    present_uncounted = (text.str.upper() == PRESENT_UNCOUNTED).fillna(False).astype(bool)
+    counts = pd.to_numeric(text.mask(present_uncounted), errors="coerce").astype("Int32")
+    return counts, present_uncounted
+
+
+def apply_schema(df, schema):
+    """Cast the columns of df that appear in schema to their declared dtypes (returns a new frame)."""
+    df = df.copy(deep=False)  # columns are replaced, never modified in place
+    for col, dtype in schema.items():
+        if col not in df.columns or str(df[col].dtype) == dtype:
+            continue
+        if dtype.startswith("datetime64"):
+            df[col] = pd.to_datetime(df[col], errors="coerce")
+        elif dtype == "category":
+            df[col] = df[col].astype("category")
+        else:
+            df[col] = pd.to_numeric(df[col], errors="coerce").astype(dtype)
+    return df
+
+
+def apply_ebd_schema(df):
+    """
+    Apply EBD_SCHEMA to a cleaned EBD frame. observation_count is parsed with
+    parse_observation_count and a boolean present_uncounted column records the "X" counts.
+    """
+    if "observation_count" in df.columns and str(df["observation_count"].dtype) != "Int32":
+        counts, present_uncounted = parse_observation_count(df["observation_count"])
+        df = df.assign(observation_count=counts, present_uncounted=present_uncounted)
+    return apply_schema(df, EBD_SCHEMA)
+
+
+def apply_status_schema(df):
+    """Apply STATUS_SCHEMA to a cleaned Status & Trends frame."""
+    return apply_schema(df, STATUS_SCHEMA)
+
+
+def memory_mb(df):
+    """Resident memory of a frame in MB, counting the contents of object columns."""
+    return df.memory_usage(deep=True).sum() / 1024 ** 2
@@ -0,0 +1,177 @@
+"""
+Regular lat/lon grid index for sightings.
+
+Every observation gets the id of the grid cell it falls in (cell_ids, computed in bulk with
+numpy), and aggregate_cells reduces the merged data to one row per cell and season with the
+number of sightings, the summed observation_count and an effort proxy. The cell table is a few
+thousand rows where the merged data has millions, so maps and models can work on cells.
+CellIndex answers bounding-box and nearest-cell queries on a cell table in O(log n).
+"""
+
+import logging
+import numpy as np
+import pandas as pd
+import etl.storage as storage
+
+logger = logging.getLogger(__name__)
+
+# Side of a grid cell in degrees (0.05 degrees is about 5.5 km north-south)
+CELL_DEG = 0.05
+
+# Columns read from a merged file by aggregate_cells_file
+CELL_SOURCE_COLUMNS = ["latitude", "longitude", "season", "observation_count", "observation_date", "abundance_mean"]
+
+EARTH_RADIUS_KM = 6371.0088
+
+
+def grid_shape(cell_deg=CELL_DEG):
+    """Number of (rows, columns) of the global grid."""
+    return int(np.ceil(180 / cell_deg)), int(np.ceil(360 / cell_deg))
+
+
+def cell_ids(lat, lon, cell_deg=CELL_DEG):
+    """
+    Return the int64 grid cell id of each lat/lon pair (row-major from the south-west corner
+    of the globe, so ids of one grid row are consecutive). Missing or out-of-range coordinates get -1.
+    """
+    lat = np.asarray(lat, dtype="float64")
+    lon = np.asarray(lon, dtype="float64")
+    n_rows, n_cols = grid_shape(cell_deg)
+    valid = (lat >= -90) & (lat <= 90) & (lon >= -180) & (lon <= 180)
+    rows = np.zeros(len(lat), dtype="int64")
+    cols = np.zeros(len(lon), dtype="int64")
+    rows[valid] = np.minimum(np.floor((lat[valid] + 90) / cell_deg), n_rows - 1)
+    cols[valid] = np.minimum(np.floor((lon[valid] + 180) / cell_deg), n_cols - 1)
+    return np.where(valid, rows * n_cols + cols, -1)
+
+
+def cell_bounds(ids, cell_deg=CELL_DEG):
+    """Return (min_lat, min_lon) of the south-west corner of each cell."""
+    ids = np.asarray(ids, dtype="int64")
+    n_cols = grid_shape(cell_deg)[1]
+    return (ids // n_cols) * cell_deg - 90, (ids % n_cols) * cell_deg - 180
+
+
+def cell_centers(ids, cell_deg=CELL_DEG):
+    """Return (lat, lon) of the center of each cell."""
+    min_lat, min_lon = cell_bounds(ids, cell_deg)
+    return min_lat + cell_deg / 2, min_lon + cell_deg / 2
+
+
+def assign_cells(df, cell_deg=CELL_DEG):
+    """Return a copy of df with the grid cell id of each row in a cell_id column."""
+    df = df.copy()
+    df["cell_id"] = cell_ids(df["latitude"], df["longitude"], cell_deg)
+    return df
+
+
+def aggregate_cells(df, cell_deg=CELL_DEG, by=("season",)):
+    """
+    Aggregate sightings per grid cell and per `by` column (season) into a table sorted by cell_id:
+    - sightings: number of observations,
+    - observation_count: summed observation_count (uncounted "X" sightings add nothing),
+    - effort_days: distinct observation dates, as a proxy for survey effort in the cell,
+    - abundance_mean: mean Status & Trends abundance of the observations,
+    - lat/lon: the cell center.
+    Rows without coordinates are left out.
+    """
+    try:
+        by = [col for col in by if col in df.columns]
+        ids = cell_ids(df["latitude"], df["longitude"], cell_deg)
+        keep = ids >= 0
+        frame = pd.DataFrame({"cell_id": ids[keep]})
+        for col in by:
+            frame[col] = df[col].to_numpy()[keep]
+        keys = ["cell_id", *by]
+        if "observation_count" in df.columns:
+            frame["observation_count"] = pd.to_numeric(df["observation_count"], errors="coerce").to_numpy(
+                dtype="float64", na_value=np.nan)[keep]
+        if "abundance_mean" in df.columns:
+            frame["abundance_mean"] = pd.to_numeric(df["abundance_mean"], errors="coerce").to_numpy(dtype="float64")[keep]
+        if "observation_date" in df.columns:
+            frame["observation_date"] = pd.to_datetime(df["observation_date"], errors="coerce").to_numpy()[keep]
+
+        grouped = frame.groupby(keys, observed=True, sort=True)
+        cells = grouped.size().rename("sightings").to_frame()
+        if "observation_count" in frame.columns:
+            cells["observation_count"] = grouped["observation_count"].sum(min_count=1).fillna(0).astype("int64")
+        if "observation_date" in frame.columns:
+            cells["effort_days"] = grouped["observation_date"].nunique()
+        if "abundance_mean" in frame.columns:
+            cells["abundance_mean"] = grouped["abundance_mean"].mean()
+        cells = cells.reset_index()
+        cells["lat"], cells["lon"] = cell_centers(cells["cell_id"].to_numpy(), cell_deg)
+        logger.info(f"Aggregated {int(keep.sum())} sightings into {cells['cell_id'].nunique()} cells "
+                    f"({len(cells)} cell/{'/'.join(by) or 'total'} rows)")
+        return cells
+    except Exception as e:
+        logger.error(f"Error aggregating sightings into grid cells: {e}", exc_info=True)
+        raise
+
+
+def aggregate_cells_file(path, cell_deg=CELL_DEG, by=("season",)):
+    """aggregate_cells on a merged file, reading only the columns it needs."""
+    stored = storage.read_columns(path)
+    columns = [col for col in dict.fromkeys(CELL_SOURCE_COLUMNS + list(by)) if col in stored]
+    return aggregate_cells(storage.read_frame(path, columns=columns), cell_deg, by)
+
+
+class CellIndex:
+    """
+    Query a cell table (from aggregate_cells) by location.
+
+    The table is kept sorted by cell_id. Because the ids of one grid row are consecutive, a
+    bounding box is a binary search per grid row it spans; nearest-cell queries use a
+    ball tree on the cell centers (haversine distance).
+    """
+
+    def __init__(self, cells, cell_deg=CELL_DEG):
+        self.cell_deg = cell_deg
+        self.cells = cells.sort_values("cell_id", kind="stable").reset_index(drop=True)
+        self._ids = self.cells["cell_id"].to_numpy(dtype="int64")
+        self._unique_ids = np.unique(self._ids)
+        self._tree = None
+
+    def __len__(self):
+        return len(self._unique_ids)
+
+    def _rows_of(self, ids):
+        """Row positions in the table of the given (sorted, unique) cell ids."""
+        starts = np.searchsorted(self._ids, ids, side="left")
+        ends = np.searchsorted(self._ids, ids, side="right")
+        if len(starts) == 0:
+            return np.array([], dtype="int64")
+        return np.concatenate([np.arange(s, e) for s, e in zip(starts, ends)])
+
+    def bbox(self, min_lat, min_lon, max_lat, max_lon):
+        """Return the rows of the cells intersecting the bounding box."""
+        n_rows, n_cols = grid_shape(self.cell_deg)
+        corner_ids = cell_ids([max(min_lat, -90), min(max_lat, 90)], [max(min_lon, -180), min(max_lon, 180)],
+                              self.cell_deg)
+        row_lo, col_lo = divmod(int(corner_ids[0]), n_cols)
+        row_hi, col_hi = divmod(int(corner_ids[1]), n_cols)
+        slices = []
+        for row in range(row_lo, row_hi + 1):
+            start = np.searchsorted(self._ids, row * n_cols + col_lo, side="left")
+            end = np.searchsorted(self._ids, row * n_cols + col_hi, side="right")
+            if end > start:
+                slices.append(np.arange(start, end))
+        positions = np.concatenate(slices) if slices else np.array([], dtype="int64")
+        return self.cells.iloc[positions]
+
+    def nearest(self, lat, lon, k=1):
+        """Return the rows of the k cells whose centers are closest to (lat, lon), with distance_km."""
+        if len(self._unique_ids) == 0:
+            return self.cells.assign(distance_km=pd.Series(dtype="float64"))
+        if self._tree is None:
+            from sklearn.neighbors import BallTree
+            center_lat, center_lon = cell_centers(self._unique_ids, self.cell_deg)
+            self._tree = BallTree(np.radians(np.column_stack([center_lat, center_lon])), metric="haversine")
+        k = min(k, len(self._unique_ids))
+        distances, neighbours = self._tree.query(np.radians([[lat, lon]]), k=k)
+        order = np.argsort(neighbours[0])  # _rows_of needs ascending ids
+        ids = self._unique_ids[neighbours[0][order]]
+        distance_by_id = dict(zip(ids, distances[0][order] * EARTH_RADIUS_KM))
+        rows = self.cells.iloc[self._rows_of(ids)].copy()
+        rows["distance_km"] = rows["cell_id"].map(distance_by_id)
+        return rows.sort_values("distance_km", kind="stable")
@@ -0,0 +1,301 @@
+"""
+Storage backends for intermediate pipeline files (data/extracted, data/processed).
+
+The backend is chosen from the file extension:
+- .parquet            typed, zstd-compressed columnar Parquet
+- .feather / .arrow   Arrow IPC (Feather v2), lz4-compressed, memory-mappable
+- .csv                plain CSV, kept for opt-in exports
+Columnar backends keep dtypes (e.g. observation_date stays datetime64) and can read a subset
+of columns without parsing the rest.
+Writes are atomic: data goes to a temporary file in the destination directory, which is
+renamed over the destination once complete, so readers never see a partially written file.
+"""
+
+import os
+import logging
+import uuid
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+
+class CsvBackend:
+    extension = ".csv"
+
+    def write(self, df, path):
+        df.to_csv(path, index=False)
+
+    def read(self, path, columns=None, memory_map=True):
+        return pd.read_csv(path, usecols=columns, memory_map=memory_map)
+
+    def iter_batches(self, path, columns=None, batch_size=250_000):
+        yield from pd.read_csv(path, usecols=columns, chunksize=batch_size)
+
+    def open_writer(self, path, dtypes=None):
+        return CsvChunkWriter(path)
+
+
+class ParquetBackend:
+    extension = ".parquet"
+    compression = "zstd"
+
+    def write(self, df, path):
+        df.to_parquet(path, index=False, engine="pyarrow", compression=self.compression)
+
+    def read(self, path, columns=None, memory_map=True):
+        import pyarrow.parquet as pq
+        return pq.read_table(path, columns=columns, memory_map=memory_map).to_pandas()
+
+    def iter_batches(self, path, columns=None, batch_size=250_000):
+        import pyarrow.parquet as pq
+        parquet_file = pq.ParquetFile(path, memory_map=True)
+        for batch in parquet_file.iter_batches(batch_size=batch_size, columns=columns):
+            yield batch.to_pandas()
+
+    def open_writer(self, path, dtypes=None):
+        return ArrowChunkWriter(path, self._new_writer, dtypes=dtypes)
+
+    def _new_writer(self, path, schema):
+        import pyarrow.parquet as pq
+        return pq.ParquetWriter(path, schema, compression=self.compression)
+
+
+class FeatherBackend:
+    extension = ".feather"
+    compression = "lz4"
+
+    def write(self, df, path):
+        df.reset_index(drop=True).to_feather(path, compression=self.compression)
+
+    def read(self, path, columns=None, memory_map=True):
+        import pyarrow.feather as feather
+        return feather.read_table(path, columns=columns, memory_map=memory_map).to_pandas()
+
+    def iter_batches(self, path, columns=None, batch_size=250_000):
+        import pyarrow as pa
+        with pa.memory_map(path) as source:
+            reader = pa.ipc.open_file(source)
+            for i in range(reader.num_record_batches):
+                batch = reader.get_batch(i)
+                if columns is not None:
+                    batch = batch.select(columns)
+                yield batch.to_pandas()
+
+    def open_writer(self, path, dtypes=None):
+        return ArrowChunkWriter(path, self._new_writer, decode_dictionaries=True, dtypes=dtypes)
+
+    def _new_writer(self, path, schema):
+        import pyarrow as pa
+        options = pa.ipc.IpcWriteOptions(compression=self.compression)
+        return pa.ipc.new_file(path, schema, options=options)
+
+
+class CsvChunkWriter:
+    """Appends DataFrame chunks to a CSV, writing the header with the first chunk."""
+
+    def __init__(self, path):
+        self.path = path
+        self.rows = 0
+        self._header_written = False
+
+    def write(self, df):
+        df.to_csv(self.path, mode="a" if self._header_written else "w", header=not self._header_written, index=False)
+        self._header_written = True
+        self.rows += len(df)
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def _widen_dictionaries(schema, decode=False):
+    """
+    Use int32 indices for dictionary (categorical) columns, so later chunks with more
+    categories than the first still fit the schema. decode=True stores them as plain values
+    instead (Arrow IPC files allow only one dictionary per column across all batches).
+    """
+    import pyarrow as pa
+    fields = []
+    for field in schema:
+        if pa.types.is_dictionary(field.type):
+            value_type = field.type.value_type
+            field = field.with_type(value_type if decode else pa.dictionary(pa.int32(), value_type, field.type.ordered))
+        fields.append(field)
+    return pa.schema(fields, metadata=schema.metadata)
+
+
+def _arrow_type(dtype):
+    """Arrow type of a declared column dtype (str for strings, else a numpy dtype name)."""
+    import numpy as np
+    import pyarrow as pa
+    if dtype in (str, "str", "string", object):
+        return pa.string()
+    return pa.from_numpy_dtype(np.dtype(dtype))
+
+
+def _type_null_fields(schema, dtypes=None):
+    """
+    Give all-null columns (Arrow's null type, e.g. an object column with no value in the first
+    chunk) their declared type from dtypes, or string, so later chunks with values still fit.
+    """
+    import pyarrow as pa
+    dtypes = dtypes or {}
+    fields = [field.with_type(_arrow_type(dtypes.get(field.name, str))) if pa.types.is_null(field.type) else field
+              for field in schema]
+    return pa.schema(fields, metadata=schema.metadata)
+
+
+class ArrowChunkWriter:
+    """
+    Appends DataFrame chunks to a Parquet or Arrow IPC file using the schema of the first
+    non-empty chunk, with columns that are all null in it typed from dtypes (see
+    _type_null_fields). No file is created if every chunk is empty.
+    """
+
+    def __init__(self, path, new_writer, decode_dictionaries=False, dtypes=None):
+        self.path = path
+        self.rows = 0
+        self._new_writer = new_writer
+        self._decode_dictionaries = decode_dictionaries
+        self._dtypes = dtypes
+        self._writer = None
+        self._schema = None
+
+    def write(self, df):
+        import pyarrow as pa
+        if self._writer is None:
+            if df.empty:
+                return  # empty object columns carry no type; take the schema from the first rows
+            schema = _type_null_fields(pa.Schema.from_pandas(df, preserve_index=False), self._dtypes)
+            self._schema = _widen_dictionaries(schema, decode=self._decode_dictionaries)
+            self._writer = self._new_writer(self.path, self._schema)
+        table = pa.Table.from_pandas(df, schema=self._schema, preserve_index=False)
+        self._writer.write_table(table)
+        self.rows += len(df)
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def _temp_path(path):
+    """A unique temporary file name next to path (same directory, so the rename is atomic)."""
+    directory, name = os.path.split(path)
+    return os.path.join(directory, f".{name}.{uuid.uuid4().hex[:12]}.tmp")
+
+
+class AtomicChunkWriter:
+    """
+    Wraps a backend's chunk writer so that it writes to a temporary file, which replaces path
+    when the writer is closed without an error. On error the temporary file is removed and
+    path is left untouched. Like the wrapped writers, nothing is created if no chunk was written.
+    """
+
+    def __init__(self, path, open_writer, dtypes=None):
+        self.path = path
+        self._tmp_path = _temp_path(path)
+        self._writer = open_writer(self._tmp_path, dtypes=dtypes)
+
+    @property
+    def rows(self):
+        return self._writer.rows
+
+    def write(self, df):
+        self._writer.write(df)
+
+    def close(self, commit=True):
+        try:
+            self._writer.close()
+        finally:
+            if os.path.exists(self._tmp_path):
+                if commit:
+                    os.replace(self._tmp_path, self.path)
+                else:
+                    os.remove(self._tmp_path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, *exc):
+        self.close(commit=exc_type is None)
+
+
+BACKENDS = {
+    ".csv": CsvBackend(),
+    ".parquet": ParquetBackend(),
+    ".feather": FeatherBackend(),
+    ".arrow": FeatherBackend(),
+}
+
+
+def register_backend(extension, backend):
+    """Register (or replace) the storage backend used for files ending in `extension`."""
+    BACKENDS[extension.lower()] = backend
+
+
+def get_backend(path):
+    """Return the storage backend for a path based on its extension."""
+    extension = os.path.splitext(path)[1].lower()
+    if extension not in BACKENDS:
+        raise ValueError(f"Unsupported storage format '{extension}'. Supported: {sorted(BACKENDS)}")
+    return BACKENDS[extension]
+
+
+def is_columnar(path):
+    return not isinstance(get_backend(path), CsvBackend)
+
+
+def write_frame(df, path):
+    """Atomically write a DataFrame using the backend that matches the file extension."""
+    tmp_path = _temp_path(path)
+    try:
+        get_backend(path).write(df, tmp_path)
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    logger.debug(f"Wrote {len(df)} rows to {path}")
+
+
+def read_frame(path, columns=None, memory_map=True):
+    """Read a DataFrame (optionally only `columns`), memory-mapping columnar files."""
+    return get_backend(path).read(path, columns=columns, memory_map=memory_map)
+
+
+def iter_frames(path, columns=None, batch_size=250_000):
+    """Yield a file as DataFrame batches of at most `batch_size` rows."""
+    yield from get_backend(path).iter_batches(path, columns=columns, batch_size=batch_size)
+
+
+def open_writer(path, dtypes=None):
+    """
+    Open a chunked writer; call .write(df) per chunk and close it (or use it as a context manager).
+    The file appears at path only once the writer is closed (see AtomicChunkWriter). dtypes
+    (column -> dtype, like the dtype argument of pd.read_csv) types columns that are all null
+    in the first chunk.
+    """
+    return AtomicChunkWriter(path, get_backend(path).open_writer, dtypes=dtypes)
+
+
+def read_columns(path):
+    """Return the column names stored in a file without reading its data."""
+    backend = get_backend(path)
+    if isinstance(backend, ParquetBackend):
+        import pyarrow.parquet as pq
+        return pq.read_schema(path).names
+    if isinstance(backend, FeatherBackend):
+        import pyarrow as pa
+        with pa.memory_map(path) as source:
+            return pa.ipc.open_file(source).schema.names
+    return pd.read_csv(path, nrows=0).columns.tolist()
@@ -2,20 +2,42 @@ import os
 import re
 import numpy as np
 import pandas as pd
-import matplotlib.pyplot as plt
-import seaborn as sns
 import logging
+from concurrent.futures import Future
+import etl.storage as storage
+import etl.schema as schema
+import etl.eda as eda
+import etl.reference as reference
+from etl.extract import EBD_COLUMNS, get_column_projection
+from vis.render import get_service
 
 logger = logging.getLogger(__name__)
 
 def clean_ebd_data(filepath):
-    """Reads and cleans only the EBD data file."""
-    df = pd.read_csv(filepath, sep=None, engine='python')
+    """Reads and cleans only the EBD data file (CSV or columnar, see etl.storage)."""
+    # Read only the columns we keep: pruned from columnar files, or parsed with
+    # explicit dtypes on the fast C parser for CSV
+    usecols, dtype = get_column_projection(filepath, EBD_COLUMNS)
+    if storage.is_columnar(filepath):
+        df = storage.read_frame(filepath, columns=usecols)
+    else:
+        df = pd.read_csv(filepath, usecols=usecols, dtype=dtype, engine='c')
     # debugging output
     # print("ebd df before")
     # print(df.head())
     logger.debug(f"Read EBD data from {filepath}, shape: {df.shape}")
 
+    df = clean_ebd_frame(df)
+    # debugging output
+    # print("ebd df after")
+    # print(df.head())
+    logger.debug(f"EBD data after cleaning, columns: {list(df.columns)}")
+
+    return df
+
+
+def clean_ebd_frame(df):
+    """Cleans an EBD frame (or one partition of it): normalized column names, kept columns, schema dtypes."""
     # Normalize column names (lowercase, replace spaces with underscores)
     df.columns = df.columns.str.strip().str.lower().str.replace(" ", "_")
 
@@ -31,17 +53,24 @@ def clean_ebd_data(filepath):
     ]
 
     df = df[[col for col in columns_to_keep if col in df.columns]]
-    # debugging output
-    # print("ebd df after")
-    # print(df.head())
-    logger.debug(f"EBD data after cleaning, columns: {list(df.columns)}")
+    # Compact dtypes: categories, float32 coordinates, nullable counts, datetime dates
+    return schema.apply_ebd_schema(df)
 
-    return df
+
+def clean_ebd_files(filepaths):
+    """Reads and cleans several EBD files (e.g. one per species) into one frame, see clean_ebd_data."""
+    frames = [clean_ebd_data(path) for path in filepaths]
+    # Categories differ between files, so concat falls back to object columns; re-apply the schema
+    return schema.apply_ebd_schema(pd.concat(frames, ignore_index=True))
 
 
-def clean_status_data(filepath):
-    """Reads and cleans only the Status and Trends data file."""
-    df = pd.read_csv(filepath)
+def clean_status_data(filepath, keep_species=False):
+    """
+    Reads and cleans only the Status and Trends data file (CSV or columnar, see etl.storage).
+    With keep_species=True the species columns (common_name, scientific_name, species_code)
+    are kept too, so several species' tables can be merged against a multi-species EBD.
+    """
+    df = storage.read_frame(filepath)
     # debugging output
     # print("status df before")
     # print(df.head())
@@ -50,15 +79,6 @@ def clean_status_data(filepath):
     # Normalize column names
     df.columns = df.columns.str.strip().str.lower().str.replace(" ", "_")
 
-    # Replace missing values with 'n/a' - this may need to change later
-    # df.fillna("n/a", inplace=True)
-    for col in df.columns:
-        if df[col].dtype in ["float64", "int64"]:
-            # Fill numeric columns with a placeholder (or keep NaN)
-            df[col] = df[col].fillna(np.nan)
-        else:
-            df[col] = df[col].astype(object).fillna("n/a")
-
     # Keep only the specified columns
     columns_to_keep = [
         "abundance_mean", 
@@ -68,8 +88,12 @@ def clean_status_data(filepath):
         "start_date", 
         "end_date",
     ]
+    if keep_species:
+        columns_to_keep += SPECIES_COLUMNS
 
     df = df[[col for col in columns_to_keep if col in df.columns]]
+    # Declared dtypes; missing values stay real nulls
+    df = schema.apply_status_schema(df)
     # debugging output
     # print("status df after")
     # print(df.head())
@@ -78,12 +102,133 @@ def clean_status_data(filepath):
     return df
 
 
-def merge_datasets(status_df, ebd_df):
+def combine_status_tables(tables):
+    """Concatenate the cleaned status tables of several species (from clean_status_data(keep_species=True))."""
+    return schema.apply_status_schema(pd.concat(list(tables), ignore_index=True))
+
+
+# Cumulative days before each month in a leap year, so Feb 29 sorts between Feb 28 and Mar 1
+_MONTH_OFFSETS = np.array([0, 31, 60, 91, 121, 152, 182, 213, 244, 274, 305, 335])
+
+
+def day_of_year_ordinal(dates):
+    """
+    Encode the month/day of each date as a leap-year day-of-year ordinal (1-366).
+    The year is ignored, so ordinals compare like (month, day) tuples. Missing dates become -1.
+    """
+    dates = pd.to_datetime(pd.Series(dates), errors="coerce")
+    valid = dates.notna().to_numpy()
+    ordinal = np.full(len(dates), -1, dtype=np.int64)
+    if valid.any():
+        month = dates.dt.month.to_numpy()[valid].astype(np.int64)
+        day = dates.dt.day.to_numpy()[valid].astype(np.int64)
+        ordinal[valid] = _MONTH_OFFSETS[month - 1] + day
+    return ordinal
+
+
+def build_season_segments(start_ordinal, end_ordinal):
+    """
+    Split the year into elementary day-of-year segments and record which window owns each one.
+
+    Windows are inclusive [start, end] ranges; when start > end the window wraps around the new
+    year (e.g. Dec -> Feb). When windows overlap, the earliest one wins, matching a first-match scan.
+    Returns (breaks, owner): segment k covers ordinals breaks[k] .. breaks[k + 1] - 1 and
+    owner[k] is the index of the owning window, or -1 if none.
+    """
+    start_ordinal = np.asarray(start_ordinal, dtype=np.int64)
+    end_ordinal = np.asarray(end_ordinal, dtype=np.int64)
+    valid = (start_ordinal > 0) & (end_ordinal > 0)
+
+    breaks = np.unique(np.concatenate([[1], start_ordinal[valid], end_ordinal[valid] + 1]))
+    owner = np.full(len(breaks), -1, dtype=np.int64)
+
+    # Paint windows last-to-first so earlier windows overwrite later ones
+    for i in np.flatnonzero(valid)[::-1]:
+        s, e = start_ordinal[i], end_ordinal[i]
+        if s <= e:
+            covered = (breaks >= s) & (breaks <= e)
+        else:
+            covered = (breaks >= s) | (breaks <= e)
+        owner[covered] = i
+    return breaks, owner
+
+
+def match_season_windows(obs_dates, seasonal, obs_keys=None, seasonal_keys=None):
+    """
+    Vectorized month/day interval join of observations against seasonal windows.
+
+    For each observation, returns the positional index into `seasonal` of the first window
+    (in row order) whose start_date/end_date month-day range contains the observation date,
+    or -1 when nothing matches. When species keys (integer ids, see etl.reference) are given,
+    each observation is matched only against windows for its own species, falling back to all
+    windows if its species has none or its key is missing (negative).
+    """
+    obs_ordinal = day_of_year_ordinal(obs_dates)
+    start_ordinal = day_of_year_ordinal(seasonal["start_date"])
+    end_ordinal = day_of_year_ordinal(seasonal["end_date"])
+    result = np.full(len(obs_ordinal), -1, dtype=np.int64)
+
+    def assign(obs_positions, window_positions):
+        breaks, owner = build_season_segments(start_ordinal[window_positions], end_ordinal[window_positions])
+        ordinals = obs_ordinal[obs_positions]
+        segment = np.searchsorted(breaks, ordinals, side="right") - 1
+        local = np.where(ordinals > 0, owner[np.clip(segment, 0, None)], -1)
+        result[obs_positions] = np.where(local >= 0, window_positions[np.clip(local, 0, None)], -1)
+
+    all_windows = np.arange(len(seasonal))
+    if obs_keys is None or seasonal_keys is None:
+        assign(np.arange(len(obs_ordinal)), all_windows)
+        return result
+
+    obs_keys = np.asarray(obs_keys)
+    seasonal_keys = np.asarray(seasonal_keys)
+    for key in np.unique(obs_keys):
+        window_positions = np.flatnonzero(seasonal_keys == key) if key >= 0 else all_windows
+        if len(window_positions) == 0:
+            window_positions = all_windows
+        assign(np.flatnonzero(obs_keys == key), window_positions)
+    return result
+
+
+def normalize_codes(values, old=None, new=None):
+    """
+    Lowercase a code column (nulls become ""), optionally replacing `old` with `new`
+    (e.g. 'usa-' -> 'us-'). Categorical columns are normalized once per category instead of
+    once per row, and stay categorical.
+    """
+    def normalize(v):
+        v = pd.Series(v, dtype=object).fillna("").astype(str).str.lower()
+        return v.str.replace(old, new) if old is not None else v
+
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        # One extra label at the end for nulls, which have code -1
+        labels = np.append(normalize(values.cat.categories).to_numpy(dtype=object), "")
+        label_codes, uniques = pd.factorize(labels)
+        codes = label_codes[values.cat.codes.to_numpy()]
+        return pd.Series(pd.Categorical.from_codes(codes, categories=uniques), index=values.index, name=values.name)
+    return normalize(values)
+
+
+# Species key columns in order of preference for matching EBD rows to status rows
+SPECIES_COLUMNS = ["common_name", "scientific_name", "species_code"]
+
+
+def choose_species_col(a, b):
+    """The first species key column present in both frames (common_name > scientific_name > species_code), or None."""
+    for c in SPECIES_COLUMNS + ["species"]:
+        if c in a.columns and c in b.columns:
+            return c
+    return None
+
+
+def merge_datasets(status_df, ebd_df, region=reference.DEFAULT_REGION, index=None):
     """
     Merge cleaned EBD and Status & Trends datasets.
 
     Rules:
-    - Normalize codes and filter to Maryland (us-md).
+    - Keep the EBD rows and status rows of `region` (a region code or name, default US-MD).
+      Regions and species are joined on integer ids from the reference index (etl.reference,
+      `index` defaults to the tables in data/reference-tables).
     - If a status row has season == 'year_round' for a species, apply that species-level
       abundance_mean and total_pop_percent to all matching EBD rows for the same species.
     - Otherwise, match observation_date by month/day to seasonal start/end windows (ignore year).
@@ -97,26 +242,45 @@ def merge_datasets(status_df, ebd_df):
         if col not in ebd_df.columns:
             logger.error(f"ebd_df missing expected column: {col}")
             raise KeyError(f"ebd_df missing expected column: {col}")
+    if "region_code" not in status_df.columns:
+        logger.error("status_df missing expected column: region_code")
+        raise KeyError("status_df missing expected column: region_code")
 
-    # Choose species key for matching (common_name > scientific_name > species_code)
-    def choose_species_col(a, b):
-        for c in ["common_name", "scientific_name", "species_code", "species"]:
-            if c in a.columns and c in b.columns:
-                return c
-        return None
+    index = index or reference.get_index()
+    region_id = index.region_id(region)
 
+    # Choose species key for matching (common_name > scientific_name > species_code); without a
+    # shared column, the reference table still matches e.g. species codes to common names
     species_col = choose_species_col(status_df, ebd_df)
+    species_cols = [species_col] if species_col is not None else SPECIES_COLUMNS
+    has_species = any(c in status_df.columns for c in species_cols) and any(c in ebd_df.columns for c in species_cols)
     logger.debug(f"Species column chosen for merge: {species_col}")
 
-    ebd_df = ebd_df.copy()
-    status_df = status_df.copy()
-
-    ebd_df["state_code"] = ebd_df["state_code"].fillna("").astype(str).str.lower()
-    status_df["region_code"] = status_df.get("region_code", "").fillna("").astype(str).str.lower().str.replace("usa-", "us-")
-    status_df["season"] = status_df.get("season", "").fillna("").astype(str).str.lower()
-
-    ebd_df = ebd_df[ebd_df["state_code"] == "us-md"].copy()
-    status_df = status_df[status_df["region_code"] == "us-md"].copy()
+    ebd_df = ebd_df[index.encode_regions(ebd_df["state_code"]) == region_id].copy()
+    status_df = status_df[index.encode_regions(status_df["region_code"]) == region_id].copy()
+
+    # Every kept row is in the region, so the normalized code is one value (one category)
+    region_code = index.region_code(region)
+    if isinstance(ebd_df["state_code"].dtype, pd.CategoricalDtype):
+        ebd_df["state_code"] = pd.Categorical.from_codes(np.zeros(len(ebd_df), dtype=np.int8), categories=[region_code])
+    else:
+        ebd_df["state_code"] = region_code
+    status_df["season"] = normalize_codes(status_df.get("season", pd.Series("", index=status_df.index)))
+    # Schema-typed inputs (see etl/schema.py) get a categorical season column in the output too,
+    # with the seasons of the status table as categories, so unmatched rows ("n/a") become null;
+    # object inputs keep the "n/a" of the legacy output (see benchmarks/bench_merge.py)
+    categorical_season = isinstance(status_df["season"].dtype, pd.CategoricalDtype)
+    if categorical_season:
+        seasons = [season for season in status_df["season"].cat.categories if season not in ("", "n/a")]
+
+    def finish(df):
+        if categorical_season:
+            df["season"] = pd.Categorical(df["season"], categories=seasons)
+        return df
+
+    if has_species:
+        ebd_species = index.species_ids(ebd_df, species_cols)
+        status_species = index.species_ids(status_df, species_cols)
 
     ebd_df["observation_date"] = pd.to_datetime(ebd_df.get("observation_date"), errors="coerce")
     status_df["start_date"] = pd.to_datetime(status_df.get("start_date"), errors="coerce")
@@ -125,24 +289,26 @@ def merge_datasets(status_df, ebd_df):
     if "season" not in status_df.columns:
         status_df["season"] = ""
 
-    year_round = status_df[status_df["season"] == "year_round"].copy()
-    seasonal = status_df[status_df["season"] != "year_round"].copy()
+    is_year_round = (status_df["season"] == "year_round").to_numpy()
+    year_round = status_df[is_year_round].copy()
+    seasonal = status_df[~is_year_round].copy()
 
     ebd_df["abundance_mean"] = np.nan
     ebd_df["total_pop_percent"] = np.nan
     ebd_df["season"] = "n/a"
 
     if not year_round.empty:
-        if species_col is not None:
-            for _, yr in year_round.iterrows():
-                sp = yr.get(species_col)
-                if pd.isna(sp) or str(sp).strip() == "":
-                    continue
-                mask = ebd_df[species_col].fillna("").astype(str) == str(sp)
-                if mask.any():
-                    ebd_df.loc[mask, "abundance_mean"] = yr.get("abundance_mean")
-                    ebd_df.loc[mask, "total_pop_percent"] = yr.get("total_pop_percent")
-                    ebd_df.loc[mask, "season"] = yr.get("season")
+        if has_species:
+            # One lookup array for all species: the last year_round row of each species applies
+            yr_species = status_species[is_year_round]
+            lookup = np.full(max(int(ebd_species.max(initial=-1)), int(yr_species.max(initial=-1))) + 2, -1)
+            valid = np.flatnonzero(yr_species >= 0)
+            lookup[yr_species[valid]] = valid  # later rows overwrite earlier ones
+            row_pos = lookup[ebd_species]  # missing ids (-1) read the last entry, which is -1
+            matched = row_pos >= 0
+            if matched.any():
+                for col in ["abundance_mean", "total_pop_percent", "season"]:
+                    ebd_df.loc[matched, col] = year_round[col].to_numpy()[row_pos[matched]]
             logger.info("Applied year_round data per species")
         else:
             yr_row = year_round.iloc[0]
@@ -150,112 +316,337 @@ def merge_datasets(status_df, ebd_df):
             ebd_df["total_pop_percent"] = yr_row.get("total_pop_percent")
             ebd_df["season"] = yr_row.get("season")
             logger.info("Applied single year_round row to all observations (no species key found).")
-            return ebd_df
+            return finish(ebd_df)
 
     if seasonal.empty:
         logger.info("No seasonal rows found in status_df; returning EBD with any year_round assignments (if any).")
-        return ebd_df
-
-    def md_in_range(obs_date, start_date, end_date):
-        if pd.isna(obs_date) or pd.isna(start_date) or pd.isna(end_date):
-            return False
-        obs_md = (int(obs_date.month), int(obs_date.day))
-        start_md = (int(start_date.month), int(start_date.day))
-        end_md = (int(end_date.month), int(end_date.day))
-        if start_md <= end_md:
-            return start_md <= obs_md <= end_md
-        else:
-            return obs_md >= start_md or obs_md <= end_md
-
-    def match_season_for_row(row):
-        obs_date = row["observation_date"]
-        if pd.isna(obs_date):
-            return pd.Series({"abundance_mean": np.nan, "total_pop_percent": np.nan, "season": "n/a"})
-
-        if species_col:
-            sp_val = row.get(species_col)
-            seasonal_subset = seasonal[seasonal[species_col].fillna("").astype(str) == str(sp_val)]
-            if seasonal_subset.empty:
-                seasonal_subset = seasonal
-        else:
-            seasonal_subset = seasonal
-
-        for _, srow in seasonal_subset.iterrows():
-            sd = srow.get("start_date")
-            ed = srow.get("end_date")
-            if md_in_range(obs_date, sd, ed):
-                return pd.Series({
-                    "abundance_mean": srow.get("abundance_mean"),
-                    "total_pop_percent": srow.get("total_pop_percent"),
-                    "season": srow.get("season") or "n/a"
-                })
-        return pd.Series({"abundance_mean": np.nan, "total_pop_percent": np.nan, "season": "n/a"})
+        return finish(ebd_df)
 
     needs_match_mask = ebd_df["season"].isin(["n/a", "", None])
     if needs_match_mask.any():
-        seasonal_info = ebd_df[needs_match_mask].apply(match_season_for_row, axis=1)
-        ebd_df.loc[needs_match_mask, ["abundance_mean", "total_pop_percent", "season"]] = seasonal_info.values
+        to_match = ebd_df[needs_match_mask]
+        obs_keys = ebd_species[needs_match_mask.to_numpy()] if has_species else None
+        seasonal_keys = status_species[~is_year_round] if has_species else None
+        window_idx = match_season_windows(to_match["observation_date"], seasonal, obs_keys, seasonal_keys)
+
+        matched = window_idx >= 0
+        abundance = np.full(len(window_idx), np.nan, dtype=object)
+        pop_percent = np.full(len(window_idx), np.nan, dtype=object)
+        season = np.full(len(window_idx), "n/a", dtype=object)
+        abundance[matched] = seasonal["abundance_mean"].to_numpy()[window_idx[matched]]
+        pop_percent[matched] = seasonal["total_pop_percent"].to_numpy()[window_idx[matched]]
+        season[matched] = seasonal["season"].to_numpy()[window_idx[matched]]
+        season[matched & (season == "")] = "n/a"
+
+        ebd_df.loc[needs_match_mask, ["abundance_mean", "total_pop_percent", "season"]] = np.column_stack(
+            [abundance, pop_percent, season]
+        )
         logger.info("Applied seasonal matching to EBD data")
 
-    return ebd_df
+    return finish(ebd_df)
 
 
-def categorize_abundance_binary(df):
-    # Choose a cutoff — e.g., median or domain-specific threshold
-    cutoff = df['abundance_mean'].median()
-    df['abundance_class'] = df['abundance_mean'].apply(lambda x: 'Low' if x <= cutoff else 'High')
-    df = df.dropna(subset=['abundance_class'])
-    return df
+def merge_datasets_by_species(status_df, ebd_df, region=reference.DEFAULT_REGION):
+    """
+    Merge a multi-species EBD frame (a combined eBird export, or several species' files from
+    clean_ebd_files) with the status tables of all its species (combine_status_tables) in one pass:
+    codes, dates and the state filter are processed once and every species is joined in the same
+    grouped season match. EBD rows of species without status rows are dropped.
+    Returns {species key: merged frame} with one partition per species, keyed on the
+    choose_species_col value (e.g. the common name).
+    """
+    try:
+        species_col = choose_species_col(status_df, ebd_df)
+        if species_col is None:
+            raise KeyError("Multi-species merge needs a species column in both frames "
+                           "(read the status tables with clean_status_data(keep_species=True))")
+
+        known = pd.Index(status_df[species_col].dropna().astype(str).unique())
+        codes, uniques = pd.factorize(ebd_df[species_col])
+        keep = np.append(pd.Index(uniques, dtype=object).astype(str).isin(known), False)[codes]
+        if not keep.all():
+            logger.info(f"Dropped {int((~keep).sum())} EBD rows of species without status rows")
+
+        merged = merge_datasets(status_df, ebd_df[keep], region)
+
+        partitions = {}
+        for key, part in merged.groupby(species_col, observed=True, sort=False):
+            part = part.reset_index(drop=True)
+            for col in SPECIES_COLUMNS + ["season"]:  # same categories as a single-species merge gives
+                if col in part.columns and isinstance(part[col].dtype, pd.CategoricalDtype):
+                    part[col] = part[col].cat.remove_unused_categories()
+            partitions[str(key)] = part
+        logger.info(f"Merged {len(merged)} rows of {len(partitions)} species in one pass")
+        return partitions
+
+    except Exception as e:
+        logger.error(f"Error during multi-species merge: {e}", exc_info=True)
+        raise
+
+
+def merge_datasets_by_region(status_df, ebd_df, n_jobs=1, index=None):
+    """
+    Merge EBD observations of every region with the status windows of the same region, instead
+    of keeping one region (merge_datasets). Both frames are grouped by region id once
+    (etl.reference), and the regions present in both are merged in parallel, n_jobs at a time
+    (joblib; 1 merges them in this process). EBD rows of regions without status rows are dropped.
+    Returns {region code: merged frame}, e.g. {"us-md": ..., "us-va": ...}, ordered by code.
+    """
+    try:
+        from joblib import Parallel, delayed
+
+        index = index or reference.get_index()
+        ebd_regions = index.encode_regions(ebd_df["state_code"])
+        status_regions = index.encode_regions(status_df["region_code"])
+        shared = np.intersect1d(ebd_regions, status_regions)
+        shared = shared[shared >= 0]
+        keep = np.isin(ebd_regions, shared)
+        if not keep.all():
+            logger.info(f"Dropped {int((~keep).sum())} EBD rows of regions without status rows")
+
+        # Name each region by its code in the reference table (or its normalized EBD code)
+        first_rows = [int(np.argmax(ebd_regions == region_id)) for region_id in shared]
+        codes = [index.region_code(ebd_df["state_code"].iloc[row]) for row in first_rows]
+        merged = Parallel(n_jobs=n_jobs)(
+            delayed(merge_datasets)(status_df[status_regions == region_id], ebd_df[ebd_regions == region_id], code, index)
+            for region_id, code in zip(shared, codes))
+
+        partitions = {code: part.reset_index(drop=True) for code, part in sorted(zip(codes, merged), key=lambda item: item[0])}
+        logger.info(f"Merged {sum(len(part) for part in partitions.values())} rows in {len(partitions)} regions")
+        return partitions
+
+    except Exception as e:
+        logger.error(f"Error during the all-regions merge: {e}", exc_info=True)
+        raise
+
+
+def merge_datasets_out_of_core(status_df, ebd_path, output_path, batch_size=250_000, quantiles=None, eda_stats=None,
+                               region=reference.DEFAULT_REGION):
+    """
+    Merge an EBD file that may not fit in memory with a cleaned status table, one partition
+    of batch_size rows at a time, appending the merged rows to output_path (.parquet, .feather
+    or .csv). The merge is row-local (each observation is matched on its own state, species and
+    date), so merging partitions gives the same rows as merge_datasets on the whole file while
+    peak memory depends only on the partition size. Returns the number of merged rows written.
+    If quantiles (a QuantileAccumulator) is given, it is updated with the abundance_mean of every
+    merged partition, so abundance cutoffs are available without reading the output again;
+    likewise eda_stats (an etl.eda.EdaAccumulator) is updated with every merged partition.
+    """
+    try:
+        usecols, dtype = get_column_projection(ebd_path, EBD_COLUMNS)
+        if storage.is_columnar(ebd_path):
+            partitions = storage.iter_frames(ebd_path, columns=usecols, batch_size=batch_size)
+        else:
+            partitions = pd.read_csv(ebd_path, usecols=usecols, dtype=dtype, engine='c', chunksize=batch_size)
+
+        rows_read = 0
+        merged = None
+        with storage.open_writer(output_path) as writer:
+            for partition in partitions:
+                rows_read += len(partition)
+                merged = merge_datasets(status_df, clean_ebd_frame(partition), region)
+                if quantiles is not None:
+                    quantiles.update(merged["abundance_mean"])
+                if eda_stats is not None:
+                    eda_stats.update(merged)
+                writer.write(merged)
+                logger.debug(f"Merged partition: {rows_read} rows read, {writer.rows} written")
+            rows_written = writer.rows
+
+        if rows_written == 0:
+            # Nothing matched; still write the merged columns so downstream readers see them
+            empty = merged.iloc[:0] if merged is not None else pd.DataFrame(columns=list(EBD_COLUMNS))
+            storage.write_frame(empty, output_path)
+
+        logger.info(f"Out-of-core merge wrote {rows_written} of {rows_read} EBD rows to {output_path}")
+        return rows_written
+
+    except Exception as e:
+        logger.error(f"Error during out-of-core merge of {ebd_path}: {e}", exc_info=True)
+        raise
+
+# Class labels by number of classes (ordered low to high); other counts use Q1..Qn
+ABUNDANCE_LABELS = {
+    2: ["Low", "High"],
+    3: ["Low", "Medium", "High"],
+}
+
+
+def abundance_labels(n_classes):
+    return list(ABUNDANCE_LABELS.get(n_classes, [f"Q{i + 1}" for i in range(n_classes)]))
+
+
+class QuantileAccumulator:
+    """
+    Exact quantiles of a column that arrives in chunks (e.g. partitions of the out-of-core merge).
 
+    Keeps a count per distinct value, which stays small for abundance_mean (one value per
+    status row), and accumulators from separate partitions or workers can be merged.
+    quantile() interpolates linearly between order statistics like pandas' Series.quantile.
+    """
 
-def run_eda(df):
-    """Run exploratory data analysis on the merged DataFrame."""
+    def __init__(self):
+        self.values = np.array([], dtype="float64")
+        self.counts = np.array([], dtype="int64")
+
+    def update(self, values):
+        """Add a chunk of values (nulls are ignored)."""
+        values = pd.to_numeric(pd.Series(values), errors="coerce").dropna().to_numpy(dtype="float64")
+        chunk_values, chunk_counts = np.unique(values, return_counts=True)
+        self._add(chunk_values, chunk_counts)
+        return self
+
+    def merge(self, other):
+        """Add the counts of another accumulator."""
+        self._add(other.values, other.counts)
+        return self
+
+    def _add(self, values, counts):
+        merged_values, inverse = np.unique(np.concatenate([self.values, values]), return_inverse=True)
+        self.counts = np.bincount(inverse, weights=np.concatenate([self.counts, counts]),
+                                  minlength=len(merged_values)).astype("int64")
+        self.values = merged_values
+
+    @property
+    def n(self):
+        return int(self.counts.sum())
+
+    def quantile(self, q):
+        if self.n == 0:
+            return np.nan
+        ends = np.cumsum(self.counts)  # rank (0-based) of each value's last copy is ends - 1
+        position = q * (self.n - 1)
+        lower, upper = int(np.floor(position)), int(np.ceil(position))
+        lower_value = self.values[np.searchsorted(ends, lower, side="right")]
+        upper_value = self.values[np.searchsorted(ends, upper, side="right")]
+        return lower_value + (upper_value - lower_value) * (position - lower)
+
+    def cutoffs(self, n_classes=2):
+        """Quantile cutoffs splitting the values into n_classes equally populated classes."""
+        return [float(self.quantile(i / n_classes)) for i in range(1, n_classes)]
+
+
+def abundance_cutoffs_from_file(path, n_classes=2, column="abundance_mean", batch_size=1_000_000):
+    """Quantile cutoffs of a column of a stored (e.g. out-of-core merged) file, reading it in batches."""
+    accumulator = QuantileAccumulator()
+    for batch in storage.iter_frames(path, columns=[column], batch_size=batch_size):
+        accumulator.update(batch[column])
+    return accumulator.cutoffs(n_classes)
+
+
+def categorize_abundance(df, cutoffs=None, n_classes=2, labels=None, column="abundance_mean",
+                         target="abundance_class"):
+    """
+    Add an ordered categorical `target` column classifying `column` into n_classes classes.
+
+    cutoffs are the upper bounds (inclusive) of every class but the last, e.g. [0.1, 0.5] for
+    Low <= 0.1 < Medium <= 0.5 < High. By default they are the quantiles of the column (the
+    median for two classes); for data processed in partitions pass the cutoffs of a
+    QuantileAccumulator. labels default to abundance_labels(n_classes).
+    Rows where `column` is null are dropped. Returns a new DataFrame.
+    """
+    values = pd.to_numeric(df[column], errors="coerce").to_numpy(dtype="float64")
+    if cutoffs is None:
+        # same linear interpolation as QuantileAccumulator.quantile, via partial sorts
+        valid = values[~np.isnan(values)]
+        cutoffs = np.quantile(valid, np.arange(1, n_classes) / n_classes) if len(valid) else [np.nan] * (n_classes - 1)
+    cutoffs = np.sort(np.asarray(cutoffs, dtype="float64"))
+    labels = list(labels) if labels is not None else abundance_labels(len(cutoffs) + 1)
+    if len(labels) != len(cutoffs) + 1:
+        raise ValueError(f"{len(cutoffs)} cutoffs need {len(cutoffs) + 1} labels, got {labels}")
+
+    # class i holds cutoffs[i - 1] < x <= cutoffs[i]; repeated cutoffs just leave a class empty
+    codes = np.searchsorted(cutoffs, values, side="left")
+    codes[np.isnan(values)] = -1
+    classes = pd.Categorical.from_codes(codes, categories=labels, ordered=True)
+    class_counts = np.bincount(codes[codes >= 0], minlength=len(labels))
+    logger.info(f"Abundance cutoffs {cutoffs.tolist()} -> {dict(zip(labels, class_counts.tolist()))}")
+
+    df = df.assign(**{target: classes})
+    return df[codes >= 0] if (codes < 0).any() else df
+
+
+def categorize_abundance_binary(df, cutoff=None):
+    """Low/High classes split at cutoff (default: the median of abundance_mean). See categorize_abundance."""
+    return categorize_abundance(df, cutoffs=None if cutoff is None else [cutoff], n_classes=2)
+
+
+def draw_abundance_histogram(fig, edges, counts, title):
+    """Draw a histogram of abundance_mean on fig from pre-binned counts (see etl.eda.EdaAccumulator.histogram)."""
+    ax = fig.add_subplot()
+    ax.stairs(counts, edges, fill=True, alpha=0.6, color="C0", edgecolor="white")
+    ax.set_title(title)
+    ax.set_xlabel("Abundance Mean")
+    ax.set_ylabel("Frequency")
+    fig.tight_layout()
+
+
+def run_eda(df, renderer=None):
+    """
+    Run exploratory data analysis on the merged DataFrame in a single pass (see etl/eda.py).
+    The histogram is queued on renderer (a vis.render.RenderService; rendered inline by default)
+    and the render Future is returned (resolved to False when there is nothing to plot).
+    """
     # print("Running EDA...")
     logger.info("Running EDA...")
+    stats = eda.EdaAccumulator().update(df)
+
+    # Get species name for the title and file naming
+    species_name = None
+    if "common_name" in df.columns and len(df):
+        species_name = df["common_name"].iloc[0]
+    elif "species" in df.columns and len(df):
+        species_name = df["species"].iloc[0]
+    return report_eda(stats, species_name, renderer)
+
+
+def run_eda_file(path, species_name=None, batch_size=1_000_000, renderer=None):
+    """Run EDA on a stored (e.g. out-of-core merged) file, reading it in batches."""
+    stats = eda.EdaAccumulator()
+    for batch in storage.iter_frames(path, batch_size=batch_size):
+        if species_name is None and "common_name" in batch.columns and len(batch):
+            species_name = batch["common_name"].iloc[0]
+        stats.update(batch)
+    return report_eda(stats, species_name, renderer)
+
+
+def report_eda(stats, species_name=None, renderer=None):
+    """
+    Log the statistics of an etl.eda.EdaAccumulator and queue its abundance_mean histogram.
+    Returns the render Future, resolved to False if there is no abundance_mean column.
+    """
     # Print the number of rows and columns in the dataset
     # print(f"Data shape: {df.shape}")
-    logger.info(f"Data shape: {df.shape}")
+    logger.info(f"Data shape: {stats.shape}")
     # Print a list of all column names in the dataset
     # print(f"Columns: {df.columns.tolist()}")
-    logger.info(f"Columns: {df.columns.tolist()}")
+    logger.info(f"Columns: {stats.columns}")
+    logger.info(f"Null counts: {stats.nulls}")
+    if stats.moments:
+        logger.info(f"Numeric summary:\n{stats.describe().to_string()}")
     # make a folder to save output to
     os.makedirs("data/analyzed", exist_ok=True)
-    # Fill missing values in string (object) columns with "n/a"
-    # for col in df.columns:
-    #     if df[col].dtype == object:
-    #         df[col].fillna("n/a", inplace=True)
-    for col in df.columns:
-        if df[col].dtype == object:
-            df[col] = df[col].astype(object).fillna("n/a")
 
     # If the column "season" exists, show the top 5 most common values
-    if "season" in df.columns:
+    if stats.value_counts:
         # print("Top 5 seasons:\n", df["season"].value_counts().head())
-        logger.info(f"Top 5 seasons:\n{df['season'].value_counts().head()}")
-
-    # If the column "abundance_mean" exists, show basic stats
-    if "abundance_mean" in df.columns:
-        plt.figure(figsize=(8, 5))
-        # Create a histogram with a smooth curve showing the distribution
-        sns.histplot(df["abundance_mean"].dropna(), bins=30, kde=True)
-        plt.title(f"Distribution of Abundance Mean – {df['common_name'].iloc[0] if 'common_name' in df.columns else 'Unknown Species'}")
-        plt.xlabel("Abundance Mean")
-        plt.ylabel("Frequency")
-        plt.tight_layout()
-
-        # Get species name for file naming
-        species_name = "unknown_species"
-        if "common_name" in df.columns:
-            species_name = df["common_name"].iloc[0]
-        elif "species" in df.columns:
-            species_name = df["species"].iloc[0]
+        logger.info(f"Top 5 seasons:\n{stats.top_k(5)}")
+
+    # If the column "abundance_mean" exists, plot its distribution
+    if stats.hist_column in stats.columns:
+        title = f"Distribution of Abundance Mean – {species_name if species_name is not None else 'Unknown Species'}"
 
         # Sanitize species name: lowercase, replace spaces with _
-        species_name = re.sub(r'\s+', '_', species_name.strip().lower())
-
-        # Save the histogram
-        filename = f"data/analyzed/abundance_mean_hist_{species_name}.png"
-        plt.savefig(filename)
-        plt.close()
-        # print(f"Saved {filename}")
-        logger.info(f"Saved histogram plot to {filename}")
+        file_species = re.sub(r'\s+', '_', str(species_name if species_name is not None else "unknown_species").strip().lower())
+
+        # Queue the histogram
+        filename = f"data/analyzed/abundance_mean_hist_{file_species}.png"
+        edges, counts = stats.histogram(bins=30)
+        renderer = renderer or get_service(0)
+        logger.info(f"Queued histogram plot to {filename}")
+        return renderer.submit(filename, draw_abundance_histogram, edges, counts, title, figsize=(8, 5))
+
+    # Nothing to plot: a resolved Future, like a render skipped because its output is up to date
+    nothing = Future()
+    nothing.set_result(False)
+    return nothing
@@ -1,140 +1,981 @@
-import etl.extract as extract
-import etl.transform as transform
-import etl.load as load
-import analysis.evaluate as ananalysis
-import vis.visualizations as vis
-import pandas as pd
-import analysis.model as model
-import analysis.evaluate as evaluate
+import argparse
+import asyncio
+import importlib.util
 import logging
+import logging.handlers
+import multiprocessing
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import etl.cache as cache
+import etl.manifest as manifest
+import etl.profiling as profiling
 
 """
 Main script to run the ETL process, analyze bird data, and visualize results.
+
+    python main.py [all|extract|merge|train|plot] [--species NAME ...] [options]
+
+`all` (the default) runs every stage; the other commands run one stage for every species
+in the manifest (config/species.json), reading the outputs of the previous stage from data/.
 """
-def main():
-    # Setup logging
-    logging.basicConfig(
-        filename='etl_pipeline.log',
-        level=logging.INFO,
-        format='%(asctime)s - %(levelname)s - %(message)s',
-        filemode='w'  # overwrite log file each run; change to 'a' to append
+
+
+def lazy_import(name):
+    """
+    Return module `name`, executed on first attribute access. pandas, scikit-learn, matplotlib
+    and geopandas are only imported by the stages that use them, so e.g. `main.py extract`
+    or `--help` don't pay for the modeling and plotting libraries.
+    """
+    if name in sys.modules:
+        return sys.modules[name]
+    spec = importlib.util.find_spec(name)
+    loader = importlib.util.LazyLoader(spec.loader)
+    spec.loader = loader
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    loader.exec_module(module)
+    return module
+
+
+extract = lazy_import("etl.extract")
+transform = lazy_import("etl.transform")
+load = lazy_import("etl.load")
+storage = lazy_import("etl.storage")
+schema = lazy_import("etl.schema")
+eda = lazy_import("etl.eda")
+incremental = lazy_import("etl.incremental")
+partitions = lazy_import("etl.partitions")
+reference = lazy_import("etl.reference")
+spatial = lazy_import("etl.spatial")
+vis = lazy_import("vis.visualizations")
+render = lazy_import("vis.render")
+model = lazy_import("analysis.model")
+tuning = lazy_import("analysis.tuning")
+online = lazy_import("analysis.online")
+evaluate = lazy_import("analysis.evaluate")
+store = lazy_import("analysis.store")
+
+LOG_FORMAT = '%(asctime)s - %(levelname)s - %(message)s'
+
+COMMANDS = ("all", "extract", "merge", "update", "train", "plot")
+
+# Where `merge --combined-ebd` extracts a multi-species eBird export
+COMBINED_EBD_EXTRACTED = "data/extracted/combined_ebd_extracted.parquet"
+
+# Number of abundance classes (2: Low/High, 3: Low/Medium/High) and their cutoffs;
+# None splits abundance_mean at its quantiles (the median for two classes)
+ABUNDANCE_CLASSES = 2
+ABUNDANCE_CUTOFFS = None
+
+
+class StageFailed(Exception):
+    """Raised from inside a cached group of stages to report which stage failed."""
+
+    def __init__(self, stage, error):
+        super().__init__(f"{stage}: {error}")
+        self.stage = stage
+        self.error = error
+
+
+def species_paths(species):
+    """Files the stages of a species write and read under data/."""
+    return {
+        "ebd_extracted": f"data/extracted/{species}_ebd_extracted.parquet",
+        "status_extracted": f"data/extracted/{species}_status_extracted.parquet",
+        "merged": f"data/processed/{species}_merged_data.parquet",
+        "cells": f"data/processed/{species}_cells.parquet",
+        "ebd_delta": f"data/extracted/{species}_ebd_delta.parquet",
+        "parts": f"data/processed/{species}_merged_parts",
+    }
+
+
+def species_region(bird):
+    """
+    Region code a species is extracted and merged for: its manifest `region` (a code, or a name
+    from the region reference table, see etl/reference.py), else US-MD.
+    """
+    return reference.get_index().region_code(bird.get("region") or reference.DEFAULT_REGION).upper()
+
+
+def region_name(bird):
+    """
+    Name of a species' region, the state outline of its maps: its name in the region reference
+    table, else the name of the state with that postal code in the state shapefile (None if neither).
+    """
+    code = species_region(bird)
+    return reference.get_index().region_name(code) or vis.state_name(code)
+
+
+def extract_species(bird, paths, profiler=None, prefetched=None, all_regions=False):
+    """
+    Extract the EBD and Status data of one species to paths['ebd_extracted'] and
+    paths['status_extracted']. Both sources are read concurrently (one "extract" stage), or
+    taken from `prefetched`, the Future of an extract.extract_sources_async started earlier.
+    EBD rows are kept for the species' region, or for every region with all_regions=True.
+    """
+    logger = logging.getLogger()
+    species = bird["name"]
+    profiler = profiler or profiling.StageProfiler(enabled=False)
+
+    with profiler.stage(species, "extract") as record:
+        outcomes = None
+        if prefetched is not None:
+            try:
+                outcomes = prefetched.result()
+            except Exception as e:
+                logger.warning(f"Prefetching inputs for {species} failed, extracting them again: {e}")
+        if outcomes is None:  # not prefetched (or the prefetch found the ingest stage cached)
+            outcomes = extract.extract_sources(bird["ebd"], paths["ebd_extracted"],
+                                               bird["status"], paths["status_extracted"],
+                                               state_code=None if all_regions else species_region(bird))
+        ebd_rows, status = outcomes
+        if isinstance(ebd_rows, Exception):
+            logger.error(f"Error extracting EBD data for {species}: {ebd_rows}", exc_info=ebd_rows)
+            raise StageFailed("extract_ebd", ebd_rows)  # Skip the remaining stages for this species
+        if isinstance(status, Exception):
+            logger.error(f"Error extracting Status data for {species}: {status}", exc_info=status)
+            raise StageFailed("extract_status", status)
+        record["rows_out"] = ebd_rows
+    logger.info(f"Extracted EBD and Status data for {species} to {paths['ebd_extracted']} and "
+                f"{paths['status_extracted']}")
+
+
+async def prefetch_inputs(bird, stage_cache, ingest_code):
+    """
+    Extract a species' inputs ahead of time (see extract.InputPrefetcher), unless its ingest
+    stage is cached. Hashing the inputs for the cache key is I/O too; the digests are memoized,
+    so process_species doesn't read the files again. Returns None when nothing was extracted.
+    """
+    key = await asyncio.to_thread(ingest_cache_key, bird, stage_cache, ingest_code)
+    if stage_cache.has("ingest", key):
+        return None
+    paths = species_paths(bird["name"])
+    return await extract.extract_sources_async(bird["ebd"], paths["ebd_extracted"],
+                                               bird["status"], paths["status_extracted"],
+                                               state_code=species_region(bird))
+
+
+def merge_species(bird, paths, profiler=None):
+    """Clean and merge the extracted EBD and Status data of one species. Returns the merged DataFrame."""
+    logger = logging.getLogger()
+    species = bird["name"]
+    profiler = profiler or profiling.StageProfiler(enabled=False)
+
+    try:
+        with profiler.stage(species, "clean_ebd") as record:
+            ebd_cleaned = transform.clean_ebd_data(paths["ebd_extracted"])
+            record["rows_out"] = len(ebd_cleaned)
+        logger.info(f"Cleaned EBD data for {species}")
+    except Exception as e:
+        logger.error(f"Error cleaning EBD data for {species}: {e}", exc_info=True)
+        raise StageFailed("clean_ebd", e)
+
+    try:
+        with profiler.stage(species, "clean_status") as record:
+            status_cleaned = transform.clean_status_data(paths["status_extracted"])
+            record["rows_out"] = len(status_cleaned)
+        logger.info(f"Cleaned Status data for {species}")
+    except Exception as e:
+        logger.error(f"Error cleaning Status data for {species}: {e}", exc_info=True)
+        raise StageFailed("clean_status", e)
+
+    try:
+        logger.info(f"Merging datasets for {species}")
+        with profiler.stage(species, "merge", rows_in=len(ebd_cleaned)) as record:
+            merged_df = transform.merge_datasets(status_cleaned, ebd_cleaned, species_region(bird))
+            record["rows_out"] = len(merged_df)
+        return merged_df
+    except Exception as e:
+        logger.error(f"Error merging datasets for {species}: {e}", exc_info=True)
+        raise StageFailed("merge", e)
+
+
+def merge_species_all_regions(bird, paths, profiler=None, n_jobs=-1):
+    """
+    Clean the species' extracted data (extracted with all_regions=True) and merge every region
+    with its own status windows (transform.merge_datasets_by_region, n_jobs regions at a time).
+    Each region is categorized on its own, like a merge for that region, and written as one
+    partition of the region/species dataset (etl/partitions.py) through the write-back queue.
+    """
+    logger = logging.getLogger()
+    species = bird["name"]
+    profiler = profiler or profiling.StageProfiler(enabled=False)
+
+    try:
+        with profiler.stage(species, "clean_ebd") as record:
+            ebd_cleaned = transform.clean_ebd_data(paths["ebd_extracted"])
+            record["rows_out"] = len(ebd_cleaned)
+        with profiler.stage(species, "clean_status") as record:
+            status_cleaned = transform.clean_status_data(paths["status_extracted"])
+            record["rows_out"] = len(status_cleaned)
+    except Exception as e:
+        logger.error(f"Error cleaning the data of {species}: {e}", exc_info=True)
+        raise StageFailed("clean", e)
+
+    try:
+        logger.info(f"Merging every region for {species}")
+        with profiler.stage(species, "merge", rows_in=len(ebd_cleaned)) as record:
+            regions = transform.merge_datasets_by_region(status_cleaned, ebd_cleaned, n_jobs=n_jobs)
+            record["rows_out"] = sum(len(part) for part in regions.values())
+        if not regions:
+            raise ValueError("no region has both EBD and status rows")
+    except Exception as e:
+        logger.error(f"Error merging datasets for {species}: {e}", exc_info=True)
+        raise StageFailed("merge", e)
+
+    write_queue = load.get_write_queue()
+    writes = {}
+    for region, merged_df in regions.items():
+        merged_df = categorize_species(merged_df, species, profiler)
+        with profiler.stage(species, "save", rows_in=len(merged_df)):
+            writes[f"save_{region}"] = partitions.write_partition(merged_df, region, species, write_queue=write_queue)
+    with profiler.stage(species, "write_wait"):
+        for name, future in writes.items():
+            error = future.exception()
+            if error is not None:
+                raise StageFailed(name, error)
+    try:
+        partitions.remove_stale(species, regions)
+    except Exception as e:
+        logger.error(f"Error removing stale partitions of {species}: {e}", exc_info=True)
+        raise StageFailed("save", e)
+    logger.info(f"Saved {len(regions)} region partitions of {species} to {partitions.DATASET_DIR}")
+
+
+def ingest_species(bird, paths, profiler=None, prefetched=None):
+    """
+    Extract, clean and merge the EBD and Status data for one species. Returns the merged DataFrame.
+    Each stage is measured with profiler (an etl.profiling.StageProfiler) when given.
+    """
+    extract_species(bird, paths, profiler, prefetched)
+    return merge_species(bird, paths, profiler)
+
+
+def ingest_code_digest():
+    """Digest of the code the cached ingest stage runs: extraction, cleaning (dtype schema), EDA and the merge."""
+    return cache.code_digest(extract, storage, schema, eda, transform, reference)
+
+
+def ingest_cache_key(bird, stage_cache, ingest_code=None):
+    """Stage cache key of a species' ingestion: its input files, the reference tables, the region and the ETL code."""
+    return stage_cache.key(
+        "ingest",
+        inputs=[bird["ebd"], bird["status"],
+                os.path.join(reference.REFERENCE_DIR, reference.REGION_TABLE),
+                os.path.join(reference.REFERENCE_DIR, reference.SPECIES_TABLE)],
+        params={"state_code": species_region(bird)},
+        code=[ingest_code or ingest_code_digest()],
     )
+
+
+def categorize_species(merged_df, species, profiler):
+    """Add the abundance_class column (see ABUNDANCE_CLASSES and ABUNDANCE_CUTOFFS)."""
     logger = logging.getLogger()
-    
-    species_files = [
-        {
-            "name": "cardinal",
-            "status": "cornel_bird_data/trends_and_status_ds/norcar_regional_2023.csv",
-            "ebd": "cornel_bird_data/ebd_ds/ebd_US-MD_norcar_201001_202401_smp_relJun-2025.txt"
-        },
-        {
-            "name": "osprey",
-            "status": "cornel_bird_data/trends_and_status_ds/osprey_regional_2023.csv",
-            "ebd": "cornel_bird_data/ebd_ds/ebd_US-MD_osprey_201001_202401_smp_relJun-2025.txt"
-        },
-        {
-            "name": "american_woodcock",
-            "status": "cornel_bird_data/trends_and_status_ds/amewoo_regional_2023.csv",
-            "ebd": "cornel_bird_data/ebd_ds/ebd_US-MD_amewoo_201001_202401_smp_relJun-2025.txt"
-        }
-    ]
-    
-    logger.info("Pipeline started.")
-    
-    for bird in species_files:
-        species = bird["name"]
-        logger.info(f"Processing species: {species}")
-
-        ebd_extracted_path = f"data/extracted/{species}_ebd_extracted.csv"
-        status_extracted_path = f"data/extracted/{species}_status_extracted.csv"
-        merge_df_path = f"data/processed/{species}_merged_data.csv"
+    try:
+        with profiler.stage(species, "categorize", rows_in=len(merged_df)) as record:
+            merged_df = transform.categorize_abundance(merged_df, cutoffs=ABUNDANCE_CUTOFFS,
+                                                       n_classes=ABUNDANCE_CLASSES)
+            record["rows_out"] = len(merged_df)
+        logger.info(f"Categorized abundance for {species}")
+        return merged_df
+    except Exception as e:
+        logger.error(f"Error categorizing abundance for {species}: {e}", exc_info=True)
+        raise StageFailed("categorize", e)
 
-        try:
-            extract.extract_data(bird["ebd"], ebd_extracted_path)
-            logger.info(f"Extracted EBD data for {species} and saved to {ebd_extracted_path}")
-        except Exception as e:
-            logger.error(f"Error extracting EBD data for {species}: {e}", exc_info=True)
-            continue  # Skip this species and continue with the next
 
-        try:
-            extract.extract_data(bird["status"], status_extracted_path)
-            logger.info(f"Extracted Status data for {species} and saved to {status_extracted_path}")
-        except Exception as e:
-            logger.error(f"Error extracting Status data for {species}: {e}", exc_info=True)
-            continue
+def save_species(merged_df, species, paths, export_csv, profiler, write_queue=None):
+    """
+    Save the merged data of a species to paths['merged'], or hand it to write_queue
+    (a load.WriteBackQueue) and return the Future of the write. The full merge supersedes
+    any incremental parts of the species, which are removed.
+    """
+    logger = logging.getLogger()
+    try:
+        logger.info(f"Saving merged data for {species} to {paths['merged']}")
+        with profiler.stage(species, "save", rows_in=len(merged_df)):
+            incremental.reset_store(paths["parts"])
+            if write_queue is not None:
+                return write_queue.submit(merged_df, paths["merged"], export_csv)
+            load.save_processed_data(merged_df, paths["merged"], export_csv=export_csv)
+    except Exception as e:
+        logger.error(f"Error saving merged data for {species}: {e}", exc_info=True)
+        raise StageFailed("save", e)
 
-        try:
-            ebd_cleaned = transform.clean_ebd_data(ebd_extracted_path)
-            logger.info(f"Cleaned EBD data for {species}")
-        except Exception as e:
-            logger.error(f"Error cleaning EBD data for {species}: {e}", exc_info=True)
-            continue
 
-        try:
-            status_cleaned = transform.clean_status_data(status_extracted_path)
-            logger.info(f"Cleaned Status data for {species}")
-        except Exception as e:
-            logger.error(f"Error cleaning Status data for {species}: {e}", exc_info=True)
-            continue
+def aggregate_species_cells(merged_df, species, paths, profiler, result, writes=None, write_queue=None):
+    """
+    Aggregate the sightings into grid cells and save them to paths['cells'] (through
+    write_queue when given, adding the Future to writes['spatial']).
+    Returns the cell table, or None (recorded as a warning in result) if it failed.
+    """
+    logger = logging.getLogger()
+    try:
+        logger.info(f"Aggregating sightings into grid cells for {species}")
+        with profiler.stage(species, "spatial", rows_in=len(merged_df)) as record:
+            cells = spatial.aggregate_cells(merged_df)
+            if write_queue is not None:
+                writes["spatial"] = write_queue.submit(cells, paths["cells"])
+            else:
+                load.save_processed_data(cells, paths["cells"])
+            record["rows_out"] = len(cells)
+        return cells
+    except Exception as e:
+        logger.error(f"Error aggregating grid cells for {species}: {e}", exc_info=True)
+        result["warnings"].append("spatial")  # the cell table is optional like the plots
+        return None
 
-        try:
-            logger.info(f"Merging datasets for {species}")
-            merged_df = transform.merge_datasets(status_cleaned, ebd_cleaned)
-        except Exception as e:
-            logger.error(f"Error merging datasets for {species}: {e}", exc_info=True)
-            continue
-        try:
-            merged_df = transform.categorize_abundance_binary(merged_df)
-            logger.info(f"Categorized abundance for {species}")
-        except Exception as e:
-            logger.error(f"Error categorizing abundance for {species}: {e}", exc_info=True)
-            continue
 
-        try:
-            logger.info(f"Running EDA for {species}")
-            transform.run_eda(merged_df)
-        except Exception as e:
-            logger.error(f"Error during EDA for {species}: {e}", exc_info=True)
-            # Continue because EDA is optional for pipeline success
+def model_settings(model_backend):
+    """
+    Settings of a model backend for the cache key and the evaluation store: the classifier
+    parameters, the search settings of the "tuned" backend (see analysis/tuning.py) or the
+    settings of an online backend (analysis/online.py). Raises ValueError for an unknown backend.
+    """
+    if model_backend == tuning.TUNED_BACKEND:
+        return dict(tuning.TUNING_PARAMS)
+    if model_backend in online.ONLINE_BACKENDS:
+        return online.get_online_params(model_backend)
+    return model.get_model_params(model_backend)
+
+
+def fit_species_model(merged_df, model_backend, n_jobs, track_memory=False):
+    """
+    Train the backend's classifier, or search every backend for the best one with model_backend="tuned".
+    track_memory records the tracemalloc peak of the fit (on when the profiler traces memory).
+    """
+    if model_backend == tuning.TUNED_BACKEND:
+        return tuning.tune_classification_model(merged_df, target_col='abundance_class', n_jobs=n_jobs)
+    return model.train_classification_model(merged_df, target_col='abundance_class', backend=model_backend,
+                                             n_jobs=n_jobs, track_memory=track_memory)
+
 
+def train_species(merged_df, species, data_key, stage_cache, model_backend, n_jobs, profiler, run_id, result,
+                  files=None):
+    """
+    Train (or load from stage_cache), save and evaluate the model of a species.
+    data_key identifies the training data in the cache key and the evaluation store.
+    Online backends instead update the species' saved online model by streaming the store
+    files (see etl.incremental.store_files) it has not seen yet; merged_df is not used.
+    Returns (y_test, y_pred); saving and evaluating are optional and recorded as warnings.
+    """
+    logger = logging.getLogger()
+    is_online = model_backend in online.ONLINE_BACKENDS
+    try:
+        logger.info(f"Training model for {species}")
+        # trained_model, y_test, y_pred = model.train_model(merged_df)
+        train_key = stage_cache.key(
+            "train",
+            params={"ingest": data_key, "cutoffs": ABUNDANCE_CUTOFFS, "classes": ABUNDANCE_CLASSES, "backend": model_backend,
+                    "model": model_settings(model_backend)},
+            code=[cache.code_digest(model, tuning) if model_backend == tuning.TUNED_BACKEND else cache.code_digest(model)],
+        )
+        with profiler.stage(species, "train", rows_in=None if merged_df is None else len(merged_df)) as record:
+            if is_online:
+                # The saved online model carries the training state, so it is updated rather than cached
+                trained_model, y_test, y_pred = online.update_online_model(species, files, model_backend)
+            else:
+                trained_model, y_test, y_pred = stage_cache.get_or_compute(
+                    "train", train_key,
+                    lambda: fit_species_model(merged_df, model_backend, n_jobs,
+                                              track_memory=profiler.enabled and profiler.track_memory))
+            record["rows_out"] = len(y_test)
+        fit_stats = getattr(trained_model, "fit_stats_", None) or {}
+    except Exception as e:
+        logger.error(f"Error training model for {species}: {e}", exc_info=True)
+        raise StageFailed("train", e)
+
+    if hasattr(trained_model, "tuning_trials_"):
         try:
-            logger.info(f"Saving merged data for {species} to {merge_df_path}")
-            load.save_processed_data(merged_df, merge_df_path)
+            tuning.save_trials(trained_model.tuning_trials_, species)
         except Exception as e:
-            logger.error(f"Error saving merged data for {species}: {e}", exc_info=True)
-            continue
+            logger.error(f"Error saving tuning trials for {species}: {e}", exc_info=True)
+            result["warnings"].append("save_trials")
 
+    if is_online and trained_model.history_:
         try:
-            logger.info(f"Training model for {species}")
-            # trained_model, y_test, y_pred = model.train_model(merged_df)
-            trained_model, y_test, y_pred = model.train_classification_model(merged_df, target_col='abundance_class')
+            online.save_history(trained_model, species)
         except Exception as e:
-            logger.error(f"Error training model for {species}: {e}", exc_info=True)
+            logger.error(f"Error saving the online batch history for {species}: {e}", exc_info=True)
+            result["warnings"].append("save_history")
+
+    try:
+        with profiler.stage(species, "save_model"):
+            model.save_model(trained_model, species, kind=online.ONLINE_KIND if is_online else "model")
+    except Exception as e:
+        logger.error(f"Error saving model for {species}: {e}", exc_info=True)
+        result["warnings"].append("save_model")
+
+    try:
+        logger.info(f"Evaluating model for {species}")
+        # evaluate.evaluate_model(y_test, y_pred, species_name=species)
+        with profiler.stage(species, "evaluate", rows_in=len(y_test)):
+            evaluate.evaluate_classification_model(
+                y_test, y_pred, species_name=species, run_id=run_id,
+                model_backend=fit_stats.get("backend", model_backend), model_hash=train_key, data_hash=data_key,
+                fit_seconds=fit_stats.get("fit_seconds"),
+                params={"classes": ABUNDANCE_CLASSES, "cutoffs": ABUNDANCE_CUTOFFS,
+                        "model": fit_stats.get("tuned_params", model_settings(model_backend)),
+                        "tuned": model_backend == tuning.TUNED_BACKEND})
+
+    except Exception as e:
+        logger.error(f"Error evaluating model for {species}: {e}", exc_info=True)
+        result["warnings"].append("evaluate")
+    return y_test, y_pred
+
+
+def wait_for_plots(plots, result):
+    """Wait for the queued plot jobs ({warning name: Future}) and record the failed ones as warnings."""
+    for name, future in plots.items():
+        if future is None or future.exception() is not None:
+            result["warnings"].append(name)  # the render error is logged by the plot function or vis.render
+
+
+def wait_for_writes(writes, result):
+    """
+    Wait for the queued writes ({stage: Future}). A failed save of the merged data fails the
+    species; a failed save of the grid cells is a warning. The errors are logged by etl.load.
+    """
+    for stage, future in writes.items():
+        error = future.exception()
+        if error is None:
             continue
+        if stage == "save":
+            result.update(status="failed", failed_stage="save", error=f"{type(error).__name__}: {error}")
+        else:
+            result["warnings"].append(stage)
 
-        try:
-            logger.info(f"Evaluating model for {species}")
-            # evaluate.evaluate_model(y_test, y_pred, species_name=species)
-            evaluate.evaluate_classification_model(y_test, y_pred, species_name=species)
 
-        except Exception as e:
-            logger.error(f"Error evaluating model for {species}: {e}", exc_info=True)
+def new_result(species):
+    return {"species": species, "status": "ok", "failed_stage": None, "error": None, "warnings": []}
 
-        try:
-            logger.info(f"Plotting bird locations for {species}")
-            vis.plot_bird_locations(merged_df, species)
-        except Exception as e:
-            logger.error(f"Error plotting bird locations for {species}: {e}", exc_info=True)
 
+def process_species(bird, export_csv=False, stage_cache=None, model_backend="random_forest", n_jobs=-1,
+                    render_workers=None, profiler=None, prefetcher=None):
+    """
+    Run every pipeline stage for one species.
+    Returns a result dict: status is 'ok' or 'failed' (with the failed stage and error),
+    and 'warnings' lists optional stages (EDA, grid cells, evaluation, plots) that failed.
+    Ingestion (extract/clean/merge) and training are loaded from stage_cache when their
+    inputs, parameters and code are unchanged. model_backend and n_jobs are passed to
+    model.train_classification_model. Plots are queued on a pool of render_workers threads
+    (default vis.render.RENDER_WORKERS, see vis/render.py) so they render while the later
+    stages run, and the merged data and grid cells are written by the process's write-back
+    queue (etl/load.py) while the model trains. prefetcher (an extract.InputPrefetcher) may
+    hold this species' inputs, extracted while the previous species was processed.
+    Every stage is measured with profiler (an etl.profiling.StageProfiler) when given.
+    """
+    logger = logging.getLogger()
+    species = bird["name"]
+    result = new_result(species)
+    stage_cache = stage_cache or cache.StageCache(enabled=False)
+    profiler = profiler or profiling.StageProfiler(enabled=False)
+    renderer = render.get_service(render.RENDER_WORKERS if render_workers is None else render_workers)
+    paths = species_paths(species)
+    write_queue = load.get_write_queue()
+    prefetched = prefetcher.take(species) if prefetcher is not None else None
+    plots = {}
+    writes = {}
+
+    def failed(stage, e):
+        wait_for_plots(plots, result)
+        wait_for_writes(writes, result)
+        result.update(status="failed", failed_stage=stage, error=f"{type(e).__name__}: {e}")
+        return result
+
+    logger.info(f"Processing species: {species}")
+
+    try:
+        ingest_key = ingest_cache_key(bird, stage_cache)
+        merged_df = stage_cache.get_or_compute(
+            "ingest", ingest_key, lambda: ingest_species(bird, paths, profiler, prefetched))
+    except StageFailed as e:
+        return failed(e.stage, e.error)
+    except Exception as e:
+        logger.error(f"Error reading input files for {species}: {e}", exc_info=True)
+        return failed("extract_ebd", e)
+
+    try:
+        merged_df = categorize_species(merged_df, species, profiler)
+    except StageFailed as e:
+        return failed(e.stage, e.error)
+
+    try:
+        logger.info(f"Running EDA for {species}")
+        with profiler.stage(species, "eda", rows_in=len(merged_df)):
+            plots["eda"] = transform.run_eda(merged_df, renderer=renderer)
+    except Exception as e:
+        logger.error(f"Error during EDA for {species}: {e}", exc_info=True)
+        result["warnings"].append("eda")  # Continue because EDA is optional for pipeline success
+
+    # The map only needs the merged data, so it renders while the model trains
+    logger.info(f"Plotting bird locations for {species}")
+    with profiler.stage(species, "plot_locations", rows_in=len(merged_df)):
+        plots["plot_locations"] = vis.plot_bird_locations(merged_df, species, renderer=renderer,
+                                                          region_name=region_name(bird))
+
+    try:
+        writes["save"] = save_species(merged_df, species, paths, export_csv, profiler, write_queue)
+    except StageFailed as e:
+        return failed(e.stage, e.error)
+
+    cells = aggregate_species_cells(merged_df, species, paths, profiler, result, writes, write_queue)
+    if cells is not None:
+        plots["plot_cell_map"] = vis.plot_cell_map(cells, species, renderer=renderer, region_name=region_name(bird))
+
+    files = None
+    if model_backend in online.ONLINE_BACKENDS:
+        # The online model streams the saved merged data, so it has to be written first
+        error = writes["save"].exception()
+        if error is not None:
+            return failed("save", error)
+        files = incremental.store_files(paths["merged"], paths["parts"])
+
+    try:
+        y_test, y_pred = train_species(merged_df, species, ingest_key, stage_cache, model_backend, n_jobs,
+                                       profiler, profiler.run_id, result, files)
+    except StageFailed as e:
+        return failed(e.stage, e.error)
+
+    logger.info(f"Creating confusion matrix for {species}")
+    plots["plot_confusion_matrix"] = vis.plot_confusion_matrix(
+        y_test, y_pred, species, class_names=list(merged_df['abundance_class'].cat.categories), renderer=renderer)
+    # vis.plot_regression_results(y_test, y_pred, species)
+
+    # Time spent waiting for the queued writes and plots after the compute stages are done
+    with profiler.stage(species, "write_wait"):
+        wait_for_writes(writes, result)
+    with profiler.stage(species, "plot_wait"):
+        wait_for_plots(plots, result)
+    return result
+
+
+def merge_batched(species_files, combined_ebd=None, export_csv=False, profiler=None):
+    """
+    The merge command for every species in one pass: the status tables of all species are
+    combined and merged with all EBD rows at once (transform.merge_datasets_by_species), so
+    codes, dates and the state filter are processed once instead of once per species.
+    The EBD rows come from the species' extracted files, or from one combined multi-species
+    eBird export (combined_ebd), which is extracted first. Each species' partition is then
+    categorized and saved like the per-species merge; the writes go through the write-back
+    queue, so one species' files are written while the next one is categorized.
+    Returns the per-species result dicts.
+    """
+    logger = logging.getLogger()
+    profiler = profiler or profiling.StageProfiler(enabled=False)
+    results = {bird["name"]: new_result(bird["name"]) for bird in species_files}
+    paths = {bird["name"]: species_paths(bird["name"]) for bird in species_files}
+    writes = {species: {} for species in results}
+
+    def fail_all(stage, e):
+        logger.error(f"Error in batched {stage}: {e}", exc_info=True)
+        for result in results.values():
+            result.update(status="failed", failed_stage=stage, error=f"{type(e).__name__}: {e}")
+        return list(results.values())
+
+    try:
+        regions = sorted({species_region(bird) for bird in species_files})
+        if len(regions) > 1:
+            raise ValueError(f"a batched merge needs every species in one region, found {regions}")
+        region = regions[0] if regions else reference.DEFAULT_REGION
+    except Exception as e:
+        return fail_all("merge", e)
+
+    try:
+        with profiler.stage("all", "clean_status") as record:
+            tables = {species: transform.clean_status_data(paths[species]["status_extracted"], keep_species=True)
+                      for species in results}
+            status_all = transform.combine_status_tables(tables.values())
+            record["rows_out"] = len(status_all)
+    except Exception as e:
+        return fail_all("clean_status", e)
+
+    try:
+        ebd_paths = [paths[species]["ebd_extracted"] for species in results]
+        if combined_ebd is not None:
+            ebd_paths = [COMBINED_EBD_EXTRACTED]
+            with profiler.stage("all", "extract_ebd") as record:
+                record["rows_out"] = extract.extract_ebd_streaming(combined_ebd, COMBINED_EBD_EXTRACTED,
+                                                                   state_code=region)
+        with profiler.stage("all", "clean_ebd") as record:
+            ebd_all = transform.clean_ebd_files(ebd_paths)
+            record["rows_out"] = len(ebd_all)
+    except Exception as e:
+        return fail_all("clean_ebd", e)
+
+    try:
+        logger.info(f"Merging {len(ebd_all)} EBD rows of {len(results)} species in one pass")
+        with profiler.stage("all", "merge", rows_in=len(ebd_all)) as record:
+            partitions = transform.merge_datasets_by_species(status_all, ebd_all, region)
+            record["rows_out"] = sum(len(part) for part in partitions.values())
+        species_col = transform.choose_species_col(status_all, ebd_all)
+    except Exception as e:
+        return fail_all("merge", e)
+
+    for species, result in results.items():
         try:
-            logger.info(f"Creating confusion matrix for {species}")
-            vis.plot_confusion_matrix(y_test, y_pred, species, class_names=['Low', 'Medium', 'High'])
-            # vis.plot_regression_results(y_test, y_pred, species)
-        except Exception as e:
-            logger.error(f"Error creating confusion matrix for {species}: {e}", exc_info=True)
+            # A species' own status table names its key in the partitions (e.g. its common name)
+            keys = tables[species][species_col].dropna().astype(str).unique()
+            if len(keys) != 1:
+                raise StageFailed("merge", ValueError(f"expected one species in the status table of {species}, "
+                                                      f"found {list(keys)}"))
+            if keys[0] not in partitions:
+                raise StageFailed("merge", KeyError(f"no EBD rows for {keys[0]}"))
+            merged_df = categorize_species(partitions[keys[0]], species, profiler)
+            write_queue = load.get_write_queue()
+            writes[species]["save"] = save_species(merged_df, species, paths[species], export_csv, profiler,
+                                                   write_queue)
+            aggregate_species_cells(merged_df, species, paths[species], profiler, result, writes[species],
+                                    write_queue)
+        except StageFailed as e:
+            result.update(status="failed", failed_stage=e.stage, error=f"{type(e.error).__name__}: {e.error}")
+    with profiler.stage("all", "write_wait"):
+        for species, result in results.items():
+            wait_for_writes(writes[species], result)
+    return list(results.values())
+
+
+def update_species(bird, paths, profiler, result):
+    """
+    Incremental ingestion of a species (see etl/incremental.py): extract only the EBD rows
+    observed since the species' watermark, merge the ones not ingested yet with the status
+    table and append them as a new part of the merged store. Rows are categorized with the
+    cutoffs of the existing store so the classes stay comparable across parts.
+    """
+    logger = logging.getLogger()
+    species = bird["name"]
+    try:
+        watermark = incremental.read_watermark(paths["parts"])
+        if watermark is None:
+            cutoffs = ABUNDANCE_CUTOFFS
+            if cutoffs is None and os.path.exists(paths["merged"]):
+                cutoffs = transform.abundance_cutoffs_from_file(paths["merged"], ABUNDANCE_CLASSES)
+            watermark = incremental.initial_watermark(paths["merged"], cutoffs)
+        since = incremental.watermark_date(watermark)
+        logger.info(f"Updating {species} with rows observed since {since or 'the beginning'}")
+        with profiler.stage(species, "extract_delta") as record:
+            outcomes = extract.extract_sources(bird["ebd"], paths["ebd_delta"], bird["status"], paths["status_extracted"],
+                                               columns=incremental.DELTA_EBD_COLUMNS, since=since,
+                                               state_code=species_region(bird))
+            for error in outcomes:
+                if isinstance(error, Exception):
+                    raise error
+            record["rows_out"] = outcomes[0]
+    except Exception as e:
+        logger.error(f"Error extracting new data for {species}: {e}", exc_info=True)
+        raise StageFailed("extract_delta", e)
+
+    try:
+        with profiler.stage(species, "merge_delta", rows_in=outcomes[0]) as record:
+            new_rows = incremental.select_new_rows(storage.read_frame(paths["ebd_delta"]), watermark)
+            record["rows_out"] = 0
+            if new_rows.empty:
+                logger.info(f"{species} is up to date (watermark {since})")
+                return
+            status_df = transform.clean_status_data(paths["status_extracted"])
+            merged_df = transform.merge_datasets(status_df, transform.clean_ebd_frame(new_rows.copy()),
+                                                 species_region(bird))
+            cutoffs = watermark["cutoffs"]
+            if cutoffs is None:
+                cutoffs = transform.QuantileAccumulator().update(merged_df["abundance_mean"]).cutoffs(ABUNDANCE_CLASSES)
+            merged_df = transform.categorize_abundance(merged_df, cutoffs=cutoffs, n_classes=ABUNDANCE_CLASSES)
+            record["rows_out"] = len(merged_df)
+    except Exception as e:
+        logger.error(f"Error merging new data for {species}: {e}", exc_info=True)
+        raise StageFailed("merge_delta", e)
+
+    try:
+        with profiler.stage(species, "append", rows_in=len(merged_df)):
+            incremental.append_part(paths["parts"], merged_df, new_rows, watermark, cutoffs)
+    except Exception as e:
+        raise StageFailed("append", e)
 
+
+def read_region_partition(bird, stage):
+    """Read the species' region partition of the all-regions dataset (written by `merge --all-regions`)."""
+    try:
+        return partitions.read_partition(reference.region_key(species_region(bird)), bird["name"])
+    except Exception as e:
+        logging.getLogger().error(f"Error reading the {species_region(bird)} partition of {bird['name']}: {e}",
+                                  exc_info=True)
+        raise StageFailed(stage, e)
+
+
+def read_merged(paths, stage, species):
+    """Read the merged data of a species with its incremental parts, failing with a hint if it has not been merged."""
+    if not incremental.store_files(paths["merged"], paths["parts"]):
+        raise StageFailed(stage, FileNotFoundError(f"{paths['merged']} not found; run 'merge' or 'update' for {species} first"))
+    try:
+        return incremental.read_store(paths["merged"], paths["parts"])
+    except Exception as e:
+        logging.getLogger().error(f"Error reading the merged data of {species}: {e}", exc_info=True)
+        raise StageFailed(stage, e)
+
+
+def run_command(command, bird, export_csv=False, stage_cache=None, model_backend="random_forest", n_jobs=-1,
+                render_workers=None, profiler=None, prefetcher=None, all_regions=False):
+    """
+    Run one command for one species and return its result dict (see process_species):
+    - all: every stage (process_species),
+    - extract: extract the raw EBD and Status files to data/extracted/,
+    - merge: clean, merge and categorize the extracted files and save the merged data and grid cells,
+    - train: train, save and evaluate the model on the saved merged data,
+    - plot: EDA histogram, maps and the confusion matrix of the latest stored evaluation.
+    With all_regions=True, extract keeps every region, merge writes one partition per region
+    (merge_species_all_regions) and train and plot read the species' region partition.
+    """
+    if command == "all":
+        return process_species(bird, export_csv, stage_cache, model_backend, n_jobs, render_workers, profiler,
+                               prefetcher)
+
+    logger = logging.getLogger()
+    species = bird["name"]
+    result = new_result(species)
+    stage_cache = stage_cache or cache.StageCache(enabled=False)
+    profiler = profiler or profiling.StageProfiler(enabled=False)
+    paths = species_paths(species)
+    logger.info(f"Running '{command}' for species: {species}")
+
+    try:
+        if command == "extract":
+            extract_species(bird, paths, profiler, all_regions=all_regions)
+
+        elif command == "merge" and all_regions:
+            merge_species_all_regions(bird, paths, profiler, n_jobs)
+
+        elif command == "merge":
+            merged_df = categorize_species(merge_species(bird, paths, profiler), species, profiler)
+            # The cells are aggregated while the merged data is written
+            write_queue = load.get_write_queue()
+            writes = {"save": save_species(merged_df, species, paths, export_csv, profiler, write_queue)}
+            aggregate_species_cells(merged_df, species, paths, profiler, result, writes, write_queue)
+            with profiler.stage(species, "write_wait"):
+                wait_for_writes(writes, result)
+
+        elif command == "update":
+            update_species(bird, paths, profiler, result)
+
+        elif command == "train":
+            if all_regions:
+                files = [partitions.partition_path(reference.region_key(species_region(bird)), species)]
+                merged_df = None if model_backend in online.ONLINE_BACKENDS else read_region_partition(bird, "train")
+                data_key = cache.file_digest(files[0])
+            else:
+                files = incremental.store_files(paths["merged"], paths["parts"])
+                # Online backends stream the store in batches instead of reading it whole
+                merged_df = None if model_backend in online.ONLINE_BACKENDS else read_merged(paths, "train", species)
+                data_key = incremental.store_digest(paths["merged"], paths["parts"])
+            train_species(merged_df, species, data_key, stage_cache, model_backend, n_jobs, profiler,
+                          profiler.run_id, result, files)
+
+        elif command == "plot":
+            renderer = render.get_service(render.RENDER_WORKERS if render_workers is None else render_workers)
+            merged_df = read_region_partition(bird, "plot") if all_regions else read_merged(paths, "plot", species)
+            name = region_name(bird)
+            plots = {"eda": transform.run_eda(merged_df, renderer=renderer),
+                     "plot_locations": vis.plot_bird_locations(merged_df, species, renderer=renderer, region_name=name)}
+            if all_regions or incremental.has_parts(paths["parts"]):
+                # The cell table is written by full single-region merges only; aggregate the data here
+                plots["plot_cell_map"] = vis.plot_cell_map(spatial.aggregate_cells(merged_df), species,
+                                                           renderer=renderer, region_name=name)
+            elif os.path.exists(paths["cells"]):
+                plots["plot_cell_map"] = vis.plot_cell_map(storage.read_frame(paths["cells"]), species,
+                                                           renderer=renderer, region_name=name)
+            latest = store.EvaluationStore().evaluations(species=species, limit=1)
+            if latest.empty:
+                logger.warning(f"No stored evaluation for {species}; run 'train' to plot its confusion matrix")
+            else:
+                plots["plot_confusion_matrix"] = vis.plot_confusion_counts(
+                    store.EvaluationStore().confusion_matrix(int(latest["id"].iloc[0])), species, renderer=renderer)
+            with profiler.stage(species, "plot_wait"):
+                wait_for_plots(plots, result)
+
+        else:
+            raise ValueError(f"Unknown command '{command}'. Choose from {COMMANDS}.")
+
+    except StageFailed as e:
+        result.update(status="failed", failed_stage=e.stage, error=f"{type(e.error).__name__}: {e.error}")
+    return result
+
+
+def _init_worker(log_queue):
+    """
+    Pool initializer: send this worker's log records to the parent's queue (so only the parent
+    writes etl_pipeline.log).
+    """
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(logging.handlers.QueueHandler(log_queue))
+    root.setLevel(logging.INFO)
+
+
+def run_pipeline(species_files, workers=1, export_csv=False, stage_cache=None, model_backend="random_forest",
+                 render_workers=None, profiler=None, command="all", all_regions=False):
+    """
+    Run `command` (see run_command) for every species, sequentially (workers=1) or in a pool
+    of `workers` processes. The CPU cores are shared between the workers for model training.
+    Sequential "all" runs extract the next species' inputs in the background while the current
+    one is processed. Returns the per-species result dicts in the order of species_files.
+    """
+    logger = logging.getLogger()
+    if workers <= 1 or len(species_files) <= 1:
+        if command != "all" or len(species_files) <= 1:
+            return [run_command(command, bird, export_csv, stage_cache, model_backend, render_workers=render_workers,
+                                profiler=profiler, all_regions=all_regions) for bird in species_files]
+        stage_cache = stage_cache or cache.StageCache(enabled=False)
+        # Resolved here: the lazy modules must not be first loaded from two threads at once
+        ingest_code = ingest_code_digest()
+        results = []
+        with extract.InputPrefetcher() as prefetcher:
+            for i, bird in enumerate(species_files):
+                if i + 1 < len(species_files):
+                    upcoming = species_files[i + 1]
+                    prefetcher.prefetch(upcoming["name"], prefetch_inputs(upcoming, stage_cache, ingest_code))
+                results.append(run_command(command, bird, export_csv, stage_cache, model_backend,
+                                           render_workers=render_workers, profiler=profiler, prefetcher=prefetcher))
+        return results
+
+    workers = min(workers, len(species_files))
+    n_jobs = max(1, (os.cpu_count() or 1) // workers)
+    logger.info(f"Processing {len(species_files)} species with {workers} worker processes")
+
+    manager = multiprocessing.Manager()
+    log_queue = manager.Queue()
+    listener = logging.handlers.QueueListener(log_queue, *logger.handlers, respect_handler_level=True)
+    listener.start()
+    results = {}
+    try:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(log_queue,)) as pool:
+            futures = {pool.submit(run_command, command, bird, export_csv, stage_cache, model_backend, n_jobs,
+                                   render_workers, profiler, all_regions=all_regions): bird["name"]
+                       for bird in species_files}
+            for future in as_completed(futures):
+                species = futures[future]
+                try:
+                    results[species] = future.result()
+                except Exception as e:
+                    # The worker itself died (e.g. killed for memory); record it like a stage failure
+                    logger.error(f"Worker for {species} crashed: {e}", exc_info=True)
+                    results[species] = {"species": species, "status": "failed", "failed_stage": "worker",
+                                        "error": f"{type(e).__name__}: {e}", "warnings": []}
+    finally:
+        listener.stop()
+        manager.shutdown()
+    return [results[bird["name"]] for bird in species_files]
+
+
+def summarize_results(results):
+    """Log and return a one-line-per-species summary of the pipeline run."""
+    logger = logging.getLogger()
+    succeeded = [r for r in results if r["status"] == "ok"]
+    lines = [f"Pipeline summary: {len(succeeded)}/{len(results)} species succeeded"]
+    for r in results:
+        if r["status"] == "ok":
+            line = f"  {r['species']}: ok"
+            if r["warnings"]:
+                line += f" (optional stages failed: {', '.join(r['warnings'])})"
+        else:
+            line = f"  {r['species']}: FAILED at {r['failed_stage']} - {r['error']}"
+        lines.append(line)
+    summary = "\n".join(lines)
+    logger.info(summary)
+    print(summary)
+    return summary
+
+
+def main(export_csv=False, workers=1, stage_cache=None, model_backend="random_forest",
+         render_workers=None, profiler=None, command="all", species_files=None, batched=False, combined_ebd=None,
+         all_regions=False):
+    # Setup logging
+    logging.basicConfig(
+        filename='etl_pipeline.log',
+        level=logging.INFO,
+        format=LOG_FORMAT,
+        filemode='a'  # keep the logs of earlier runs; each run starts with its run id
+    )
+    logger = logging.getLogger()
+    profiler = profiler or profiling.StageProfiler()
+    species_files = manifest.load_species() if species_files is None else species_files
+
+    logger.info(f"Pipeline started (run {profiler.run_id}, command '{command}').")
+    if command == "merge" and (batched or combined_ebd is not None):
+        results = merge_batched(species_files, combined_ebd, export_csv, profiler)
+    else:
+        results = run_pipeline(species_files, workers=workers, export_csv=export_csv, stage_cache=stage_cache,
+                               model_backend=model_backend, render_workers=render_workers, profiler=profiler,
+                               command=command, all_regions=all_regions)
+    summarize_results(results)
+    if profiler.enabled:
+        logger.info(f"Stage metrics for run {profiler.run_id} appended to {profiler.path}")
     logger.info("Pipeline finished.")
+    return results
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Run the bird abundance ETL, modeling and visualization pipeline.")
+    parser.add_argument("command", nargs="?", choices=COMMANDS, default="all",
+                        help="stage to run for every species: all (default), extract, merge, update "
+                             "(append only rows newer than the last ingested release), train or plot")
+    parser.add_argument("--manifest", default=manifest.MANIFEST_PATH,
+                        help="species manifest (.json, .toml or .yaml) listing the species and their input files")
+    parser.add_argument("--species", action="append", default=[], metavar="NAME",
+                        help="only run this species from the manifest; can be repeated")
+    parser.add_argument("--batched", action="store_true",
+                        help="merge: merge every species in one pass over their combined EBD rows")
+    parser.add_argument("--combined-ebd", metavar="PATH",
+                        help="merge: one multi-species eBird export to merge in one pass (implies --batched)")
+    parser.add_argument("--region", metavar="CODE",
+                        help="region to extract and merge every species for, as a code (US-VA) or a name from "
+                             "data/reference-tables (default: each species' manifest 'region', else US-MD)")
+    parser.add_argument("--all-regions", action="store_true",
+                        help="extract/merge every region instead of one and write the merged data as a "
+                             "region/species-partitioned dataset; train/plot then read the partition of --region")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="number of species to process in parallel (default 1; 0 uses every CPU core)")
+    parser.add_argument("--export-csv", action="store_true", help="also write CSV copies of the merged data")
+    parser.add_argument("--model-backend", default="random_forest",
+                        help="classifier to train for every species: random_forest, hist_gradient_boosting, "
+                             "tuned (search both with successive halving and keep the best), or online_sgd / "
+                             "online_naive_bayes (update a saved model batch by batch with partial_fit)")
+    parser.add_argument("--no-cache", action="store_true", help="recompute every stage without reading or writing the stage cache")
+    parser.add_argument("--refresh-cache", action="store_true", help="recompute every stage and overwrite its cached artifact")
+    parser.add_argument("--clear-cache", action="store_true", help="delete all cached stage artifacts before running")
+    parser.add_argument("--cache-max-mb", type=int, default=2048, help="size limit of the stage cache (LRU eviction)")
+    parser.add_argument("--render-workers", type=int, default=None,
+                        help="threads per process rendering plots alongside the pipeline (default 2; 0 renders inline)")
+    parser.add_argument("--metrics-path", default=profiling.METRICS_PATH,
+                        help="JSONL file the per-stage timing and memory metrics are appended to")
+    parser.add_argument("--no-metrics", action="store_true", help="don't record per-stage metrics")
+    parser.add_argument("--no-trace-memory", action="store_true",
+                        help="skip tracemalloc peaks in the metrics (tracing slows allocation-heavy stages)")
+    parser.add_argument("--profile-stage", action="append", default=[], metavar="STAGE",
+                        help="run STAGE (e.g. merge, train) under cProfile and save the stats to "
+                             f"{profiling.PROFILE_DIR}; can be repeated")
+    return parser
 
 
 if __name__ == "__main__":
-    main()  
\ No newline at end of file
+    parser = build_parser()
+    args = parser.parse_args()
+    if args.all_regions and (args.command in ("all", "update") or args.batched or args.combined_ebd):
+        parser.error("--all-regions works with the extract, merge, train and plot commands (without --batched)")
+    if args.command in ("all", "train"):
+        try:
+            model_settings(args.model_backend)
+        except ValueError as e:
+            parser.error(str(e))
+
+    stage_cache = cache.StageCache(max_bytes=args.cache_max_mb * 1024 ** 2, enabled=not args.no_cache,
+                                   refresh=args.refresh_cache)
+    if args.clear_cache:
+        stage_cache.clear()
+    profiler = profiling.StageProfiler(path=args.metrics_path, enabled=not args.no_metrics,
+                                       track_memory=not args.no_trace_memory, profile_stages=args.profile_stage)
+    species_files = manifest.load_species(args.manifest, args.species)
+    if args.region:
+        species_files = [dict(bird, region=args.region) for bird in species_files]
+    main(export_csv=args.export_csv, workers=args.workers or os.cpu_count(), stage_cache=stage_cache,
+         model_backend=args.model_backend, render_workers=args.render_workers, profiler=profiler,
+         command=args.command, species_files=species_files,
+         batched=args.batched, combined_ebd=args.combined_ebd, all_regions=args.all_regions)
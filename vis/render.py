@@ -0,0 +1,126 @@
+"""
+Headless figure rendering on a thread pool.
+
+Plots are drawn with matplotlib's object-oriented Figure API on the Agg canvas, never through
+pyplot's global state, so several figures can be rendered at once in worker threads while the
+pipeline keeps computing. Each PNG gets a .sha256 sidecar holding the digest of the data and
+drawing code it was made from; a job whose digest matches the sidecar is skipped.
+"""
+
+import hashlib
+import logging
+import os
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+import numpy as np
+import pandas as pd
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+import etl.storage as storage
+from etl.cache import code_digest
+
+logger = logging.getLogger(__name__)
+
+# Threads per process used to render figures; 0 renders inline in the calling thread
+RENDER_WORKERS = 2
+
+_services = {}
+_services_lock = threading.Lock()
+
+
+def data_digest(*parts):
+    """Return a sha256 digest of numeric arrays, frames, series and other values (by repr)."""
+    digest = hashlib.sha256()
+    for part in parts:
+        if isinstance(part, (pd.DataFrame, pd.Series)):
+            digest.update(repr(list(getattr(part, "columns", [part.name]))).encode("utf-8"))
+            digest.update(pd.util.hash_pandas_object(part, index=False).to_numpy().tobytes())
+        elif isinstance(part, np.ndarray) and part.dtype != object:
+            digest.update(repr((part.dtype.str, part.shape)).encode("utf-8"))
+            digest.update(np.ascontiguousarray(part).tobytes())
+        else:
+            digest.update(repr(part).encode("utf-8"))
+    return digest.hexdigest()
+
+
+def _sidecar_path(output_path):
+    return output_path + ".sha256"
+
+
+def render_figure(output_path, draw, *args, figsize=(8, 5), **kwargs):
+    """
+    Draw a figure with draw(fig, *args, **kwargs) and save it to output_path (PNG), unless the
+    digest of draw's code and arguments matches the sidecar of an existing output_path.
+    The PNG and its sidecar are written atomically. Returns True if rendered, False if skipped.
+    """
+    try:
+        digest = data_digest(code_digest(draw), figsize, *args, sorted(kwargs.items()))
+        sidecar = _sidecar_path(output_path)
+        if os.path.exists(output_path) and os.path.exists(sidecar):
+            with open(sidecar) as f:
+                if f.read().strip() == digest:
+                    logger.info(f"Skipped rendering {output_path}: input data unchanged")
+                    return False
+
+        fig = Figure(figsize=figsize)
+        FigureCanvasAgg(fig)
+        draw(fig, *args, **kwargs)
+
+        output_dir = os.path.dirname(output_path) or "."
+        os.makedirs(output_dir, exist_ok=True)
+        tmp_path = storage._temp_path(output_path)
+        try:
+            fig.savefig(tmp_path, format="png")
+            os.replace(tmp_path, output_path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        with open(sidecar + ".tmp", "w") as f:
+            f.write(digest)
+        os.replace(sidecar + ".tmp", sidecar)
+        logger.info(f"Rendered {output_path}")
+        return True
+
+    except Exception as e:
+        logger.error(f"Failed to render {output_path}: {e}", exc_info=True)
+        raise
+
+
+class RenderService:
+    """
+    Queue of plot jobs rendered by a pool of max_workers threads (see render_figure).
+    With max_workers=0 jobs are rendered inline when submitted. submit returns a Future
+    resolving to True (rendered) or False (skipped); failures are set on the Future.
+    """
+
+    def __init__(self, max_workers=RENDER_WORKERS):
+        self.max_workers = max_workers
+        self._executor = ThreadPoolExecutor(max_workers, thread_name_prefix="render") if max_workers > 0 else None
+
+    def submit(self, output_path, draw, *args, figsize=(8, 5), **kwargs):
+        if self._executor is not None:
+            return self._executor.submit(render_figure, output_path, draw, *args, figsize=figsize, **kwargs)
+        future = Future()
+        try:
+            future.set_result(render_figure(output_path, draw, *args, figsize=figsize, **kwargs))
+        except Exception as e:
+            future.set_exception(e)
+        return future
+
+    def shutdown(self, wait=True):
+        if self._executor is not None:
+            self._executor.shutdown(wait=wait)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.shutdown()
+
+
+def get_service(max_workers=RENDER_WORKERS):
+    """Return the render service of this process with max_workers threads, creating it once."""
+    with _services_lock:
+        if max_workers not in _services:
+            _services[max_workers] = RenderService(max_workers)
+        return _services[max_workers]
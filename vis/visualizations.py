@@ -1,15 +1,27 @@
+import json
 import logging
 import os
+from functools import lru_cache
 # from turtle import pd
-import matplotlib.pyplot as plt
+from matplotlib.path import Path
+from matplotlib.patches import PathPatch
+import numpy as np
 import seaborn as sns
-import geopandas as gpd
 from sklearn.metrics import confusion_matrix
 import warnings
 import pandas as pd
+from vis.render import get_service
+import etl.spatial as spatial
 
 logger = logging.getLogger(__name__)
 
+STATE_SHAPEFILE = "data/shapefiles/cb_2022_us_state_20m.shp"
+# Outlines clipped from STATE_SHAPEFILE, stored as lon/lat rings (.npz)
+BASEMAP_CACHE_DIR = "data/cache/basemaps"
+
+# plot_bird_locations switches from a scatter to a hexbin density map above this many sightings
+HEXBIN_THRESHOLD = 50_000
+
 # # Suppress sklearn single-label confusion matrix warning globally
 warnings.filterwarnings(
     "ignore",
@@ -18,101 +30,255 @@ warnings.filterwarnings(
     module="sklearn.metrics._classification"
 )
 
-def plot_bird_locations(df, species_name):
+def _basemap_cache_path(state_name):
+    return os.path.join(BASEMAP_CACHE_DIR, f"{state_name.lower().replace(' ', '_')}_outline.npz")
+
+
+@lru_cache(maxsize=None)
+def state_names(shapefile=STATE_SHAPEFILE):
+    """
+    Map the postal codes of the states in the shapefile to their names ('MD' -> 'Maryland').
+    Cached as JSON in BASEMAP_CACHE_DIR until the shapefile changes, like the outlines.
+    """
+    cache_path = os.path.join(BASEMAP_CACHE_DIR, "state_names.json")
+    if os.path.exists(cache_path) and os.path.getmtime(cache_path) >= os.path.getmtime(shapefile):
+        with open(cache_path) as f:
+            return json.load(f)
+
+    import geopandas as gpd  # only needed to (re)build the cached names
+
+    states = gpd.read_file(shapefile, ignore_geometry=True)
+    names = dict(zip(states["STUSPS"].str.upper(), states["NAME"]))
+    os.makedirs(BASEMAP_CACHE_DIR, exist_ok=True)
+    with open(cache_path, "w") as f:
+        json.dump(names, f)
+    return names
+
+
+def state_name(region_code, shapefile=STATE_SHAPEFILE):
+    """
+    Name of the state of a US region code ('US-VA' -> 'Virginia') in the shapefile, or None if
+    the code is not a state in it.
+    """
+    country, _, postal = str(region_code).strip().upper().partition("-")
+    if country not in ("US", "USA") or not postal:
+        return None
+    return state_names(shapefile).get(postal)
+
+
+@lru_cache(maxsize=None)
+def load_state_outline(state_name="Maryland", shapefile=STATE_SHAPEFILE):
+    """
+    Return the outline of a state as a matplotlib Path in lon/lat (EPSG:4326).
+    The shapefile is read and clipped once: the rings are saved to BASEMAP_CACHE_DIR and
+    reused until the shapefile changes, and the Path is memoized for the life of the process.
+    """
+    if state_name is None:
+        raise ValueError("No state outline for this region (it is not a state in the shapefile)")
+    cache_path = _basemap_cache_path(state_name)
+    if os.path.exists(cache_path) and os.path.getmtime(cache_path) >= os.path.getmtime(shapefile):
+        with np.load(cache_path) as cached:
+            vertices, ring_ends = cached["vertices"], cached["ring_ends"]
+    else:
+        import geopandas as gpd  # only needed to (re)build the cached outline
+
+        states = gpd.read_file(shapefile)
+        state = states[states['NAME'] == state_name].to_crs("EPSG:4326")
+        if state.empty:
+            raise ValueError(f"State '{state_name}' not found in {shapefile}")
+
+        rings = []
+        for geom in state.geometry:
+            for polygon in getattr(geom, "geoms", [geom]):
+                rings.append(np.asarray(polygon.exterior.coords))
+                rings.extend(np.asarray(interior.coords) for interior in polygon.interiors)
+        vertices = np.concatenate(rings)
+        ring_ends = np.cumsum([len(ring) for ring in rings])
+
+        os.makedirs(BASEMAP_CACHE_DIR, exist_ok=True)
+        np.savez(cache_path, vertices=vertices, ring_ends=ring_ends)
+        logger.info(f"Cached {state_name} outline ({len(rings)} rings) to {cache_path}")
+
+    rings = np.split(vertices, ring_ends[:-1])
+    return Path.make_compound_path(*[Path(ring, closed=True) for ring in rings])
+
+
+def draw_state_outline(ax, outline):
+    """Draw a state outline from load_state_outline, with the lon/lat aspect ratio geopandas uses."""
+    ax.add_patch(PathPatch(outline, facecolor='lightgray', edgecolor='none'))
+    (_, ymin), (_, ymax) = outline.get_extents().get_points()
+    ax.set_aspect(1 / np.cos(np.radians((ymin + ymax) / 2)))
+    ax.autoscale_view()
+
+
+def draw_bird_locations(fig, lon, lat, outline_vertices, outline_codes, species_name, mode="points", gridsize=80,
+                        region_name="Maryland"):
+    """Draw sightings over a state outline (vertices/codes of the Path from load_state_outline) on fig."""
+    ax = fig.add_subplot()
+    draw_state_outline(ax, Path(outline_vertices, outline_codes))
+
+    # Plot bird sightings straight from the coordinate arrays
+    if mode == "hexbin":
+        hexes = ax.hexbin(lon, lat, gridsize=gridsize, mincnt=1, cmap='Reds', bins='log')
+        fig.colorbar(hexes, ax=ax, shrink=0.6, label="Sightings")
+    else:
+        ax.scatter(lon, lat, s=10, color='red', alpha=0.6, linewidths=0, rasterized=True)
+
+    # Add title and axis labels
+    ax.set_title(f"Bird Sightings in {region_name}: {species_name}", fontsize=14)
+    ax.set_xlabel("Longitude", fontsize=12)
+    ax.set_ylabel("Latitude", fontsize=12)
+
+
+def plot_bird_locations(df, species_name, mode="auto", gridsize=80, renderer=None, region_name="Maryland"):
     """
-    Plots bird sightings on a map of Maryland using latitude and longitude from the dataset.
+    Plots bird sightings on a map of the region (a state name in STATE_SHAPEFILE) using latitude
+    and longitude from the dataset.
     Only plots valid data points with latitude, longitude, abundance, and population percent.
 
     Parameters:
         df (DataFrame): Data containing bird sightings and location info.
         species_name (str): Common name of the bird species (used in the title and filename).
+        mode (str): "points" (scatter), "hexbin" (density of sightings per hexagon of the
+            gridsize-wide grid) or "auto" (hexbin above HEXBIN_THRESHOLD sightings).
+        renderer (RenderService, optional): Render service to queue the map on (see vis/render.py);
+            by default it is rendered inline.
+        region_name (str): State drawn as the background (e.g. etl.reference region_name of the
+            region the data was merged for).
+
+    Returns the render Future, or None if the data could not be prepared.
     """
     try:
-        # Drop rows where any of the required spatial or abundance columns are missing
-        df = df.dropna(subset=["latitude", "longitude", "abundance_mean", "total_pop_percent"])
-        logger.info(f"Data cleaned for plotting bird locations for {species_name}.")
-
-        # Load US state shapefile and filter for just Maryland
-        states = gpd.read_file("data/shapefiles/cb_2022_us_state_20m.shp")
-        maryland = states[states['NAME'] == 'Maryland']
-
-        # Convert latitude and longitude into geometric points
-        gdf = gpd.GeoDataFrame(
-            df, 
-            geometry=gpd.points_from_xy(df.longitude, df.latitude), 
-            crs="EPSG:4326"  # Set coordinate reference system to standard lat/lon
-        )
-
-        # Create a plot with Maryland as the background
-        fig, ax = plt.subplots(figsize=(8, 10))
-        maryland.plot(ax=ax, color='lightgray')  # Draw Maryland state
-        gdf.plot(ax=ax, markersize=10, color='red', alpha=0.6)  # Plot bird sightings
-        
-        # Add title and axis labels
-        plt.title(f"Bird Sightings in Maryland: {species_name}", fontsize=14)
-        plt.xlabel("Longitude", fontsize=12)
-        plt.ylabel("Latitude", fontsize=12)
-
-        # Save plot to outputs directory
+        # Keep rows where all of the required spatial and abundance columns are present
+        valid = df[["latitude", "longitude", "abundance_mean", "total_pop_percent"]].notna().all(axis=1).to_numpy()
+        lon = df["longitude"].to_numpy(dtype="float64")[valid]
+        lat = df["latitude"].to_numpy(dtype="float64")[valid]
+        logger.info(f"Data cleaned for plotting bird locations for {species_name}: {len(lon)} sightings.")
+
+        if mode == "auto":
+            mode = "hexbin" if len(lon) > HEXBIN_THRESHOLD else "points"
+        if mode not in ("points", "hexbin"):
+            raise ValueError(f"Unknown plot mode '{mode}'. Choose 'points', 'hexbin' or 'auto'.")
+
+        # The region as the background
+        outline = load_state_outline(region_name)
+
+        # Queue the map for the outputs directory
         output_path = f"data/outputs/map_{species_name.lower().replace(' ', '_')}.png"
-        plt.savefig(output_path)
-        plt.close()
-        logger.info(f"Saved bird locations map for {species_name} to {output_path}")
+        renderer = renderer or get_service(0)
+        logger.info(f"Queued bird locations map for {species_name} to {output_path}")
+        return renderer.submit(output_path, draw_bird_locations, lon, lat, outline.vertices, outline.codes,
+                               species_name, mode=mode, gridsize=gridsize, region_name=region_name,
+                               figsize=(8, 10))
 
     except Exception as e:
         logger.error(f"Failed to plot bird locations for {species_name}: {e}", exc_info=True)
 
 
+def draw_cell_map(fig, lon_edges, lat_edges, grid, outline_vertices, outline_codes, species_name, label,
+                  region_name="Maryland"):
+    """Draw per-cell totals (a 2D grid, NaN where empty) over a state outline on fig."""
+    ax = fig.add_subplot()
+    draw_state_outline(ax, Path(outline_vertices, outline_codes))
+    mesh = ax.pcolormesh(lon_edges, lat_edges, np.ma.masked_invalid(grid), cmap='YlOrRd', norm='log', rasterized=True)
+    fig.colorbar(mesh, ax=ax, shrink=0.6, label=label)
+    ax.set_title(f"Bird Sightings per Grid Cell in {region_name}: {species_name}", fontsize=14)
+    ax.set_xlabel("Longitude", fontsize=12)
+    ax.set_ylabel("Latitude", fontsize=12)
 
 
-def plot_confusion_matrix(y_true, y_pred, species_name, class_names=None):
+def plot_cell_map(cells, species_name, value="sightings", cell_deg=spatial.CELL_DEG, renderer=None,
+                  region_name="Maryland"):
     """
-    Plots and saves a confusion matrix heatmap for binary classification results.
+    Map a per-cell aggregate table from etl.spatial.aggregate_cells (summed over seasons) instead
+    of the individual sightings. Returns the render Future, or None if the data could not be prepared.
+    """
+    try:
+        totals = cells.groupby("cell_id")[value].sum()
+        totals = totals[totals > 0]
+        n_cols = spatial.grid_shape(cell_deg)[1]
+        rows, cols = np.divmod(totals.index.to_numpy(dtype="int64"), n_cols)
+        row0, col0 = rows.min(), cols.min()
+        grid = np.full((rows.max() - row0 + 1, cols.max() - col0 + 1), np.nan)
+        grid[rows - row0, cols - col0] = totals.to_numpy(dtype="float64")
+        lat_edges = (row0 + np.arange(grid.shape[0] + 1)) * cell_deg - 90
+        lon_edges = (col0 + np.arange(grid.shape[1] + 1)) * cell_deg - 180
+        logger.info(f"Prepared {len(totals)} grid cells for the {species_name} cell map")
+
+        outline = load_state_outline(region_name)
+        output_path = f"data/outputs/cell_map_{species_name.lower().replace(' ', '_')}.png"
+        renderer = renderer or get_service(0)
+        logger.info(f"Queued cell map for {species_name} to {output_path}")
+        return renderer.submit(output_path, draw_cell_map, lon_edges, lat_edges, grid, outline.vertices,
+                               outline.codes, species_name, value.replace("_", " ").capitalize(),
+                               region_name=region_name, figsize=(8, 10))
+
+    except Exception as e:
+        logger.error(f"Failed to plot cell map for {species_name}: {e}", exc_info=True)
+
+
+
+
+def draw_confusion_matrix(fig, cm, class_names, species_name):
+    """Draw a confusion matrix heatmap on fig."""
+    ax = fig.add_subplot()
+    sns.heatmap(cm, annot=True, fmt='d', cmap='Blues',
+                xticklabels=class_names,
+                yticklabels=class_names,
+                ax=ax)
+    ax.set_xlabel('Predicted Label')
+    ax.set_ylabel('True Label')
+    ax.set_title(f'Confusion Matrix for {species_name}')
+    fig.tight_layout()
+
+
+def plot_confusion_matrix(y_true, y_pred, species_name, class_names=None, renderer=None):
+    """
+    Plots and saves a confusion matrix heatmap for the abundance classification results.
     
     Parameters:
         y_true (array-like): True class labels
         y_pred (array-like): Predicted class labels
         species_name (str): Species name for plot title and filename
-        class_names (list of str, optional): Names of the classes for axis labels (default ['Low', 'High'])
+        class_names (list of str, optional): The classes, in axis order (default: the categories of
+            a categorical y_true, otherwise the sorted labels found in y_true and y_pred)
+        renderer (RenderService, optional): Render service to queue the plot on; by default it is rendered inline
+
+    Returns the render Future, or None if the matrix could not be computed.
     """
     try:
-        labels = ["Low", "High"]
-        if class_names is None:
-            class_names = labels
-
         y_true = pd.Series(y_true)
         y_pred = pd.Series(y_pred)
+        if class_names is None:
+            if isinstance(y_true.dtype, pd.CategoricalDtype):
+                class_names = list(y_true.cat.categories)
+            else:
+                class_names = sorted(set(y_true.dropna()) | set(y_pred.dropna()))
 
-        # Suppress only the single-label sklearn warning
+        # Explicit labels keep every class on both axes, even those missing from this split
+        # (suppress only the single-label sklearn warning)
         with warnings.catch_warnings():
             warnings.simplefilter("ignore", category=UserWarning)
-            cm = confusion_matrix(y_true, y_pred, labels=labels)
-
-        # If the confusion matrix is 1x1 (single class), pad it to 2x2
-        if cm.shape != (2, 2):
-            full_cm = pd.DataFrame(0, index=labels, columns=labels)
-            for i, label_true in enumerate(labels):
-                for j, label_pred in enumerate(labels):
-                    if label_true in y_true.values and label_pred in y_pred.values:
-                        mask = (y_true == label_true) & (y_pred == label_pred)
-                        full_cm.loc[label_true, label_pred] = mask.sum()
-            cm = full_cm.values
-
-        # Plot heatmap
-        plt.figure(figsize=(6, 5))
-        sns.heatmap(cm, annot=True, fmt='d', cmap='Blues',
-                    xticklabels=class_names,
-                    yticklabels=class_names)
-        plt.xlabel('Predicted Label')
-        plt.ylabel('True Label')
-        plt.title(f'Confusion Matrix for {species_name}')
-        plt.tight_layout()
-
-        os.makedirs("data/outputs", exist_ok=True)
+            cm = confusion_matrix(y_true.astype(object), y_pred.astype(object), labels=list(class_names))
+
+    except Exception as e:
+        logger.error(f"Failed to plot confusion matrix for {species_name}: {e}", exc_info=True)
+        return None
+    return plot_confusion_counts(pd.DataFrame(cm, index=class_names, columns=class_names), species_name, renderer)
+
+
+def plot_confusion_counts(conf_df, species_name, renderer=None):
+    """
+    Plot and save a confusion matrix given as counts (a DataFrame of true x predicted labels,
+    e.g. from analysis.store.EvaluationStore.confusion_matrix). Returns the render Future, or None.
+    """
+    try:
+        # Queue the heatmap
         plot_path = f"data/outputs/confusion_matrix_{species_name.lower().replace(' ', '_')}.png"
-        plt.savefig(plot_path)
-        plt.close()
-        logger.info(f"Saved confusion matrix plot for {species_name} to {plot_path}")
+        renderer = renderer or get_service(0)
+        logger.info(f"Queued confusion matrix plot for {species_name} to {plot_path}")
+        return renderer.submit(plot_path, draw_confusion_matrix, conf_df.to_numpy(dtype="int64"),
+                               [str(label) for label in conf_df.index], species_name, figsize=(6, 5))
 
     except Exception as e:
-        logger.error(f"Failed to plot confusion matrix for {species_name}: {e}", exc_info=True)
\ No newline at end of file
+        logger.error(f"Failed to plot confusion matrix for {species_name}: {e}", exc_info=True)